@@ -0,0 +1,565 @@
+#!/usr/bin/env python
+"""
+Offline performance benchmarks for dCacheFS.
+
+The benchmarks run against the local dCache stand-in server provided by
+`dcachefs.testing`, which can emulate network latency and limited bandwidth.
+Results are stored as JSON, and the timings of two runs can be compared:
+
+    python benchmarks/run_benchmarks.py --output new.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+from fsspec.asyn import sync
+
+import dcachefs
+
+from dcachefs import dCacheFileSystem
+from dcachefs.caching import DiskBlockCache
+from dcachefs.testing import dCacheTestServer, populate
+
+
+BENCHMARKS = {}
+
+KiB = 2**10
+MiB = 2**20
+
+
+def benchmark(name, **params):
+    """
+    Register a benchmark, to be run for all combinations of the given
+    parameter values.
+
+    The decorated function gets the file system, the server instance, a local
+    temporary directory and the parameter values as arguments. It sets up the
+    data it needs and returns a callable that runs the timed operation,
+    returning the number of bytes transferred (or None), or a dictionary with
+    the number of items processed by unit (e.g. `{'entries': 1000}`).
+    """
+    def decorator(func):
+        BENCHMARKS[name] = (func, params)
+        return func
+    return decorator
+
+
+def _tree(ndirs, nfiles, content=b''):
+    return {
+        f'dir_{i}': {f'file_{j}': content for j in range(nfiles)}
+        for i in range(ndirs)
+    }
+
+
+@benchmark('ls', nentries=[100, 10000])
+def ls(fs, server, tmpdir, nentries):
+    populate(server.root / 'ls' / f'{nentries}', _tree(1, nentries))
+
+    def run():
+        fs.ls(f'/ls/{nentries}/dir_0', detail=True)
+    return run
+
+
+@benchmark('ls_details', nentries=[100000])
+def ls_details(fs, server, tmpdir, nentries):
+    # API responses are prepared in advance, so that only the processing of
+    # the listing by the client is timed
+    entries = [
+        dict(fileName=f'file_{i}', fileType='REGULAR', size=i,
+             mtime=1.7e12 + i, creationTime=1.7e12, fileLocality='ONLINE')
+        for i in range(nentries)
+    ]
+
+    async def get_info(path, children=False, limit=None, offset=None,
+                       **kwargs):
+        out = dict(fileType='DIR', size=512, mtime=1.7e12,
+                   creationTime=1.7e12)
+        if children:
+            offset = offset or 0
+            end = None if limit is None else offset + limit
+            out['children'] = entries[offset:end]
+        return out
+
+    fs._get_info = get_info
+
+    def run():
+        fs.ls('/ls_details', detail=True)
+        return dict(entries=nentries)
+    return run
+
+
+@benchmark('find', ndirs=[10, 100])
+def find(fs, server, tmpdir, ndirs):
+    root = server.root / 'find' / f'{ndirs}'
+    for i in range(ndirs):
+        populate(root / f'dir_{i}', _tree(3, 10))
+
+    def run():
+        fs.find(f'/find/{ndirs}')
+    return run
+
+
+@benchmark('info', ncallers=[1, 64])
+def info(fs, server, tmpdir, ncallers):
+    populate(server.root / 'info', {'file': b''})
+
+    async def info_concurrently():
+        await asyncio.gather(
+            *(fs._info('/info/file') for _ in range(ncallers))
+        )
+
+    def run():
+        sync(fs.loop, info_concurrently)
+    return run
+
+
+@benchmark('info_many', ndirs=[10], nfiles=[100], min_siblings=[8, 1000])
+def info_many(fs, server, tmpdir, ndirs, nfiles, min_siblings):
+    populate(server.root / 'info_many', _tree(ndirs, nfiles))
+    paths = [
+        f'/info_many/dir_{i}/file_{j}'
+        for i in range(ndirs) for j in range(nfiles)
+    ]
+
+    def run():
+        fs.info_many(paths, min_siblings=min_siblings)
+    return run
+
+
+@benchmark('cat_file', size=[KiB, MiB, 64*MiB])
+def cat_file(fs, server, tmpdir, size):
+    populate(server.root / 'cat_file', {f'{size}': os.urandom(size)})
+
+    def run():
+        return len(fs.cat_file(f'/cat_file/{size}'))
+    return run
+
+
+@benchmark('cat_file_cached', size=[64*MiB])
+def cat_file_cached(fs, server, tmpdir, size):
+    populate(server.root / 'cat_file_cached', {f'{size}': os.urandom(size)})
+    # blocks are downloaded by the first run, and read from disk afterwards
+    fs.block_cache = DiskBlockCache(os.path.join(tmpdir, 'block_cache'))
+
+    def run():
+        return len(fs.cat_file(f'/cat_file_cached/{size}'))
+    return run
+
+
+@benchmark('cat', nfiles=[100], size=[4*KiB], batch_size=[1, 16, 64])
+def cat(fs, server, tmpdir, nfiles, size, batch_size):
+    populate(server.root / 'cat', _tree(1, nfiles, os.urandom(size)))
+    paths = [f'/cat/dir_0/file_{i}' for i in range(nfiles)]
+
+    def run():
+        out = fs.cat(paths, batch_size=batch_size)
+        return sum(len(v) for v in out.values())
+    return run
+
+
+@benchmark('zarr_getitems', nchunks=[1024], size=[8*KiB], missing=[0, 128])
+def zarr_getitems(fs, server, tmpdir, nchunks, size, missing):
+    # chunks of a 2D Zarr array read through a mapper, some of them missing
+    # (i.e. left to the fill value), as Zarr does when reading a selection
+    side = int(nchunks ** 0.5)
+    keys = [f'{i}.{j}' for i in range(side) for j in range(side)]
+    data = os.urandom(size)
+    populate(server.root / 'zarr_getitems' / f'{missing}', {
+        key: data for key in keys[missing:]
+    })
+    mapper = fs.get_mapper(f'/zarr_getitems/{missing}')
+
+    def run():
+        out = mapper.getitems(keys, on_error='omit')
+        return dict(chunks=len(out))
+    return run
+
+
+@benchmark('cat_ranges', nranges=[100], size=[4*KiB], stride=[16*KiB],
+           max_gap=[0, 64*KiB], multipart=[False, True])
+def cat_ranges(fs, server, tmpdir, nranges, size, stride, max_gap,
+               multipart):
+    populate(server.root / 'cat_ranges', {'file': os.urandom(nranges*stride)})
+    starts = [i * stride for i in range(nranges)]
+    ends = [start + size for start in starts]
+
+    def run():
+        out = fs.cat_ranges(['/cat_ranges/file'] * nranges, starts, ends,
+                            max_gap=max_gap, multipart=multipart)
+        return sum(len(v) for v in out)
+    return run
+
+
+@benchmark('get_file', size=[MiB, 64*MiB], streams=[1, 4])
+def get_file(fs, server, tmpdir, size, streams):
+    populate(server.root / 'get_file', {f'{size}': os.urandom(size)})
+
+    def run():
+        fs.get_file(f'/get_file/{size}', os.path.join(tmpdir, 'out'),
+                    streams=streams, part_size=8*MiB)
+        return size
+    return run
+
+
+@benchmark('put_file', size=[MiB, 64*MiB])
+def put_file(fs, server, tmpdir, size):
+    lpath = os.path.join(tmpdir, 'in')
+    with open(lpath, 'wb') as f:
+        f.write(os.urandom(size))
+
+    def run():
+        fs.put_file(lpath, f'/put_file/{size}')
+        return size
+    return run
+
+
+@benchmark('get', nfiles=[100], size=[4*KiB], batch_size=[1, 16, 64])
+def get(fs, server, tmpdir, nfiles, size, batch_size):
+    populate(server.root / 'get', _tree(1, nfiles, os.urandom(size)))
+    rpaths = [f'/get/dir_0/file_{i}' for i in range(nfiles)]
+    lpaths = [os.path.join(tmpdir, f'file_{i}') for i in range(nfiles)]
+
+    def run():
+        fs.get(rpaths, lpaths, batch_size=batch_size)
+        return nfiles * size
+    return run
+
+
+@benchmark('put_mixed', nfiles=[100], size=[4*KiB], large_size=[64*MiB],
+           batch_size=[8])
+def put_mixed(fs, server, tmpdir, nfiles, size, large_size, batch_size):
+    # one large file among many small ones: with batches of transfers, the
+    # large file holds back the small files of its batch
+    local = os.path.join(tmpdir, 'put_mixed')
+    tree = _tree(1, nfiles, os.urandom(size))
+    tree['large'] = os.urandom(large_size)
+    populate(local, tree)
+
+    def run():
+        fs.put(local, '/put_mixed/', recursive=True, batch_size=batch_size)
+        return nfiles * size + large_size
+    return run
+
+
+@benchmark('copy_instances', nfiles=[16], size=[4*MiB], batch_size=[4],
+           tpc=[False, True])
+def copy_instances(fs, server, tmpdir, nfiles, size, batch_size, tpc):
+    # copy files to another instance (the same server, through an alias of
+    # its door): with third-party copies the data does not go through the
+    # client
+    populate(server.root / 'copy_instances', _tree(1, nfiles, b'0' * size))
+    sources = [f'/copy_instances/dir_0/file_{i}' for i in range(nfiles)]
+    door = server.webdav_url.replace(server.host, 'localhost')
+    local = os.path.join(tmpdir, 'copy_instances')
+    other = dCacheFileSystem(api_url=server.api_url, webdav_url=door,
+                             skip_instance_cache=True)
+
+    def run():
+        targets = [f'/copy_instances/{tpc}_{i}' for i in range(nfiles)]
+        if tpc:
+            fs.tpc_copy(sources, [f'{door}{p}' for p in targets],
+                        batch_size=batch_size)
+        else:
+            fs.get(sources, f'{local}/', batch_size=batch_size)
+            other.put([os.path.join(local, p.split('/')[-1])
+                       for p in sources], targets, batch_size=batch_size)
+        return nfiles * size
+    return run
+
+
+@benchmark('get_nearline', nfiles=[16], stage_time=[2.], batch_size=[4],
+           stage=[False, True])
+def get_nearline(fs, server, tmpdir, nfiles, stage_time, batch_size, stage):
+    # half of the files are on tape, and are staged while running
+    populate(server.root / 'get_nearline', _tree(1, nfiles, b'0'))
+    rpaths = [f'/get_nearline/dir_0/file_{i}' for i in range(nfiles)]
+    lpaths = [os.path.join(tmpdir, f'file_{i}') for i in range(nfiles)]
+    server.stage_time = stage_time
+
+    def run():
+        server.nearline.update(rpaths[::2])
+        fs.get(rpaths, lpaths, batch_size=batch_size, stage=stage)
+    return run
+
+
+@benchmark('copy', nfiles=[100], size=[MiB], batch_size=[1, 16])
+def copy(fs, server, tmpdir, nfiles, size, batch_size):
+    populate(server.root / 'copy' / 'src', _tree(1, nfiles, os.urandom(size)))
+
+    def run():
+        fs.copy('/copy/src/', '/copy/dst/', recursive=True,
+                batch_size=batch_size)
+        return nfiles * size
+    return run
+
+
+@benchmark('sync_noop', ndirs=[100], nfiles=[100])
+def sync_noop(fs, server, tmpdir, ndirs, nfiles):
+    # the trees are already synchronized: only listing and comparing them
+    # is timed
+    local = os.path.join(tmpdir, 'sync')
+    populate(local, _tree(ndirs, nfiles, b'0'))
+    fs.sync(local, '/sync_noop')
+
+    def run():
+        report = fs.sync(local, '/sync_noop')
+        return dict(files=report['unchanged'])
+    return run
+
+
+@benchmark('file_read', size=[64*MiB], block_size=[MiB, 5*MiB],
+           read_size=[64*KiB, MiB], cache_type=['readahead', 'prefetch'])
+def file_read(fs, server, tmpdir, size, block_size, read_size, cache_type):
+    populate(server.root / 'file_read', {f'{size}': os.urandom(size)})
+
+    def run():
+        nbytes = 0
+        with fs.open(f'/file_read/{size}', block_size=block_size,
+                     cache_type=cache_type) as f:
+            while True:
+                data = f.read(read_size)
+                if not data:
+                    break
+                nbytes += len(data)
+        return nbytes
+    return run
+
+
+@benchmark('file_read_concurrent', nreaders=[64], size=[MiB],
+           block_size=[256*KiB], concurrency=['threads', 'async'])
+def file_read_concurrent(fs, server, tmpdir, nreaders, size, block_size,
+                         concurrency):
+    # many readers of the same file, with files opened by threads or by
+    # coroutines of a single event loop (open_async)
+    populate(server.root / 'file_read_concurrent', {
+        f'{i}': os.urandom(size) for i in range(nreaders)
+    })
+    paths = [f'/file_read_concurrent/{i}' for i in range(nreaders)]
+
+    def read(path):
+        with fs.open(path, block_size=block_size) as f:
+            return len(f.read())
+
+    async def read_async(afs, path):
+        async with await afs.open_async(path, block_size=block_size) as f:
+            return len(await f.read())
+
+    async def read_all():
+        afs = dCacheFileSystem(api_url=server.api_url,
+                               webdav_url=server.webdav_url,
+                               asynchronous=True,
+                               skip_instance_cache=True)
+        try:
+            return sum(await asyncio.gather(
+                *(read_async(afs, path) for path in paths)
+            ))
+        finally:
+            for session in (afs._session, afs._api_session):
+                await session.close()
+
+    def run():
+        if concurrency == 'async':
+            return asyncio.run(read_all())
+        with ThreadPoolExecutor(nreaders) as executor:
+            return sum(executor.map(read, paths))
+    return run
+
+
+@benchmark('file_read_random', size=[64*MiB], read_size=[64*KiB],
+           nreads=[100])
+def file_read_random(fs, server, tmpdir, size, read_size, nreads):
+    # scattered reads, each needing a request (run with --redirect to
+    # include the redirects of the WebDAV door)
+    populate(server.root / 'file_read_random', {f'{size}': os.urandom(size)})
+    rng = random.Random(0)
+    offsets = [rng.randrange(size - read_size) for _ in range(nreads)]
+
+    def run():
+        nbytes = 0
+        with fs.open(f'/file_read_random/{size}', block_size=read_size,
+                     cache_type='none') as f:
+            for offset in offsets:
+                f.seek(offset)
+                nbytes += len(f.read(read_size))
+        return nbytes
+    return run
+
+
+def _run_benchmark(fs, server, name, func, params, repeat):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        run = func(fs, server, tmpdir, **params)
+        return _time(run, server, name, params, repeat)
+
+
+def _time(run, server, name, params, repeat):
+    run()  # warm up
+    times = []
+    nbytes = None
+    server.requests.clear()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nbytes = run()
+        times.append(time.perf_counter() - start)
+    counts = nbytes if isinstance(nbytes, dict) else {}
+    nbytes = None if counts else nbytes
+    median = statistics.median(times)
+    result = dict(
+        name=name,
+        params=params,
+        times=times,
+        median=median,
+        min=min(times),
+        requests=sum(server.requests.values()) / repeat,
+    )
+    if nbytes:
+        result['bytes'] = nbytes
+        result['throughput'] = nbytes / median
+    if counts:
+        result['counts'] = counts
+        result['rates'] = {
+            unit: count / median for unit, count in counts.items()
+        }
+    return result
+
+
+def run_benchmarks(names=None, repeat=3, latency=0., bandwidth=None,
+                   redirect=False):
+    """
+    Run the benchmarks against a local stand-in server.
+
+    :param names: (list, optional) names of the benchmarks to run, run all
+        benchmarks if None
+    :param repeat: (int, optional) number of timed runs for each benchmark
+    :param latency: (float, optional) latency emulated by the server
+    :param bandwidth: (float, optional) bandwidth emulated by the server
+    :param redirect: (bool, optional) emulate WebDAV door redirects
+    :return: (dict) benchmark results and metadata
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = []
+    server = dCacheTestServer(
+        latency=latency,
+        bandwidth=bandwidth,
+        redirect=redirect
+    )
+    with server:
+        for name in names:
+            func, param_grid = BENCHMARKS[name]
+            keys = list(param_grid)
+            for values in itertools.product(*param_grid.values()):
+                params = dict(zip(keys, values))
+                fs = dCacheFileSystem(
+                    api_url=server.api_url,
+                    webdav_url=server.webdav_url,
+                    skip_instance_cache=True
+                )
+                result = _run_benchmark(fs, server, name, func, params,
+                                        repeat)
+                _print_result(result)
+                results.append(result)
+    metadata = dict(
+        dcachefs_version=dcachefs.__version__,
+        fsspec_version=fsspec.__version__,
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+        date=datetime.datetime.now().isoformat(),
+        repeat=repeat,
+        latency=latency,
+        bandwidth=bandwidth,
+        redirect=redirect,
+    )
+    return dict(metadata=metadata, results=results)
+
+
+def _key(result):
+    params = ','.join(f'{k}={v}' for k, v in result['params'].items())
+    return f'{result["name"]}[{params}]'
+
+
+def _print_result(result):
+    line = f'{_key(result):<60} {result["median"]*1000:10.2f} ms'
+    if 'throughput' in result:
+        line += f' {result["throughput"]/MiB:10.2f} MiB/s'
+    for unit, rate in result.get('rates', {}).items():
+        line += f' {rate:10.0f} {unit}/s'
+    print(line, flush=True)
+
+
+def compare(old, new):
+    """
+    Compare the median timings of two benchmark runs.
+
+    :param old: (dict) reference results
+    :param new: (dict) new results
+    :return: (list) tuples with benchmark key, old and new median times and
+        their ratio
+    """
+    old = {_key(r): r for r in old['results']}
+    rows = []
+    for result in new['results']:
+        key = _key(result)
+        if key not in old:
+            continue
+        before, after = old[key]['median'], result['median']
+        rows.append((key, before, after, after / before))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('benchmarks', nargs='*',
+                        help='benchmarks to run (default: all), choose from '
+                             f'{", ".join(BENCHMARKS)}')
+    parser.add_argument('--output', '-o', help='JSON file to write results')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='emulated latency per request, in seconds')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='emulated bandwidth, in bytes per second')
+    parser.add_argument('--redirect', action='store_true',
+                        help='emulate WebDAV door redirects to pools')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files and exit')
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        for key, before, after, ratio in compare(old, new):
+            print(f'{key:<60} {before*1000:10.2f} ms {after*1000:10.2f} ms '
+                  f'{ratio:6.2f}x')
+        return 0
+
+    results = run_benchmarks(
+        names=args.benchmarks or None,
+        repeat=args.repeat,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        redirect=args.redirect
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
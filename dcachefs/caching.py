@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+from fsspec.caching import BaseCache
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+PREFETCH_BLOCKS = 4
+
+DISK_CACHE_SIZE = 10 * 2**30
+
+DISK_CACHE_BLOCKSIZE = 4 * 2**20
+
+DISK_CACHE_LOW_WATERMARK = 0.9
+
+
+class PrefetchCache(BaseCache):
+    """
+    Cache for files read sequentially, which keeps downloading the following
+    blocks in the background.
+
+    The file is split in blocks of `blocksize` bytes. Blocks are requested as
+    coroutines that run concurrently on the file-system event loop. Once two
+    consecutive reads access contiguous blocks, the next `prefetch_blocks`
+    blocks are requested too, so that they are (being) downloaded by the time
+    they are read. Blocks before the position read are discarded, and
+    reading far from the current position (outside the prefetched blocks)
+    cancels the outstanding requests.
+
+    :param blocksize: (int) size of the blocks, in bytes
+    :param fetcher: (coroutine function) function of the form f(start, end)
+        returning the bytes in the given range
+    :param size: (int) size of the file
+    :param loop: event loop where to run the fetcher
+    :param prefetch_blocks: (int, optional) number of blocks to download
+        ahead of the position read
+    :param max_bytes: (int, optional) maximum size of the blocks prefetched,
+        in bytes. It limits the number of blocks prefetched, if smaller than
+        `prefetch_blocks` times `blocksize`
+    """
+
+    name = 'prefetch'
+
+    def __init__(
+        self,
+        blocksize,
+        fetcher,
+        size,
+        loop,
+        prefetch_blocks=PREFETCH_BLOCKS,
+        max_bytes=None
+    ):
+        super().__init__(blocksize, fetcher, size)
+        self.loop = loop
+        if max_bytes is not None:
+            prefetch_blocks = min(prefetch_blocks, max_bytes // blocksize)
+        self.prefetch_blocks = max(prefetch_blocks, 0)
+        self.blocks = {}
+        self._last_block = None
+
+    def _fetch(self, start, stop):
+        if start is None:
+            start = 0
+        if stop is None:
+            stop = self.size
+        stop = min(stop, self.size)
+        if start >= self.size or start >= stop:
+            return b''
+        first = start // self.blocksize
+        last = (stop - 1) // self.blocksize
+        sequential = self._last_block is not None and \
+            self._last_block <= first <= self._last_block + 1
+        end = last + 1 + (self.prefetch_blocks if sequential else 0)
+        nblocks = -(-self.size // self.blocksize)
+        window = range(first, min(end, nblocks))
+        for index in list(self.blocks):
+            if index not in window:
+                self.blocks.pop(index).cancel()
+        for index in window:
+            if index in self.blocks:
+                if index <= last:
+                    self.hit_count += 1
+            else:
+                if index <= last:
+                    self.miss_count += 1
+                self.blocks[index] = self._submit(index)
+        out = [self.blocks[index].result() for index in range(first, last + 1)]
+        self._last_block = last
+        offset = start - first * self.blocksize
+        return b''.join(out)[offset:offset + stop - start]
+
+    def _submit(self, index):
+        """ Start downloading a block, return a concurrent future. """
+        start = index * self.blocksize
+        stop = min(start + self.blocksize, self.size)
+        self.total_requested_bytes += stop - start
+        return asyncio.run_coroutine_threadsafe(
+            self.fetcher(start, stop),
+            self.loop
+        )
+
+    def close(self):
+        """ Cancel the outstanding requests and discard the blocks. """
+        for future in self.blocks.values():
+            future.cancel()
+        self.blocks.clear()
+        self._last_block = None
+
+
+class DiskBlockCache:
+    """
+    Persistent cache of file blocks on local disk, which can be shared by
+    multiple processes on the same node.
+
+    Remote files are identified by their URL, size and modification time,
+    so that modified files are never served from the cache. Each file is
+    cached in a sparse local file, holding a table of the blocks stored
+    followed by the blocks themselves, `blocksize` bytes each. Blocks are
+    written before being marked as stored, so that readers (in any process)
+    never get partially written blocks.
+
+    The disk space used is kept below `max_size` bytes by removing the least
+    recently used files, down to `DISK_CACHE_LOW_WATERMARK` times
+    `max_size`. The cache directory is only scanned when the disk space used
+    at the last scan, plus the space taken by the blocks added since then,
+    exceeds `max_size`.
+
+    :param directory: (str) directory where to store the cache files
+    :param max_size: (int, optional) maximum disk space used, in bytes
+    :param blocksize: (int, optional) size of the blocks, in bytes
+    """
+
+    suffix = '.blocks'
+
+    def __init__(
+        self,
+        directory,
+        max_size=DISK_CACHE_SIZE,
+        blocksize=DISK_CACHE_BLOCKSIZE
+    ):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        self.blocksize = blocksize
+        os.makedirs(self.directory, exist_ok=True)
+        # disk space used at the last scan, and added since then
+        self._used = None
+        self._added = 0
+        self._lock = threading.Lock()
+
+    def key(self, url, size, modified):
+        """
+        :param url: (str) remote file URL
+        :param size: (int) file size
+        :param modified: (datetime) file modification time
+        :return: (str) key identifying the file version in the cache
+        """
+        version = f'{url}\n{size}\n{modified}'.encode()
+        return hashlib.sha256(version).hexdigest()
+
+    def open(self, key, size):
+        """
+        Open the cache file for a remote file, creating it if needed.
+
+        :param key: (str) file key (see `key`)
+        :param size: (int) file size
+        :return: (CachedFile) cache file, to be closed by the caller
+        """
+        path = os.path.join(self.directory, key + self.suffix)
+        return CachedFile(self, path, size)
+
+    def usage(self):
+        """
+        :return: (list) path, last access time and disk space used by each
+            cache file, from the least recently used
+        """
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry.path, stat.st_mtime, _disk_usage(stat)))
+        return sorted(files, key=lambda file: file[1])
+
+    def add(self, nbytes):
+        """
+        Account for disk space taken by new blocks, and evict files if the
+        disk space used might exceed `max_size`.
+
+        :param nbytes: (int) disk space taken, in bytes
+        """
+        with self._lock:
+            self._added += nbytes
+            full = self._used is None or \
+                self._used + self._added > self.max_size
+        if full:
+            self.evict()
+
+    def evict(self):
+        """
+        If the disk space used exceeds `max_size`, remove the least recently
+        used files until it is below `DISK_CACHE_LOW_WATERMARK` times
+        `max_size`. Skipped if another process is evicting files.
+        """
+        lock = os.open(os.path.join(self.directory, '.lock'),
+                       os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+            files = self.usage()
+            used = sum(file[2] for file in files)
+            # leave room for the next blocks, to scan the directory less often
+            target = self.max_size * DISK_CACHE_LOW_WATERMARK \
+                if used > self.max_size else self.max_size
+            for path, _, size in files:
+                if used <= target:
+                    break
+                try:
+                    # open files remain readable after being removed
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                used -= size
+            with self._lock:
+                self._used, self._added = used, 0
+        finally:
+            os.close(lock)
+
+    def clear(self):
+        """ Remove all cache files. """
+        for path, _, _ in self.usage():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}({self.directory!r}, '
+            f'max_size={self.max_size}, blocksize={self.blocksize})'
+        )
+
+
+class CachedFile:
+    """
+    Blocks of a remote file stored in the local disk cache.
+
+    :param cache: (DiskBlockCache) cache the file belongs to
+    :param path: (str) local path of the cache file
+    :param size: (int) size of the remote file
+    """
+
+    def __init__(self, cache, path, size):
+        self.cache = cache
+        self.size = size
+        self.nblocks = -(-size // cache.blocksize)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._modified = False
+        stat = os.fstat(self._fd)
+        self._used = _disk_usage(stat)
+        if stat.st_size < self.nblocks + size:
+            os.ftruncate(self._fd, self.nblocks + size)
+        # the modification time marks the last access
+        os.utime(self._fd)
+
+    def _range(self, index):
+        start = index * self.cache.blocksize
+        return start, min(start + self.cache.blocksize, self.size)
+
+    def get(self, index):
+        """
+        :param index: (int) block index
+        :return: (bytes) block content, None if the block is not stored
+        """
+        if os.pread(self._fd, 1, index) != b'\x01':
+            return None
+        start, end = self._range(index)
+        return os.pread(self._fd, end - start, self.nblocks + start)
+
+    def put(self, index, data):
+        """
+        Store a block. Blocks with an unexpected size (e.g. if the remote
+        file was modified while being read) are not stored.
+
+        :param index: (int) block index
+        :param data: (bytes) block content
+        :return: (bool) True if the block has been stored
+        """
+        start, end = self._range(index)
+        if not 0 <= index < self.nblocks or len(data) != end - start:
+            return False
+        os.pwrite(self._fd, data, self.nblocks + start)
+        os.pwrite(self._fd, b'\x01', index)
+        self._modified = True
+        return True
+
+    def close(self):
+        """ Close the file, and evict files if the cache is full. """
+        if self._fd is not None:
+            added = 0
+            if self._modified:
+                added = _disk_usage(os.fstat(self._fd)) - self._used
+            os.close(self._fd)
+            self._fd = None
+            if self._modified:
+                self.cache.add(max(added, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _disk_usage(stat):
+    """ Disk space used by a (sparse) file, from its stat result. """
+    return stat.st_blocks * 512 if hasattr(stat, 'st_blocks') \
+        else stat.st_size
@@ -0,0 +1,153 @@
+import hashlib
+import io
+import zlib
+
+
+# checksum types supported, in order of preference
+CHECKSUM_TYPES = ('adler32', 'md5')
+
+_ADLER32_BASE = 65521
+
+
+class ChecksumError(OSError):
+    """
+    Error raised when the checksum of the data transferred does not match the
+    one stored by dCache.
+    """
+
+
+class Adler32:
+    """ ADLER32 checksum, with the same interface as the hashlib objects. """
+
+    name = 'adler32'
+
+    def __init__(self, data=b''):
+        self.value = zlib.adler32(data)
+
+    def update(self, data):
+        self.value = zlib.adler32(data, self.value)
+
+    def combine(self, other, length):
+        """
+        Append the checksum of data following the data checksummed so far.
+
+        :param other: (Adler32) checksum of the following data
+        :param length: (int) length of the following data
+        """
+        self.value = adler32_combine(self.value, other.value, length)
+
+    def hexdigest(self):
+        return f'{self.value:08x}'
+
+
+def adler32_combine(adler1, adler2, length2):
+    """
+    Combine the ADLER32 checksums of two consecutive blocks of data (as the
+    zlib function with the same name).
+
+    :param adler1: (int) checksum of the first block
+    :param adler2: (int) checksum of the second block
+    :param length2: (int) length of the second block
+    :return: (int) checksum of the concatenated blocks
+    """
+    rem = length2 % _ADLER32_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER32_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER32_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + \
+        _ADLER32_BASE - rem
+    sum1 %= _ADLER32_BASE
+    sum2 %= _ADLER32_BASE
+    return sum1 | (sum2 << 16)
+
+
+def new_hasher(algorithm):
+    """
+    :param algorithm: (str) checksum type, one of `CHECKSUM_TYPES`
+    :return: object computing the checksum incrementally
+    """
+    if algorithm == 'adler32':
+        return Adler32()
+    if algorithm == 'md5':
+        return hashlib.md5()
+    raise ValueError(f'Unsupported checksum type: {algorithm}')
+
+
+def parse_checksums(checksums):
+    """
+    Parse the checksums as returned by the dCache API.
+
+    :param checksums: (list) checksums, as dictionaries with "type" (e.g.
+        "ADLER32" or "MD5_TYPE") and "value" (hexadecimal string)
+    :return: (dict) checksum values by type, in lower case (e.g. "adler32",
+        "md5")
+    """
+    parsed = {}
+    for checksum in checksums or []:
+        name = checksum['type'].lower()
+        if name.endswith('_type'):
+            name = name[:-len('_type')]
+        parsed[name] = checksum['value'].lower()
+    return parsed
+
+
+def select_checksum(checksums, algorithm=None):
+    """
+    Select a checksum among the available ones.
+
+    :param checksums: (dict) checksum values by type
+    :param algorithm: (str, optional) checksum type. If None, choose the first
+        of `CHECKSUM_TYPES` that is available
+    :return: (tuple) checksum type and value, None if not available
+    """
+    for name in (algorithm,) if algorithm else CHECKSUM_TYPES:
+        if name in checksums:
+            return name, checksums[name]
+    return None
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Read-only wrapper of a binary file, computing the checksum of the data
+    read. Seeking back to the initial position (e.g. to repeat an upload)
+    restarts the computation.
+
+    :param f: binary file object, open for reading
+    :param algorithm: (str) checksum type
+    """
+
+    def __init__(self, f, algorithm):
+        super().__init__()
+        self._f = f
+        self.algorithm = algorithm
+        self._start = self._position = f.tell()
+        self.hasher = new_hasher(algorithm)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self._position += len(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        position = self._f.seek(offset, whence)
+        if position == self._start:
+            self.hasher = new_hasher(self.algorithm)
+        elif position != self._position:
+            # the data read is no longer contiguous
+            self.hasher = None
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._f.tell()
+
+    def fileno(self):
+        return self._f.fileno()
@@ -1,16 +1,44 @@
 import aiohttp
 import asyncio
+import collections
+import contextlib
+import functools
+import io
+import itertools
+import json
 import logging
+import os
+import re
+import shutil
+import tempfile
+import time
 import weakref
+import zlib
 import yarl
 
 from datetime import datetime
 from fsspec.asyn import sync_wrapper, sync, AsyncFileSystem
-from fsspec.implementations.http import get_client, HTTPFile, HTTPStreamFile
-from fsspec.utils import DEFAULT_BLOCK_SIZE
+from fsspec.asyn import AbstractAsyncStreamedFile
+from fsspec.asyn import _get_batch_size, _run_coros_in_chunks
+from fsspec.callbacks import DEFAULT_CALLBACK
+from fsspec.exceptions import FSTimeoutError
+from fsspec.implementations.http import get_client, has_magic
+from fsspec.implementations.http import HTTPFile, HTTPStreamFile
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.implementations.local import make_path_posix, trailing_sep
+from fsspec.utils import DEFAULT_BLOCK_SIZE, check_contained, other_paths
 from urllib.parse import quote
 from urlpath import URL
 
+from .caching import DiskBlockCache, PrefetchCache
+from .checksums import CHECKSUM_TYPES, ChecksumError, HashingReader
+from .checksums import new_hasher, parse_checksums, select_checksum
+from .dircache import dCacheDirCache
+from .metrics import Metrics, instrumented
+from .retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .retry import TRANSIENT_ERRORS, is_throttled
+from .transfers import TransferScheduler
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,6 +47,34 @@ DCACHE_FILE_TYPES = {
     'DIR': 'directory'
 }
 
+LISTING_PAGE_SIZE = 10000
+
+DOWNLOAD_PART_SIZE = 64 * 2**20
+
+UPLOAD_QUEUE_SIZE = 2
+
+RANGES_MAX_GAP = 64 * 2**10
+
+INFO_MIN_SIBLINGS = 8
+
+INFO_LISTING_RATIO = 4
+
+REDIRECT_CACHE_TTL = 30.
+
+REDIRECT_CACHE_SIZE = 1024
+
+# maximum time without performance markers during third-party copies
+TPC_IDLE_TIMEOUT = 300.
+
+STAGE_POLL_INTERVAL = 1.
+
+STAGE_POLL_INTERVAL_MAX = 30.
+
+# final states of the targets of a bulk request
+BULK_TARGET_FINAL_STATES = frozenset(
+    {'COMPLETED', 'FAILED', 'CANCELLED', 'SKIPPED'}
+)
+
 
 def _get_details(path, data):
     """
@@ -28,30 +84,270 @@ def _get_details(path, data):
     :param data: (dict) metadata as provided by the API
     :return: (dict) parsed metadata
     """
-    path = URL(path)
-
     name = data.get('fileName')  # fileName might be missing
-    name = path/name if name is not None else path
-    name = name.path
-    element_type = data.get('fileType')
-    element_type = DCACHE_FILE_TYPES.get(element_type, 'other')
+    name = path if name is None else f"{path.rstrip('/')}/{name}"
+    return _parse_metadata(name, data)
+
+
+def _get_listing_details(path, elements):
+    """
+    Extract details from the metadata of the entries of a directory, as
+    returned by the dCache API. Names are built by string concatenation,
+    with the parent path prepared once for all entries.
+
+    :param path: (str) directory path
+    :param elements: (list) metadata of the entries, as provided by the API
+    :return: (list) parsed metadata of the entries
+    """
+    prefix = path.rstrip('/') + '/'
+    return [_parse_metadata(prefix + data['fileName'], data)
+            for data in elements]
+
+
+def _parse_metadata(name, data):
     created = data.get('creationTime')  # in ms
-    created = datetime.fromtimestamp(created / 1000.)
     modified = data.get('mtime')  # in ms
-    modified = datetime.fromtimestamp(modified / 1000.)
+    checksums = data.get('checksums')
     return dict(
         name=name,
         size=data.get('size'),
-        type=element_type,
-        created=created,
-        modified=modified
+        type=DCACHE_FILE_TYPES.get(data.get('fileType'), 'other'),
+        created=datetime.fromtimestamp(created / 1000.),
+        modified=datetime.fromtimestamp(modified / 1000.),
+        checksums=parse_checksums(checksums) if checksums else {},
+        locality=data.get('fileLocality')
     )
 
 
+def _range_start(content_range):
+    # e.g. "bytes 0-99/1000"
+    return int(content_range.split()[1].split("-")[0])
+
+
 def _encode(path):
     return quote(path, safe='')
 
 
+# absolute paths made of unreserved characters only, without "." segments
+_PLAIN_PATH = re.compile(r'(/(?!\.(/|$))[A-Za-z0-9._~-]+)+')
+
+
+@functools.lru_cache(maxsize=16)
+def _door_root(webdav_url):
+    return URL(webdav_url).drive
+
+
+def _file_url(webdav_url, path):
+    """
+    Build the URL of a file on a WebDAV door.
+
+    Plain paths (e.g. the keys of Zarr arrays) are appended to the door URL,
+    giving the same URL as `urlpath` at a fraction of the cost; other paths
+    are joined with `urlpath`.
+
+    :param webdav_url: (str) WebDAV door URL
+    :param path: (str) file path (stripped from protocol and WebDAV door)
+    :return: (str) file URL
+    """
+    if _PLAIN_PATH.fullmatch(path):
+        return _door_root(webdav_url) + path
+    return (URL(webdav_url) / path).as_uri()
+
+
+def _merge_ranges(ranges, max_gap):
+    """
+    Merge byte ranges that overlap or are separated by at most `max_gap` bytes.
+
+    :param ranges: (list) tuples with first byte, last byte (excluded) and
+        index of the ranges
+    :param max_gap: (int) maximum gap (in bytes) between merged ranges
+    :return: (list) first byte and last byte (excluded) of the merged ranges,
+        together with the list of the original ranges they include
+    """
+    merged = []
+    for start, end, index in sorted(ranges):
+        if merged and start <= merged[-1][1] + max_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end, []])
+        merged[-1][2].append((index, start, end))
+    return merged
+
+
+class _RequestBody(io.RawIOBase):
+    """
+    Binary file sent as request body, which is left open when the request
+    body is closed, so that it can be rewound and sent again.
+
+    :param f: binary file object, open for reading
+    """
+
+    def __init__(self, f):
+        super().__init__()
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def fileno(self):
+        return self._f.fileno()
+
+
+class _ProgressReader(_RequestBody):
+    """
+    Binary file sent as request body, reporting the bytes read to a callback.
+    Seeking back (e.g. to repeat an upload) moves the progress back as well.
+
+    :param f: binary file object, open for reading
+    :param callback: (fsspec.callbacks.Callback) callback to track progress
+    """
+
+    def __init__(self, f, callback):
+        super().__init__(f)
+        self._start = f.tell()
+        self.callback = callback
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.callback.relative_update(len(data))
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        position = super().seek(offset, whence)
+        self.callback.absolute_update(position - self._start)
+        return position
+
+
+def _parent(path):
+    return path.rstrip('/').rsplit('/', 1)[0] or '/'
+
+
+def _is_file_listing(path, listing):
+    # the listing of a file path only includes the file itself
+    return len(listing) == 1 and listing[0]['name'] == path and \
+        listing[0]['type'] != 'directory'
+
+
+def _local_size(index):
+    # size of the local file given as the index-th argument of a transfer
+    def nbytes(out, *args, **kwargs):
+        path = args[index] if len(args) > index else kwargs.get('lpath')
+        try:
+            return os.path.getsize(path)
+        except (OSError, TypeError):
+            return 0
+    return nbytes
+
+
+class dCacheRemoveError(OSError):
+    """
+    Error raised when multiple paths could not be removed.
+
+    :param errors: (dict) paths that could not be removed, and the
+        corresponding exceptions
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        path, error = next(iter(errors.items()))
+        super().__init__(
+            f'Failed to remove {len(errors)} paths, first error for '
+            f'{path}: {error!r}'
+        )
+
+
+class dCacheTPCError(OSError):
+    """
+    Error raised when third-party copies fail.
+
+    :param reports: (list) reports of the failed copies (see `tpc_copy`)
+    """
+
+    def __init__(self, reports):
+        self.reports = reports
+        report = reports[0]
+        super().__init__(
+            f'Third-party copy failed for {len(reports)} files, first error '
+            f'for {report["source"]}: {report["error"]}'
+        )
+
+
+class dCacheSyncError(OSError):
+    """
+    Error raised when some paths could not be synchronized.
+
+    :param errors: (dict) relative paths that could not be synchronized, and
+        the corresponding exceptions
+    :param report: (dict) report of the synchronization (see `sync`)
+    """
+
+    def __init__(self, errors, report):
+        self.errors = errors
+        self.report = report
+        path, error = next(iter(errors.items()))
+        super().__init__(
+            f'Failed to synchronize {len(errors)} paths, first error for '
+            f'{path}: {error!r}'
+        )
+
+
+def _list_local(root):
+    """
+    List a local directory tree.
+
+    :param root: (str) local directory path
+    :return: (dict) type, size and modification time (in seconds) of all
+        files and directories, with paths relative to the root as keys
+    """
+    out = {}
+    stack = [('', root)]
+    while stack:
+        relative, path = stack.pop()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = f'{relative}/{entry.name}' if relative else entry.name
+                stat = entry.stat()
+                if entry.is_dir():
+                    out[name] = dict(type='directory', size=0, mtime=0.)
+                    stack.append((name, entry.path))
+                else:
+                    out[name] = dict(type='file', size=stat.st_size,
+                                     mtime=stat.st_mtime)
+    return out
+
+
+def _newer(mtime, other):
+    # modification times are compared at the millisecond resolution of dCache
+    return round(mtime * 1000) > round(other * 1000)
+
+
+def _remove_local(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _local_adler32(path):
+    checksum = 1
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            checksum = zlib.adler32(chunk, checksum)
+    return f'{checksum:08x}'
+
+
 class dCacheFileSystem(AsyncFileSystem):
     """
     File system interface for a dCache storage instance.
@@ -80,8 +376,69 @@ class dCacheFileSystem(AsyncFileSystem):
     :param batch_size: (int, optional) if asynchronous, number of coroutines to
         submit/wait on simultaneously
     :param encoded: use encoded strings when formatting URLs
+    :param page_size: (int, optional) maximum number of entries requested at
+        once to the API when listing directory content
+    :param download_streams: (int, optional) number of concurrent range
+        requests used to download a file with `get`. Files smaller than
+        `download_part_size` are always downloaded with a single request
+    :param download_part_size: (int, optional) size of the file parts
+        downloaded by each range request, in bytes
+    :param chunked_uploads: (bool, optional) if True, files opened for
+        writing stream their content to dCache while being written, using
+        chunked transfer encoding. Otherwise, the content is written to a
+        temporary file on disk and uploaded when closing the file
+    :param ranges_max_gap: (int, optional) when reading multiple byte ranges
+        with `cat_ranges`, ranges of the same file separated by at most this
+        number of bytes are merged and downloaded with a single request
+    :param multipart_ranges: (bool, optional) if True, `cat_ranges` requests
+        all (merged) ranges of a file at once, as a multipart/byteranges
+        response. Disabled if the WebDAV door does not support it
+    :param retry_policy: (RetryPolicy, optional) policy to retry requests
+        failing with transient errors, and to suspend requests to failing
+        hosts. If None, use the default `RetryPolicy`
+    :param connection_limit: (int, optional) maximum number of simultaneous
+        connections of each connection pool. If 0, there is no limit
+    :param connection_limit_per_host: (int, optional) maximum number of
+        simultaneous connections to the same host. If 0, there is no limit
+    :param keepalive_timeout: (float, optional) time (in seconds) idle
+        connections are kept open for reuse
+    :param dns_cache_ttl: (int, optional) time (in seconds) host name
+        resolutions are cached. If None, they are cached forever
+    :param separate_api_pool: (bool, optional) if True, requests to the API
+        use their own connection pool, so that they are not delayed by data
+        transfers via WebDAV. Connection pool options are ignored if a
+        `connector` is provided in `client_kwargs`
+    :param metrics: (bool, optional) if True, record the number of calls,
+        HTTP requests and errors, the bytes transferred and the latency of
+        the file-system operations (see `stats`)
+    :param block_cache: (DiskBlockCache or str, optional) persistent cache
+        on local disk for the blocks of the files read with `cat_file` and
+        `open`, or directory where to store it. Cached blocks are only used
+        if the size and modification time of the file are unchanged
+    :param verify_checksums: (bool, optional) if True, `get_file`,
+        `put_file` and files opened with `open` compute the checksum of the
+        data while transferring it, and compare it with the checksum stored
+        by dCache
+    :param stage_nearline: (bool, optional) if True, `get` stages the files
+        that are only stored on tape (NEARLINE) with a single bulk request,
+        and downloads the files that are online while the others are staged
+    :param transfer_bytes_limit: (int, optional) maximum aggregate size of
+        the files transferred simultaneously by `get`, `put` and `sync`, in
+        bytes. If None, only their number is limited (`batch_size`)
+    :param redirect_cache_ttl: (float, optional) time (in seconds) the pool
+        URLs that WebDAV doors redirect downloads to are cached, so that
+        following range requests for the same file (e.g. with `cat_file`) are
+        sent to the pool directly. Files opened for reading keep the pool
+        URL while open. If 0 or None, pool URLs are only cached by open files
+    :param tpc_mode: (str, optional) mode of the HTTP third-party copies
+        between different WebDAV doors: "pull" (the destination door fetches
+        the data from the source) or "push" (the source door sends the data
+        to the destination)
     :param storage_options: (dict, optional) keyword arguments passed on to the
-        super-class
+        super-class. Set `use_listings_cache` to True to cache directory
+        listings, which are then also used to retrieve file and directory
+        info. Listings expire after `listings_expiry_time` seconds (if set),
+        and at most `max_paths` listings are kept (if set)
     """
 
     def __init__(
@@ -98,6 +455,25 @@ class dCacheFileSystem(AsyncFileSystem):
         loop=None,
         batch_size=None,
         encoded=True,
+        page_size=None,
+        download_streams=1,
+        download_part_size=DOWNLOAD_PART_SIZE,
+        chunked_uploads=True,
+        ranges_max_gap=RANGES_MAX_GAP,
+        multipart_ranges=False,
+        retry_policy=None,
+        connection_limit=100,
+        connection_limit_per_host=0,
+        keepalive_timeout=15.,
+        dns_cache_ttl=10,
+        separate_api_pool=True,
+        metrics=True,
+        block_cache=None,
+        verify_checksums=False,
+        stage_nearline=True,
+        transfer_bytes_limit=None,
+        redirect_cache_ttl=REDIRECT_CACHE_TTL,
+        tpc_mode="pull",
         **storage_options
     ):
         super().__init__(
@@ -112,6 +488,38 @@ class dCacheFileSystem(AsyncFileSystem):
         self.client_kwargs = {} if client_kwargs is None else client_kwargs
         self.request_kwargs = {} if request_kwargs is None else request_kwargs
         self.encoded = encoded
+        self.page_size = LISTING_PAGE_SIZE if page_size is None else page_size
+        self.dircache = dCacheDirCache(**storage_options)
+        self.download_streams = download_streams
+        self.download_part_size = download_part_size
+        self.chunked_uploads = chunked_uploads
+        self.ranges_max_gap = ranges_max_gap
+        self.multipart_ranges = multipart_ranges
+        self.info_requests = collections.Counter(sent=0, coalesced=0)
+        self.retry_policy = RetryPolicy() if retry_policy is None \
+            else retry_policy
+        self._breakers = {}
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.separate_api_pool = separate_api_pool and \
+            'connector' not in self.client_kwargs
+        self._info_pending = {}
+        self.metrics = Metrics() if metrics else None
+        if isinstance(block_cache, (str, os.PathLike)):
+            block_cache = DiskBlockCache(block_cache)
+        self.block_cache = block_cache
+        self.verify_checksums = verify_checksums
+        self.stage_nearline = stage_nearline
+        self.transfer_bytes_limit = transfer_bytes_limit
+        self.redirect_cache_ttl = redirect_cache_ttl
+        self._redirects = {}
+        # URLs of the cached redirects, by namespace path
+        self._redirect_paths = {}
+        if tpc_mode not in {"pull", "push"}:
+            raise ValueError('tpc_mode should be "pull" or "push"')
+        self.tpc_mode = tpc_mode
         if (username is None) ^ (password is None):
             raise ValueError('Username or password not provided')
         if (username is not None) and (password is not None):
@@ -127,6 +535,7 @@ class dCacheFileSystem(AsyncFileSystem):
         block_size = DEFAULT_BLOCK_SIZE if block_size is None else block_size
         self.block_size = block_size
         self._session = None
+        self._api_session = None
         if not asynchronous:
             sync(self.loop, self.set_session)
 
@@ -136,7 +545,7 @@ class dCacheFileSystem(AsyncFileSystem):
             try:
                 sync(loop, session.close, timeout=0.1)
                 return
-            except (TimeoutError, FSTimeoutError):
+            except (TimeoutError, FSTimeoutError, NotImplementedError):
                 pass
         connector = getattr(session, "_connector", None)
         if connector is not None:
@@ -146,21 +555,87 @@ class dCacheFileSystem(AsyncFileSystem):
     def encode_url(self, url):
         return yarl.URL(url, encoded=self.encoded)
 
-    async def set_session(self):
+    async def set_session(self, api=False):
+        """
+        Get the HTTP session, creating it if needed.
+
+        :param api: (bool, optional) if True, get the session for requests to
+            the API, which has its own connection pool if `separate_api_pool`
+            is set
+        :return: (aiohttp.ClientSession) session
+        """
+        if api and self.separate_api_pool:
+            if self._api_session is None:
+                self._api_session = await self._new_session()
+            return self._api_session
         if self._session is None:
-            self._session = await get_client(
-                loop=self.loop,
-                **self.client_kwargs
-            )
-            if not self.asynchronous:
-                weakref.finalize(
-                    self,
-                    self.close_session,
-                    self.loop,
-                    self._session
-                )
+            self._session = await self._new_session()
         return self._session
 
+    async def _new_session(self):
+        client_kwargs = self.client_kwargs
+        if 'connector' not in client_kwargs:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            client_kwargs = dict(client_kwargs, connector=connector)
+        session = await get_client(loop=self.loop, **client_kwargs)
+        if not self.asynchronous:
+            weakref.finalize(self, self.close_session, self.loop, session)
+        return session
+
+    def pool_stats(self):
+        """
+        Report the usage of the connection pools.
+
+        :return: (dict) for each connection pool ("webdav" and, if separate,
+            "api"), the number of connections in use ("active"), the number of
+            open connections available for reuse ("idle") and the number of
+            requests waiting for a connection ("waiting"), together with the
+            pool limits
+        """
+        sessions = dict(webdav=self._session, api=self._api_session)
+        stats = {}
+        for name, session in sessions.items():
+            if session is None:
+                continue
+            connector = session.connector
+            stats[name] = dict(
+                active=len(getattr(connector, '_acquired', ())),
+                idle=sum(
+                    len(conns) for conns in
+                    getattr(connector, '_conns', {}).values()
+                ),
+                waiting=sum(
+                    len(waiters) for waiters in
+                    getattr(connector, '_waiters', {}).values()
+                ),
+                limit=connector.limit,
+                limit_per_host=connector.limit_per_host
+            )
+        return stats
+
+    def stats(self, reset=False):
+        """
+        Metrics of the file-system operations (see `Metrics.snapshot`).
+
+        Operations running within other operations (e.g. `info` while running
+        `get_file`) are part of the outer operation, and HTTP requests sent
+        outside of any of the recorded operations are counted as "other".
+        Hooks to forward the metrics (e.g. to Prometheus exporters) can be
+        registered with `metrics.add_hook`.
+
+        :param reset: (bool, optional) if True, discard the recorded data
+            after reading it
+        :return: (dict) metrics for each operation type
+        """
+        if self.metrics is None:
+            return {}
+        return self.metrics.snapshot(reset=reset)
+
     @property
     def api_url(self):
         if self._api_url is None:
@@ -221,32 +696,504 @@ class dCacheFileSystem(AsyncFileSystem):
         url = URL(path)
         return url.drive if "http" in url.scheme else None
 
-    async def _get_info(self, path, children=False, limit=None, **kwargs):
+    async def _send(self, method, url, max_retries=None, **kwargs):
+        """
+        Send a request, retrying it according to the retry policy if it fails
+        with a transient error.
+
+        Data that cannot be rewound (e.g. async generators) is sent once.
+        If requests to the host are suspended by the circuit breaker, a
+        request that could be retried waits for the circuit to be half-open,
+        for at most `max_retries` times the maximum backoff delay overall.
+
+        :param method: (str) HTTP method
+        :param url: (str) target URL
+        :param max_retries: (int, optional) maximum number of retries; use
+            the retry policy value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (aiohttp.ClientResponse) response, to be released by the
+            caller
+        """
+        policy = self.retry_policy
+        if max_retries is None:
+            max_retries = policy.max_retries
+        breaker = self._get_breaker(url)
+        data = kwargs.get("data")
+        position = data.tell() if hasattr(data, "seek") else None
+        replayable = data is None or position is not None or \
+            isinstance(data, (bytes, bytearray, str, dict))
+        api = self._api_url is not None and url.startswith(self._api_url)
+        session = await self.set_session(api=api)
+        attempt = 0
+        suspended = 0.
+        while True:
+            try:
+                breaker.check(URL(url).hostinfo)
+            except CircuitOpenError as e:
+                # the request has not been sent: if it could be retried, it
+                # waits for the circuit to be half-open, or for the trial
+                # request to complete, without using its retries
+                delay = breaker.retry_in() or policy.backoff_base
+                if attempt >= max_retries or \
+                        suspended + delay > max_retries * policy.backoff_max:
+                    raise
+                suspended += delay
+                logger.debug(f"{method} {url} suspended ({e!r}), retry in "
+                             f"{delay:.2f} s")
+                await asyncio.sleep(delay)
+                continue
+            if self.metrics is not None:
+                self.metrics.record_request()
+            if position is not None and not isinstance(data, io.BytesIO):
+                # aiohttp closes file bodies after each request
+                kwargs["data"] = _RequestBody(data)
+            try:
+                r = await session.request(method, url, **kwargs)
+            except TRANSIENT_ERRORS as e:
+                breaker.record_failure()
+                if not (replayable and attempt < max_retries
+                        and policy.is_retryable(method, e)):
+                    raise
+                delay = policy.delay(attempt)
+                reason = repr(e)
+            else:
+                if r.status not in policy.statuses:
+                    breaker.record_success()
+                    return r
+                if is_throttled(r.status, r.headers):
+                    breaker.record_throttled()
+                else:
+                    breaker.record_failure()
+                if not (replayable and attempt < max_retries
+                        and policy.is_retryable(method)):
+                    return r
+                delay = policy.delay(attempt, r.headers.get("Retry-After"))
+                reason = f"status {r.status}"
+                r.release()
+            attempt += 1
+            logger.debug(
+                f"{method} {url} failed ({reason}), retry {attempt} of "
+                f"{max_retries} in {delay:.2f} s"
+            )
+            await asyncio.sleep(delay)
+            if position is not None:
+                data.seek(position)
+
+    @contextlib.asynccontextmanager
+    async def _request(self, method, url, **kwargs):
+        """
+        Send a request with retries (see `_send`), and release the response
+        on exit.
+        """
+        r = await self._send(method, url, **kwargs)
+        async with r:
+            yield r
+
+    async def _iter_content(
+        self,
+        url,
+        start=None,
+        end=None,
+        chunk_size=2**20,
+        callback=None,
+        redirects=None,
+        **kwargs
+    ):
+        """
+        Iterate over the content of a remote file (or of a byte range of it)
+        as it is downloaded.
+
+        If the connection drops while the content is received, the download
+        is resumed from the last byte received, using a range request,
+        according to the retry policy.
+
+        If the WebDAV door redirects the request to a pool, the pool URL is
+        cached (see `redirect_cache_ttl`), and the following requests for the
+        same file are sent to the pool directly. If a request to a cached
+        pool URL fails, the URL is discarded and the request is sent to the
+        door again.
+
+        :param url: (str) remote file URL
+        :param start: (int, optional) first byte of the range
+        :param end: (int, optional) last byte (excluded) of the range
+        :param chunk_size: (int, optional) maximum size of the chunks yielded
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the download progress; its size is set from the length of
+            the first response
+        :param redirects: (dict, optional) cache of the pool URLs, with no
+            expiry time (e.g. the one of an open file); use the file-system
+            cache if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (async generator) chunks of bytes
+        """
+        policy = self.retry_policy
+        headers = kwargs.pop("headers", {})
+        received = 0
+        attempt = 0
+        while True:
+            offset = (start or 0) + received
+            request_headers = headers
+            ranged = start is not None or end is not None or received > 0
+            if ranged:
+                last = "" if end is None else f"{end - 1}"
+                request_headers = dict(headers, Range=f"bytes={offset}-{last}")
+            pool_url = self._get_redirect(url, redirects)
+            try:
+                # requests to the pool are not retried, but sent to the door
+                async with self._request(
+                        "GET",
+                        pool_url or url,
+                        headers=request_headers,
+                        max_retries=None if pool_url is None else 0,
+                        **kwargs) as r:
+                    if pool_url is not None and r.status >= 400:
+                        raise aiohttp.ClientResponseError(
+                            r.request_info, r.history, status=r.status
+                        )
+                    if r.status == 404:
+                        raise FileNotFoundError(url)
+                    r.raise_for_status()
+                    if ranged and r.status != 206 and \
+                            (offset or end is not None):
+                        raise ValueError(
+                            f"The WebDAV door does not support range "
+                            f"requests, cannot read {url} from byte {offset}"
+                        )
+                    if pool_url is None and r.history:
+                        self._set_redirect(url, str(r.url), redirects)
+                    if callback is not None and attempt == 0:
+                        callback.set_size(r.content_length)
+                    try:
+                        async for chunk in r.content.iter_chunked(chunk_size):
+                            received += len(chunk)
+                            if callback is not None:
+                                callback.relative_update(len(chunk))
+                            yield chunk
+                        return
+                    except TRANSIENT_ERRORS as e:
+                        if attempt >= policy.max_retries:
+                            raise
+                        self._discard_redirect(url, redirects)
+                        error = e
+            except aiohttp.ClientError as e:
+                if pool_url is None:
+                    raise
+                logger.debug(f"Request to pool URL {pool_url} failed "
+                             f"({e!r}), sending it to the door")
+                self._discard_redirect(url, redirects)
+                continue
+            delay = policy.delay(attempt)
+            attempt += 1
+            logger.debug(
+                f"Download of {url} interrupted after {received} bytes "
+                f"({error!r}), resuming in {delay:.2f} s"
+            )
+            await asyncio.sleep(delay)
+
+    def _get_redirect(self, url, redirects=None):
+        """
+        Get the cached pool URL that the door redirected a URL to.
+
+        :param url: (str) file URL on the WebDAV door
+        :param redirects: (dict, optional) cache of the pool URLs; use the
+            file-system cache if None
+        :return: (str) pool URL, None if not cached or expired
+        """
+        redirects = self._redirects if redirects is None else redirects
+        entry = redirects.get(url)
+        if entry is None:
+            return None
+        location, expiry = entry
+        if expiry is not None and time.monotonic() >= expiry:
+            self._discard_redirect(url, redirects)
+            return None
+        return location
+
+    def _set_redirect(self, url, location, redirects=None):
+        """
+        Cache the pool URL that the door redirected a URL to.
+
+        :param url: (str) file URL on the WebDAV door
+        :param location: (str) pool URL
+        :param redirects: (dict, optional) cache of the pool URLs, with no
+            expiry time; use the file-system cache if None
+        """
+        if redirects is not None:
+            redirects[url] = (location, None)
+            return
+        if not self.redirect_cache_ttl:
+            return
+        if len(self._redirects) >= REDIRECT_CACHE_SIZE:
+            now = time.monotonic()
+            for key, entry in list(self._redirects.items()):
+                if entry[1] <= now:
+                    self._discard_redirect(key)
+            while len(self._redirects) >= REDIRECT_CACHE_SIZE:
+                # drop the oldest entry
+                self._discard_redirect(next(iter(self._redirects)))
+        self._redirects[url] = (
+            location, time.monotonic() + self.redirect_cache_ttl
+        )
+        self._redirect_paths.setdefault(yarl.URL(url).path, set()).add(url)
+
+    def _discard_redirect(self, url, redirects=None):
+        """ Remove a pool URL from the cache. """
+        if redirects is not None and redirects is not self._redirects:
+            redirects.pop(url, None)
+            return
+        if self._redirects.pop(url, None) is None:
+            return
+        path = yarl.URL(url).path
+        urls = self._redirect_paths.get(path, set())
+        urls.discard(url)
+        if not urls:
+            self._redirect_paths.pop(path, None)
+
+    def _get_breaker(self, url):
+        """ Get the circuit breaker of the host of a URL. """
+        origin = str(yarl.URL(url).origin())
+        breaker = self._breakers.get(origin)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                self.retry_policy.breaker_threshold,
+                self.retry_policy.breaker_timeout
+            )
+            self._breakers[origin] = breaker
+        return breaker
+
+    async def _get_info(
+        self,
+        path,
+        children=False,
+        limit=None,
+        offset=None,
+        locality=False,
+        checksum=False,
+        **kwargs
+    ):
         """
         Request file or directory metadata to the API.
 
+        Concurrent calls for the same path (and the same children, limit and
+        offset) share a single request and its result. The number of requests
+        sent and saved is counted in `info_requests`.
+
         :param path: (str) target path
         :param children: (bool, optional) if True, return metadata of the
             children paths as well
         :param limit: (int, optional) if provided and children is True, set
             limit to the number of children returned
-        :param kwargs: (dict, optional) arguments passed on to requests
+        :param offset: (int, optional) if provided and children is True, skip
+            this number of children paths
+        :param locality: (bool, optional) if True, request the file locality
+            (e.g. ONLINE, NEARLINE) as well
+        :param checksum: (bool, optional) if True, request the file checksums
+            as well
+        :param kwargs: (dict, optional) arguments passed on to requests. If
+            given, the request is not shared with other calls
         :return: (dict) path metadata
         """
+        if kwargs:
+            return await self._request_info(
+                path, children, limit, offset, locality, checksum, **kwargs
+            )
+        key = (path, children, limit, offset) if children else (path,)
+        key += (locality, checksum)
+        task = self._info_pending.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._request_info(
+                path, children, limit, offset, locality, checksum
+            ))
+            self._info_pending[key] = task
+
+            def done(task):
+                if self._info_pending.get(key) is task:
+                    del self._info_pending[key]
+                if not task.cancelled():
+                    task.exception()  # mark the exception as retrieved
+
+            task.add_done_callback(done)
+        else:
+            self.info_requests['coalesced'] += 1
+        # a caller being cancelled does not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _request_info(
+        self,
+        path,
+        children,
+        limit,
+        offset,
+        locality=False,
+        checksum=False,
+        **kwargs
+    ):
+        self.info_requests['sent'] += 1
         url = URL(self.api_url) / 'namespace' / _encode(path)
         url = url.with_query(children=children)
+        # checksum and locality lookups are costly for dCache, and make the
+        # responses larger: they are only requested if needed
+        if checksum:
+            url = url.add_query(checksum=True)
+        if locality:
+            url = url.add_query(locality=True)
         if limit is not None and children:
             url = url.add_query(limit=f'{limit}')
+        if offset and children:
+            url = url.add_query(offset=f'{offset}')
         url = url.as_uri()
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
-        session = await self.set_session()
-        async with session.get(url, **request_kwargs) as r:
+        async with self._request("GET", url, **request_kwargs) as r:
             if r.status == 404:
                 raise FileNotFoundError(url)
             r.raise_for_status()
             return await r.json()
 
+    async def _ls_pages(self, path, limit=None, page_size=None, **kwargs):
+        """
+        List path content, one page of entries at a time.
+
+        Pages are requested to the API using offset and limit. The next page
+        is requested while the current one is being consumed.
+
+        :param path: (str) target path (file or directory)
+        :param limit: (int, optional) set the maximum number of children paths
+            returned to this value
+        :param page_size: (int, optional) number of entries requested at once;
+            use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (async generator) lists of dictionaries with the (children)
+            path(s) info
+        """
+        path = self._strip_protocol(path)
+        page_size = self.page_size if page_size is None else page_size
+
+        def get_page(offset):
+            size = page_size if limit is None \
+                else min(page_size, limit - offset)
+            task = asyncio.ensure_future(self._get_info(
+                path,
+                children=True,
+                limit=size,
+                offset=offset,
+                **kwargs
+            ))
+            return task, size
+
+        offset = 0
+        page, size = get_page(offset)
+        try:
+            while page is not None:
+                info = await page
+                page = None
+                details = _get_details(path, info)
+                if details['type'] != 'directory':
+                    yield [details]
+                    return
+                elements = (info.get('children') or [])[:size]
+                offset += len(elements)
+                full_page = len(elements) == size
+                if full_page and (limit is None or offset < limit):
+                    page, size = get_page(offset)
+                if elements:
+                    yield _get_listing_details(path, elements)
+        finally:
+            if page is not None:
+                page.cancel()
+
+    async def _ls_cached_pages(
+        self,
+        path,
+        limit=None,
+        checksum=False,
+        **kwargs
+    ):
+        """
+        List path content, one page of entries at a time, using the listings
+        cache: cached listings are returned as a single page, and complete
+        listings are cached, if caching is enabled.
+
+        :param path: (str) target path (file or directory)
+        :param limit: (int, optional) set the maximum number of children paths
+            returned to this value
+        :param checksum: (bool, optional) if True, include the file checksums
+            stored by dCache in the entries. Cached listings, which might not
+            include them, are not used
+        :param kwargs: (dict, optional) arguments passed on to `_ls_pages`
+        :return: (async generator) lists of dictionaries with the (children)
+            path(s) info
+        """
+        path = self._strip_protocol(path)
+        listing = None
+        if not checksum:
+            try:
+                listing = self.dircache[path]
+            except KeyError:
+                pass
+        if listing is not None:
+            yield listing[:limit]
+            return
+
+        cache = self.dircache.use_listings_cache and limit is None
+        listing = []
+        pages = self._ls_pages(path, limit=limit, checksum=checksum, **kwargs)
+        try:
+            async for page in pages:
+                if cache:
+                    listing.extend(page)
+                yield page
+        finally:
+            await pages.aclose()
+        if cache and not _is_file_listing(path, listing):
+            self.dircache[path] = listing
+
+    async def _ls_iter(self, path, detail=True, limit=None, **kwargs):
+        """
+        Iterate over path content, as the listing pages are retrieved.
+
+        :param path: (str) target path (file or directory)
+        :param detail: (bool, optional) if True, yield dictionaries with the
+            (children) path(s) info. If False, yield paths
+        :param limit: (int, optional) set the maximum number of children paths
+            returned to this value
+        :param kwargs: (dict, optional) arguments passed on to `_ls_pages`
+        :return: (async generator) dictionaries if detail is True, strings
+            otherwise
+        """
+        pages = self._ls_cached_pages(path, limit=limit, **kwargs)
+        try:
+            async for page in pages:
+                for details in page:
+                    yield details if detail else details.get('name')
+        finally:
+            await pages.aclose()
+
+    def ls_iter(self, path, detail=True, limit=None, **kwargs):
+        """
+        Iterate over path content, as the listing pages are retrieved.
+
+        :param path: (str) target path (file or directory)
+        :param detail: (bool, optional) if True, yield dictionaries with the
+            (children) path(s) info. If False, yield paths
+        :param limit: (int, optional) set the maximum number of children paths
+            returned to this value
+        :param kwargs: (dict, optional) arguments passed on to `_ls_pages`
+        :return: (generator) dictionaries if detail is True, strings otherwise
+        """
+        pages = self._ls_cached_pages(path, limit=limit, **kwargs)
+        try:
+            while True:
+                try:
+                    page = sync(self.loop, pages.__anext__)
+                except StopAsyncIteration:
+                    return
+                for details in page:
+                    yield details if detail else details.get('name')
+        finally:
+            sync(self.loop, pages.aclose)
+
+    @instrumented('ls')
     async def _ls(self, path, detail=True, limit=None, **kwargs):
         """
         List path content.
@@ -260,27 +1207,226 @@ class dCacheFileSystem(AsyncFileSystem):
         :return: (list) if detail is True, list of dictionaries. List of
             strings otherwise
         """
+        return [
+            details async for details in self._ls_iter(
+                path,
+                detail=detail,
+                limit=limit,
+                **kwargs
+            )
+        ]
+
+    ls = sync_wrapper(_ls)
+
+    async def _scan(self, path, maxdepth=None, batch_size=None, **kwargs):
+        """
+        List a directory tree breadth-first, with concurrent requests.
+
+        Directory listings are yielded as soon as they are retrieved. The
+        subdirectories found in a listing are scheduled for listing after the
+        caller resumes iteration, so that the caller can prune the traversal
+        by removing elements from the list of subdirectories yielded.
+
+        :param path: (str) root of the tree
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param batch_size: (int, optional) maximum number of directories
+            listed simultaneously; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (async generator) tuples with the directory path, its
+            listing (or the exception raised when listing it) and the list of
+            its subdirectory paths
+        """
+        batch_size = batch_size or self.batch_size or \
+            _get_batch_size(nofiles=True)
+        todo = collections.deque([(path, 1)])
+        pending = {}
+        try:
+            while todo or pending:
+                while todo and len(pending) < batch_size:
+                    dirpath, depth = todo.popleft()
+                    task = asyncio.ensure_future(
+                        self._ls(dirpath, detail=True, **kwargs)
+                    )
+                    pending[task] = (dirpath, depth)
+                done, _ = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    dirpath, depth = pending.pop(task)
+                    try:
+                        listing = task.result()
+                    except OSError as e:
+                        yield dirpath, e, []
+                        continue
+                    subdirs = [
+                        info['name'] for info in listing
+                        if info['type'] == 'directory'
+                        and info['name'] != dirpath
+                    ]
+                    if maxdepth is not None and depth >= maxdepth:
+                        subdirs = []
+                    yield dirpath, listing, subdirs
+                    todo.extend((subdir, depth + 1) for subdir in subdirs)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _walk(
+        self,
+        path,
+        maxdepth=None,
+        topdown=True,
+        on_error="omit",
+        detail=False,
+        **kwargs
+    ):
+        """
+        Walk the directory tree.
+
+        Directories are listed breadth-first, with concurrent requests (see
+        `_scan`). When walking top-down, directories are yielded as soon as
+        they are listed, and subdirectories removed from the yielded ones are
+        not visited.
+
+        :param path: (str) root of the tree
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param topdown: (bool, optional) if True, yield a directory before its
+            subdirectories
+        :param on_error: (str or callable, optional) if "raise", raise errors
+            encountered while listing; if callable, call it with the error;
+            omit the errors otherwise
+        :param detail: (bool, optional) if True, yield dictionaries with the
+            paths info instead of lists of names
+        :param kwargs: (dict, optional) arguments passed on to `_scan`
+        :return: (async generator) for each directory, tuples with the
+            directory path, its subdirectories and its files
+        """
+        if maxdepth is not None and maxdepth < 1:
+            raise ValueError("maxdepth must be at least 1")
         path = self._strip_protocol(path)
+        bottomup = []
+        async for dirpath, listing, subdirs in self._scan(
+            path,
+            maxdepth=maxdepth,
+            **kwargs
+        ):
+            dirs, files = {}, {}
+            if isinstance(listing, Exception):
+                if on_error == "raise":
+                    raise listing
+                elif callable(on_error):
+                    on_error(listing)
+            else:
+                for info in listing:
+                    pathname = info['name'].rstrip('/')
+                    name = pathname.rsplit('/', 1)[-1]
+                    if pathname == dirpath:
+                        files[''] = info
+                    elif info['type'] == 'directory':
+                        dirs[name] = info
+                    else:
+                        files[name] = info
+            if not detail:
+                dirs, files = list(dirs), list(files)
+            if not topdown:
+                bottomup.append((dirpath, dirs, files))
+                continue
+            yield dirpath, dirs, files
+            # only visit subdirectories that have not been removed
+            subdirs[:] = [
+                subdir for subdir in subdirs
+                if subdir.rsplit('/', 1)[-1] in dirs
+            ]
+        for _ in reversed(bottomup):
+            yield _
 
-        info = await self._get_info(
+    def walk(self, path, maxdepth=None, topdown=True, **kwargs):
+        """
+        Walk the directory tree.
+
+        :param path: (str) root of the tree
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param topdown: (bool, optional) if True, yield a directory before its
+            subdirectories
+        :param kwargs: (dict, optional) arguments passed on to `_walk`
+        :return: (generator) for each directory, tuples with the directory
+            path, its subdirectories and its files
+        """
+        it = self._walk(path, maxdepth=maxdepth, topdown=topdown, **kwargs)
+        try:
+            while True:
+                try:
+                    yield sync(self.loop, it.__anext__)
+                except StopAsyncIteration:
+                    return
+        finally:
+            sync(self.loop, it.aclose)
+
+    async def _find(
+        self,
+        path,
+        maxdepth=None,
+        withdirs=False,
+        detail=False,
+        **kwargs
+    ):
+        """
+        List all files below path.
+
+        Directories are listed breadth-first, with concurrent requests (see
+        `_scan`).
+
+        :param path: (str) root of the tree
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param withdirs: (bool, optional) if True, include directories
+        :param detail: (bool, optional) if True, return a dictionary with the
+            paths info instead of a list of paths
+        :param kwargs: (dict, optional) arguments passed on to `_scan`
+        :return: (list or dict) sorted paths, or paths and their info
+        """
+        if maxdepth is not None and maxdepth < 1:
+            raise ValueError("maxdepth must be at least 1")
+        path = self._strip_protocol(path)
+        out = {}
+        async for dirpath, listing, _ in self._scan(
             path,
-            children=True,
-            limit=limit,
+            maxdepth=maxdepth,
             **kwargs
-        )
-        details = _get_details(path, info)
-        if details['type'] == 'directory':
-            elements = info.get('children') or []
-            details = [_get_details(path, el) for el in elements]
-        else:
-            details = [details]
+        ):
+            if isinstance(listing, Exception):
+                if dirpath == path:
+                    return {} if detail else []
+                continue
+            for info in listing:
+                if info['type'] == 'directory' and not withdirs:
+                    continue
+                out[info['name']] = info if detail else None
+        if withdirs and path not in out:
+            info = await self._info(path)
+            if info['type'] == 'directory':
+                out[path] = info if detail else None
+        names = sorted(out)
+        if not detail:
+            return names
+        return {name: out[name] for name in names}
 
-        if detail:
-            return details
-        else:
-            return [d.get('name') for d in details]
+    async def _du(self, path, total=True, maxdepth=None, **kwargs):
+        """
+        Space used by the files below path.
 
-    ls = sync_wrapper(_ls)
+        :param path: (str) root of the tree
+        :param total: (bool, optional) if True, return the total size.
+            Otherwise, return a dictionary with the size of each file
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param kwargs: (dict, optional) arguments passed on to `_find`
+        :return: (int or dict) size in bytes
+        """
+        out = await self._find(path, maxdepth=maxdepth, detail=True, **kwargs)
+        sizes = {name: info['size'] for name, info in out.items()}
+        if total:
+            return sum(size for size in sizes.values() if size is not None)
+        return sizes
 
     async def _cat_file(self, path, start=None, end=None, **kwargs):
         """
@@ -295,75 +1441,1667 @@ class dCacheFileSystem(AsyncFileSystem):
         webdav_url = self._get_webdav_url(path) or self.webdav_url
 
         path = self._strip_protocol(path)
-        url = URL(webdav_url) / path
-        url = url.as_uri()
+        url = _file_url(webdav_url, path)
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
         if (start is None) ^ (end is None):
             raise ValueError("Give start and end or neither")
-        if start is not None:
-            headers = request_kwargs.pop("headers", {}).copy()
-            headers["Range"] = "bytes=%i-%i" % (start, end - 1)
-            request_kwargs["headers"] = headers
-        session = await self.set_session()
-        async with session.get(url, **request_kwargs) as r:
+        return await self._fetch_file(url, path, start, end, **request_kwargs)
+
+    @instrumented('cat_file', nbytes=lambda out, *args, **kwargs: len(out))
+    async def _fetch_file(
+        self,
+        url,
+        path,
+        start=None,
+        end=None,
+        details=None,
+        **kwargs
+    ):
+        """
+        Get the content of a file, given its URL.
+
+        :param url: (str) target file URL
+        :param path: (str) target file path
+        :param start: (int, optional) first byte of the range
+        :param end: (int, optional) last byte (excluded) of the range
+        :param details: (dict, optional) file details, used with the block
+            cache; retrieved if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (bytes) file content
+        """
+        if self.block_cache is not None:
+            if details is None:
+                details = await self._info(path)
+            if details["type"] == "file":
+                return await self._cat_cached(
+                    url, details, start, end, **kwargs
+                )
+        chunks = [
+            chunk async for chunk in
+            self._iter_content(url, start, end, **kwargs)
+        ]
+        return b"".join(chunks)
+
+    async def _cat(
+        self,
+        path,
+        recursive=False,
+        on_error="raise",
+        batch_size=None,
+        **kwargs
+    ):
+        """
+        Get the content of one or more files.
+
+        Lists of files (e.g. the chunks of a Zarr array read through a
+        mapper) are downloaded by a fixed number of concurrent workers, each
+        sending a new request as soon as its previous one completes. By
+        default, there are as many workers as connections in the pool. The
+        file URLs are built once for the whole list and, if the block cache
+        is used, the details of all files are retrieved at once (see
+        `info_many`).
+
+        :param path: (str or list) target file path(s)
+        :param recursive: (bool, optional) if True, and a path is a
+            directory, get the content of all files in it
+        :param on_error: (str, optional) if "raise", raise the first error;
+            if "omit", leave out the files that cannot be read; if "return",
+            return the errors in place of the files' content
+        :param batch_size: (int, optional) maximum number of requests sent
+            simultaneously; use instance value if None, or the connection
+            limit if that is not set either
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (bytes or dict) file content, or content of the files by
+            (stripped) path
+        """
+        if isinstance(path, str) or not path or recursive or \
+                any(has_magic(p) for p in path):
+            return await super()._cat(
+                path,
+                recursive=recursive,
+                on_error=on_error,
+                batch_size=batch_size,
+                **kwargs
+            )
+        urls = {}
+        for p in path:
+            if "://" in p:
+                webdav_url = self._get_webdav_url(p) or self.webdav_url
+                p = self._strip_protocol(p)
+            else:
+                webdav_url = self.webdav_url
+            urls[p] = _file_url(webdav_url, p)
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        infos = {}
+        if self.block_cache is not None:
+            infos = await self._info_many(list(urls), on_error="omit")
+
+        limits = [self.connection_limit, self.connection_limit_per_host]
+        batch_size = batch_size or self.batch_size or \
+            min((limit for limit in limits if limit), default=None) or \
+            _get_batch_size(nofiles=True)
+        out = {}
+        todo = iter(urls.items())
+
+        async def worker():
+            for p, url in todo:
+                try:
+                    out[p] = await self._fetch_file(
+                        url, p, details=infos.get(p), **request_kwargs
+                    )
+                except Exception as e:
+                    out[p] = e
+
+        await asyncio.gather(
+            *(worker() for _ in range(min(batch_size, len(urls))))
+        )
+        if on_error == "raise":
+            for content in out.values():
+                if isinstance(content, Exception):
+                    raise content
+        return {
+            p: out[p] for p in urls
+            if on_error != "omit" or not isinstance(out[p], Exception)
+        }
+
+    async def _cat_cached(
+        self,
+        url,
+        details,
+        start=None,
+        end=None,
+        redirects=None,
+        **kwargs
+    ):
+        """
+        Get the content of a file via the local block cache, downloading the
+        blocks that are missing. Consecutive missing blocks are downloaded
+        with a single request.
+
+        :param url: (str) target file URL
+        :param details: (dict) file details, as returned by `info`
+        :param start: (int, optional) first byte of the range
+        :param end: (int, optional) last byte (excluded) of the range
+        :param redirects: (dict, optional) cache of the pool URLs (see
+            `_iter_content`)
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (bytes) file content
+        """
+        cache = self.block_cache
+        size = details["size"]
+        start = 0 if start is None else start
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return b""
+        first = start // cache.blocksize
+        last = (end - 1) // cache.blocksize
+        key = cache.key(url, size, details["modified"])
+
+        def lookup():
+            entry = cache.open(key, size)
+            blocks = {i: entry.get(i) for i in range(first, last + 1)}
+            if None not in blocks.values():
+                entry.close()
+            return entry, blocks
+
+        def store(entry, run):
+            for i in run:
+                entry.put(i, blocks[i])
+
+        # the cache files are read and written outside of the event loop
+        loop = asyncio.get_running_loop()
+        entry, blocks = await loop.run_in_executor(None, lookup)
+        runs = []
+        for i in sorted(i for i, block in blocks.items() if block is None):
+            if runs and runs[-1][-1] == i - 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+
+        async def fetch(run):
+            offset = run[0] * cache.blocksize
+            stop = min((run[-1] + 1) * cache.blocksize, size)
+            data = b"".join([
+                chunk async for chunk in
+                self._iter_content(
+                    url, offset, stop, redirects=redirects, **kwargs
+                )
+            ])
+            for i in run:
+                lo = i * cache.blocksize - offset
+                blocks[i] = data[lo:lo + cache.blocksize]
+            await loop.run_in_executor(None, store, entry, run)
+
+        if runs:
+            try:
+                await asyncio.gather(*(fetch(run) for run in runs))
+            finally:
+                await loop.run_in_executor(None, entry.close)
+        data = b"".join(blocks[i] for i in range(first, last + 1))
+        offset = start - first * cache.blocksize
+        return data[offset:offset + end - start]
+
+    async def _get_paths(self, rpath, lpath, recursive=False, maxdepth=None):
+        """
+        Expand the source and target paths of `get`, as fsspec does.
+
+        :param rpath: (str or list) remote path(s), possibly glob patterns
+        :param lpath: (str or list) local path(s)
+        :param recursive: (bool, optional) if True, expand directories
+        :param maxdepth: (int, optional) maximum depth of the expansion
+        :return: (tuple) lists of remote and local file paths
+        """
+        if isinstance(lpath, list) and isinstance(rpath, list):
+            return rpath, lpath
+        source_is_str = isinstance(rpath, str)
+        source_not_trailing_sep = source_is_str and not trailing_sep(rpath)
+        rpath = self._strip_protocol(rpath)
+        rpaths = await self._expand_path(
+            rpath, recursive=recursive, maxdepth=maxdepth
+        )
+        if source_is_str and (not recursive or maxdepth is not None):
+            # non-recursive glob does not copy directories
+            rpaths = [
+                p for p in rpaths
+                if not (trailing_sep(p) or await self._isdir(p))
+            ]
+            if not rpaths:
+                return [], []
+        lpath = make_path_posix(lpath)
+        source_is_file = len(rpaths) == 1
+        dest_is_dir = isinstance(lpath, str) and (
+            trailing_sep(lpath) or LocalFileSystem().isdir(lpath)
+        )
+        exists = source_is_str and (
+            (has_magic(rpath) and source_is_file) or
+            (not has_magic(rpath) and dest_is_dir and source_not_trailing_sep)
+        )
+        lpaths = other_paths(
+            rpaths, lpath, exists=exists, flatten=not source_is_str
+        )
+        if isinstance(lpath, str):
+            check_contained(lpath, lpaths)
+        return rpaths, lpaths
+
+    async def _get(
+        self,
+        rpath,
+        lpath,
+        recursive=False,
+        callback=DEFAULT_CALLBACK,
+        maxdepth=None,
+        batch_size=None,
+        stage=None,
+        bytes_limit=None,
+        **kwargs
+    ):
+        """
+        Copy file(s) to local.
+
+        Copies a specific file or tree of files (if recursive=True). If lpath
+        ends with a "/", it will be assumed to be a directory, and target
+        files will go within. Can submit a list of paths, which may be
+        glob-patterns and will be expanded.
+
+        Files are downloaded concurrently with `get_file`, by a
+        `TransferScheduler`: a new download starts as soon as another one
+        completes, and large and small files are downloaded side by side. If
+        multiple files are copied, files that are only stored on tape
+        (NEARLINE) are staged with a single bulk request, and downloaded as
+        soon as they are online, while the other files are downloaded first.
+
+        :param rpath: (str or list) remote path(s)
+        :param lpath: (str or list) local path(s)
+        :param recursive: (bool, optional) if True, copy directory trees
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the number of files copied. Its hooks also receive the
+            bytes transferred, the throughput and the estimated time left
+            (see `TransferScheduler`)
+        :param maxdepth: (int, optional) maximum depth of the directory trees
+        :param batch_size: (int, optional) number of files downloaded
+            simultaneously; use instance value if None
+        :param stage: (bool, optional) if True, stage NEARLINE files with a
+            bulk request; use instance value if None
+        :param bytes_limit: (int, optional) maximum aggregate size of the
+            files downloaded simultaneously; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to `get_file`
+        :return: (list) results of `get_file`, in the order of the paths
+        """
+        rpaths, lpaths = await self._get_paths(
+            rpath, lpath, recursive=recursive, maxdepth=maxdepth
+        )
+        if not rpaths:
+            return None
+        batch_size = batch_size or self.batch_size or _get_batch_size()
+        if batch_size <= 0:
+            batch_size = len(rpaths)
+        bytes_limit = self.transfer_bytes_limit if bytes_limit is None \
+            else bytes_limit
+        stage = self.stage_nearline if stage is None else stage
+
+        # sizes, types and localities are retrieved at once for all files
+        infos = {}
+        if len(rpaths) > 1:
+            infos = await self._info_many(
+                rpaths, on_error="omit", locality=stage
+            )
+        nearline = collections.defaultdict(list)
+        scheduler = TransferScheduler(
+            batch_size, max_bytes=bytes_limit, callback=callback
+        )
+        for i, (rp, lp) in enumerate(zip(rpaths, lpaths)):
+            info = infos.get(self._strip_protocol(rp).rstrip('/'), {})
+            if info.get('type') == 'directory':
+                os.makedirs(lp, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(lp), exist_ok=True)
+            if stage and info.get('locality') == 'NEARLINE':
+                nearline[self._strip_protocol(rp)].append((i, info))
+            else:
+                scheduler.submit(
+                    i, info.get('size'), self._get_file, rp, lp, **kwargs
+                )
+
+        def submit(entries):
+            for i, info in entries:
+                scheduler.submit(
+                    i, info.get('size'), self._get_file, rpaths[i],
+                    lpaths[i], **kwargs
+                )
+
+        async def stage_nearline():
+            try:
+                if nearline:
+                    request = await self._submit_stage(list(nearline))
+                    async for path, state in self._stage_progress(request):
+                        submit(nearline.pop(path, []))
+            except Exception as e:
+                logger.warning(f"Files could not be staged ({e!r}), they "
+                               f"are staged while being read")
+            finally:
+                submit(itertools.chain(*nearline.values()))
+                nearline.clear()
+                scheduler.close()
+
+        staging = asyncio.ensure_future(stage_nearline())
+        try:
+            results = await scheduler.run()
+        finally:
+            staging.cancel()
+        return [results.get(i) for i in range(len(rpaths))]
+
+    async def _put_paths(self, lpath, rpath, recursive=False, maxdepth=None):
+        """
+        Expand the source and target paths of `put`, as fsspec does.
+
+        :param lpath: (str or list) local path(s), possibly glob patterns
+        :param rpath: (str or list) remote path(s)
+        :param recursive: (bool, optional) if True, expand directories
+        :param maxdepth: (int, optional) maximum depth of the expansion
+        :return: (tuple) lists of local and remote paths
+        """
+        if isinstance(lpath, list) and isinstance(rpath, list):
+            return lpath, rpath
+        source_is_str = isinstance(lpath, str)
+        if source_is_str:
+            lpath = make_path_posix(lpath)
+        fs = LocalFileSystem()
+        lpaths = fs.expand_path(lpath, recursive=recursive, maxdepth=maxdepth)
+        if source_is_str and (not recursive or maxdepth is not None):
+            # non-recursive glob does not copy directories
+            lpaths = [
+                p for p in lpaths if not (trailing_sep(p) or fs.isdir(p))
+            ]
+            if not lpaths:
+                return [], []
+        source_is_file = len(lpaths) == 1
+        dest_is_dir = isinstance(rpath, str) and (
+            trailing_sep(rpath) or await self._isdir(rpath)
+        )
+        rpath = self._strip_protocol(rpath)
+        exists = source_is_str and (
+            (has_magic(lpath) and source_is_file) or
+            (not has_magic(lpath) and dest_is_dir and not trailing_sep(lpath))
+        )
+        rpaths = other_paths(
+            lpaths, rpath, exists=exists, flatten=not source_is_str
+        )
+        return lpaths, rpaths
+
+    async def _put(
+        self,
+        lpath,
+        rpath,
+        recursive=False,
+        callback=DEFAULT_CALLBACK,
+        batch_size=None,
+        maxdepth=None,
+        bytes_limit=None,
+        **kwargs
+    ):
+        """
+        Copy file(s) from local.
+
+        Copies a specific file or tree of files (if recursive=True). If rpath
+        ends with a "/", it will be assumed to be a directory, and target
+        files will go within.
+
+        Directories are created level by level, then files are uploaded
+        concurrently with `put_file`, by a `TransferScheduler`: a new upload
+        starts as soon as another one completes, and large and small files
+        are uploaded side by side.
+
+        :param lpath: (str or list) local path(s)
+        :param rpath: (str or list) remote path(s)
+        :param recursive: (bool, optional) if True, copy directory trees
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the number of files copied. Its hooks also receive the
+            bytes transferred, the throughput and the estimated time left
+            (see `TransferScheduler`)
+        :param batch_size: (int, optional) number of files uploaded
+            simultaneously; use instance value if None
+        :param maxdepth: (int, optional) maximum depth of the directory trees
+        :param bytes_limit: (int, optional) maximum aggregate size of the
+            files uploaded simultaneously; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to `put_file`
+        :return: (list) results of `put_file`, in the order of the files
+        """
+        lpaths, rpaths = await self._put_paths(
+            lpath, rpath, recursive=recursive, maxdepth=maxdepth
+        )
+        batch_size = batch_size or self.batch_size or _get_batch_size()
+        if batch_size <= 0:
+            batch_size = max(len(lpaths), 1)
+        bytes_limit = self.transfer_bytes_limit if bytes_limit is None \
+            else bytes_limit
+
+        levels = collections.defaultdict(list)
+        files = []
+        for lp, rp in zip(lpaths, rpaths):
+            if os.path.isdir(lp):
+                rp = self._strip_protocol(rp).rstrip('/')
+                levels[rp.count('/')].append(rp)
+            else:
+                files.append((lp, rp))
+        for depth in sorted(levels):
+            await _run_coros_in_chunks(
+                [self._makedirs(p, exist_ok=True) for p in levels[depth]],
+                batch_size=batch_size,
+                nofiles=True
+            )
+
+        scheduler = TransferScheduler(
+            batch_size, max_bytes=bytes_limit, callback=callback
+        )
+        for i, (lp, rp) in enumerate(files):
+            scheduler.submit(
+                i, os.path.getsize(lp), self._put_file, lp, rp, **kwargs
+            )
+        scheduler.close()
+        results = await scheduler.run()
+        return [results[i] for i in range(len(files))]
+
+    async def _submit_stage(self, paths, **kwargs):
+        """
+        Submit a bulk request to stage files from tape.
+
+        :param paths: (list) target file paths
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (str) URL of the bulk request
+        """
+        url = URL(self.api_url) / 'bulk-requests'
+        body = dict(
+            activity='STAGE',
+            target=[self._strip_protocol(path) for path in paths],
+            expandDirectories='NONE'
+        )
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        async with self._request(
+                "POST", url.as_uri(), json=body, **request_kwargs) as r:
+            r.raise_for_status()
+            # dCache returns the URL in the `request-url` header
+            location = r.headers.get("request-url") or \
+                r.headers.get("Location")
+        if location is None:
+            raise ValueError("Bulk request URL not returned by the API")
+        return location
+
+    async def _bulk_request_status(self, request, **kwargs):
+        """
+        Get the status of a bulk request, and of all its targets.
+
+        :param request: (str) URL of the bulk request
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (tuple) request status and list of targets
+        """
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        status, targets, offset = None, [], 0
+        while offset is not None:
+            url = URL(request)
+            if offset:
+                url = url.with_query(offset=f'{offset}')
+            async with self._request(
+                    "GET", url.as_uri(), **request_kwargs) as r:
+                r.raise_for_status()
+                data = await r.json()
+            status = data.get('status')
+            targets.extend(data.get('targets', []))
+            # targets are returned in pages, up to the last one (-1)
+            next_id = data.get('nextId', -1)
+            offset = next_id if next_id is not None and next_id >= 0 \
+                else None
+        return status, targets
+
+    async def _stage_progress(
+        self,
+        request,
+        poll_interval=STAGE_POLL_INTERVAL,
+        timeout=None,
+        **kwargs
+    ):
+        """
+        Poll a bulk request until all its targets are processed.
+
+        The request is polled every `poll_interval` seconds while its targets
+        make progress, and less frequently (up to every
+        `STAGE_POLL_INTERVAL_MAX` seconds) otherwise.
+
+        :param request: (str) URL of the bulk request
+        :param poll_interval: (float, optional) minimum time between status
+            requests, in seconds
+        :param timeout: (float, optional) maximum time to wait, in seconds
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (async generator) path and final state (e.g. "COMPLETED" or
+            "FAILED") of the targets, as they are processed
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        interval = poll_interval
+        done = set()
+        while True:
+            status, targets = await self._bulk_request_status(
+                request, **kwargs
+            )
+            progress = False
+            for target in targets:
+                path = self._strip_protocol(target['target'])
+                if path not in done and \
+                        target.get('state') in BULK_TARGET_FINAL_STATES:
+                    done.add(path)
+                    progress = True
+                    yield path, target['state']
+            if status in {'COMPLETED', 'CANCELLED'} or \
+                    len(done) == len(targets):
+                return
+            interval = poll_interval if progress \
+                else min(2 * interval, STAGE_POLL_INTERVAL_MAX)
+            if deadline is not None and loop.time() + interval > deadline:
+                raise FSTimeoutError(f"Bulk request {request} not completed")
+            await asyncio.sleep(interval)
+
+    async def _stage(
+        self,
+        paths,
+        wait=True,
+        poll_interval=STAGE_POLL_INTERVAL,
+        timeout=None,
+        **kwargs
+    ):
+        """
+        Stage files from tape, with a single bulk request.
+
+        :param paths: (str or list) target file path(s)
+        :param wait: (bool, optional) if True, wait until all files are
+            processed
+        :param poll_interval: (float, optional) minimum time between status
+            requests, in seconds
+        :param timeout: (float, optional) maximum time to wait, in seconds
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (dict) final state (e.g. "COMPLETED" or "FAILED") of each
+            path if waiting, otherwise (str) URL of the bulk request
+        """
+        paths = [paths] if isinstance(paths, str) else paths
+        request = await self._submit_stage(paths, **kwargs)
+        if not wait:
+            return request
+        return {
+            path: state async for path, state in self._stage_progress(
+                request, poll_interval=poll_interval, timeout=timeout,
+                **kwargs
+            )
+        }
+
+    stage = sync_wrapper(_stage)
+
+    @instrumented('get_file', nbytes=_local_size(1))
+    async def _get_file(
+        self,
+        rpath,
+        lpath,
+        chunk_size=5*2**20,
+        callback=DEFAULT_CALLBACK,
+        streams=None,
+        part_size=None,
+        verify=None,
+        **kwargs
+    ):
+        """
+        Copy file to local.
+
+        If multiple streams are requested and the file is larger than a part,
+        the file is downloaded in parts with concurrent range requests, and
+        each part is written at its offset in the local file.
+
+        :param rpath: (str) remote target file path
+        :param lpath: (str) local file path where to copy the target file
+        :param chunk_size: (int, optional) number of bytes read in memory at
+            once
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the transfer progress
+        :param streams: (int, optional) number of concurrent download streams;
+            use instance value if None
+        :param part_size: (int, optional) size of the parts downloaded by each
+            range request; use instance value if None
+        :param verify: (bool, optional) if True, compare the checksum of the
+            data downloaded with the one stored by dCache, and raise
+            `ChecksumError` (removing the local file) if they differ; use
+            instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        """
+        webdav_url = self._get_webdav_url(rpath) or self.webdav_url
+
+        path = self._strip_protocol(rpath)
+        url = URL(webdav_url) / path
+        url = url.as_uri()
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+
+        streams = self.download_streams if streams is None else streams
+        part_size = self.download_part_size if part_size is None \
+            else part_size
+        verify = self.verify_checksums if verify is None else verify
+        parts = streams > 1 and hasattr(os, 'pwrite')
+        details = await self._info(path, checksum=verify) \
+            if parts or verify else {}
+        expected = self._expected_checksum(path, details) if verify else None
+        algorithm = expected[0] if expected is not None else None
+
+        try:
+            # the checksums of the parts can only be combined for ADLER32
+            if parts and algorithm in {None, 'adler32'}:
+                size = details.get('size')
+                if size is not None and size > part_size:
+                    checksum = await self._get_file_parts(
+                        url,
+                        lpath,
+                        size,
+                        request_kwargs,
+                        chunk_size=min(chunk_size, part_size),
+                        callback=callback,
+                        streams=streams,
+                        part_size=part_size,
+                        algorithm=algorithm
+                    )
+                    if expected is not None:
+                        self._check_checksum(path, expected, checksum)
+                    return
+
+            hasher = new_hasher(algorithm) if algorithm else None
+            with open(lpath, "wb") as fd:
+                async for chunk in self._iter_content(
+                        url,
+                        chunk_size=chunk_size,
+                        callback=callback,
+                        **request_kwargs):
+                    fd.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            if hasher is not None:
+                self._check_checksum(path, expected, hasher.hexdigest())
+        except ChecksumError:
+            os.remove(lpath)
+            raise
+
+    async def _get_file_parts(
+        self,
+        url,
+        lpath,
+        size,
+        request_kwargs,
+        chunk_size,
+        callback,
+        streams,
+        part_size,
+        algorithm=None
+    ):
+        """
+        Download a file in parts, using concurrent range requests.
+
+        :param url: (str) remote file URL
+        :param lpath: (str) local file path where to copy the target file
+        :param size: (int) file size
+        :param request_kwargs: (dict) arguments passed on to requests
+        :param chunk_size: (int) number of bytes read in memory at once
+        :param callback: (fsspec.callbacks.Callback) callback to track the
+            transfer progress
+        :param streams: (int) number of concurrent requests
+        :param part_size: (int) size of the parts downloaded by each request
+        :param algorithm: (str, optional) if "adler32", compute the checksum
+            of the data downloaded
+        :return: (str) checksum of the file, if requested
+        """
+        async def get_part(fd, start, end):
+            offset = start
+            hasher = new_hasher(algorithm) if algorithm else None
+            async for chunk in self._iter_content(
+                    url, start, end, chunk_size=chunk_size, **request_kwargs):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                callback.relative_update(len(chunk))
+                if hasher is not None:
+                    hasher.update(chunk)
+            if offset < end:
+                raise aiohttp.ClientPayloadError(
+                    f"Incomplete part {start}-{end - 1} of {url}"
+                )
+            return hasher
+
+        callback.set_size(size)
+        with open(lpath, "wb") as f:
+            fd = f.fileno()
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                f.truncate(size)
+            hashers = await _run_coros_in_chunks(
+                [get_part(fd, start, min(start + part_size, size))
+                 for start in range(0, size, part_size)],
+                batch_size=streams
+            )
+        if algorithm is None:
+            return None
+        checksum = hashers[0]
+        for start, hasher in zip(range(part_size, size, part_size),
+                                 hashers[1:]):
+            checksum.combine(hasher, min(part_size, size - start))
+        return checksum.hexdigest()
+
+    @instrumented('put_file', nbytes=_local_size(0))
+    async def _put_file(
+        self,
+        lpath,
+        rpath,
+        callback=DEFAULT_CALLBACK,
+        verify=None,
+        **kwargs
+    ):
+        """
+        Copy file from local.
+
+        :param rpath: (str) local target file path
+        :param lpath: (str) remote file path where to copy the target file
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the transfer progress
+        :param verify: (bool, optional) if True, compare the checksum of the
+            data uploaded with the one computed by dCache, and raise
+            `ChecksumError` if they differ; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        """
+        webdav_url = self._get_webdav_url(rpath) or self.webdav_url
+
+        path = self._strip_protocol(rpath)
+        url = URL(webdav_url) / path
+        url = url.as_uri()
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        verify = self.verify_checksums if verify is None else verify
+        with open(lpath, "rb") as fd:
+            callback.set_size(os.fstat(fd.fileno()).st_size)
+            reader = HashingReader(fd, CHECKSUM_TYPES[0]) if verify else fd
+            data = _ProgressReader(reader, callback)
+            async with self._request(
+                    "PUT", url, data=data, **request_kwargs) as r:
+                r.raise_for_status()
+        self.invalidate_cache(path)
+        if verify:
+            await self._verify_upload(path, reader.hasher)
+
+    def _expected_checksum(self, path, details):
+        """
+        Checksum to verify a transfer, as stored by dCache.
+
+        :param path: (str) target path
+        :param details: (dict) file details, as returned by `info`
+        :return: (tuple) checksum type and value, None if not available
+        """
+        expected = select_checksum(details.get("checksums", {}))
+        if expected is None:
+            logger.warning(f"No checksum available for {path}, the transfer "
+                           f"is not verified")
+        return expected
+
+    @staticmethod
+    def _check_checksum(path, expected, value):
+        """
+        Raise ChecksumError if a checksum differs from the expected one.
+
+        :param path: (str) target path
+        :param expected: (tuple) checksum type and value stored by dCache
+        :param value: (str) checksum of the data transferred
+        """
+        algorithm, expected_value = expected
+        if value != expected_value:
+            raise ChecksumError(
+                f"{algorithm.upper()} checksum of the data transferred for "
+                f"{path} ({value}) differs from the one stored by dCache "
+                f"({expected_value})"
+            )
+
+    async def _verify_upload(self, path, hasher):
+        """
+        Compare the checksum of the data uploaded with the one computed by
+        dCache.
+
+        :param path: (str) target path
+        :param hasher: checksum object of the data uploaded, None if it could
+            not be computed
+        """
+        if hasher is None:
+            logger.warning(f"Data uploaded to {path} was not read "
+                           f"sequentially, the transfer is not verified")
+            return
+        details = await self._info(path, checksum=True)
+        expected = select_checksum(details.get("checksums", {}), hasher.name)
+        if expected is None:
+            logger.warning(f"No {hasher.name} checksum available for {path}, "
+                           f"the transfer is not verified")
+            return
+        self._check_checksum(path, expected, hasher.hexdigest())
+
+    async def _cat_ranges(
+        self,
+        paths,
+        starts,
+        ends,
+        max_gap=None,
+        batch_size=None,
+        on_error="return",
+        multipart=None,
+        **kwargs
+    ):
+        """
+        Get the content of byte ranges from one or more files.
+
+        Ranges of the same file that overlap or are separated by at most
+        `max_gap` bytes are merged and downloaded with a single request.
+        Merged ranges are downloaded concurrently, and the content of the
+        original ranges is sliced from them. Negative and None bounds are
+        interpreted as in slices: the sizes of these files are retrieved at
+        once (see `info_many`).
+
+        :param paths: (list) target file paths
+        :param starts: (int or list) first byte of each range, None for the
+            beginning of the file
+        :param ends: (int or list) last byte (excluded) of each range, None
+            for the end of the file
+        :param max_gap: (int, optional) maximum gap (in bytes) between ranges
+            that are merged; use instance value if None
+        :param batch_size: (int, optional) maximum number of requests sent
+            simultaneously; use instance value if None
+        :param on_error: (str, optional) if "return", errors are returned in
+            place of the corresponding ranges' content, otherwise the first
+            error is raised
+        :param multipart: (bool, optional) if True, request all merged ranges
+            of a file at once; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (list) content of the ranges
+        """
+        if not isinstance(paths, list):
+            raise TypeError
+        if not isinstance(starts, list):
+            starts = [starts] * len(paths)
+        if not isinstance(ends, list):
+            ends = [ends] * len(paths)
+        if len(starts) != len(paths) or len(ends) != len(paths):
+            raise ValueError
+        max_gap = self.ranges_max_gap if max_gap is None else max_gap
+        multipart = self.multipart_ranges if multipart is None else multipart
+
+        batch_size = batch_size or self.batch_size
+        out = [b''] * len(paths)
+        relative = [
+            path for path, start, end in zip(paths, starts, ends)
+            if start is None or end is None or start < 0 or end < 0
+        ]
+        infos = await self._info_many(relative, batch_size=batch_size) \
+            if relative else {}
+        ranges = collections.defaultdict(list)
+        coros, spans = [], []
+        for index, (path, start, end) in enumerate(zip(paths, starts, ends)):
+            if start is None or end is None or start < 0 or end < 0:
+                # bounds relative to the file size are resolved as in slices
+                key = self._strip_protocol(path).rstrip('/') or '/'
+                info = infos[key]
+                if isinstance(info, Exception):
+                    if on_error != "return":
+                        raise info
+                    out[index] = info
+                    continue
+                start, end, _ = slice(start, end).indices(info['size'])
+            if end > start:
+                ranges[path].append((start, end, index))
+
+        for path, path_ranges in ranges.items():
+            merged = _merge_ranges(path_ranges, max_gap)
+            if multipart and len(merged) > 1:
+                coros.append(self._cat_file_ranges(
+                    path,
+                    [(start, end) for start, end, _ in merged],
+                    **kwargs
+                ))
+                spans.append([(span[0], span[2]) for span in merged])
+            else:
+                for start, end, targets in merged:
+                    coros.append(self._cat_file(path, start, end, **kwargs))
+                    spans.append([(start, targets)])
+
+        results = await _run_coros_in_chunks(
+            coros,
+            batch_size=batch_size,
+            return_exceptions=True,
+            nofiles=True
+        )
+        for result, coro_spans in zip(results, spans):
+            if not isinstance(result, list):
+                result = [result] * len(coro_spans)
+            for data, (offset, targets) in zip(result, coro_spans):
+                for index, start, end in targets:
+                    if isinstance(data, Exception):
+                        if on_error != "return":
+                            raise data
+                        out[index] = data
+                    else:
+                        out[index] = data[start - offset:end - offset]
+        return out
+
+    async def _cat_file_ranges(self, path, ranges, **kwargs):
+        """
+        Get the content of multiple byte ranges of a file, with a single
+        request returning a multipart/byteranges response.
+
+        If the server answers with a single range (e.g. spanning all the
+        ranges requested), the ranges are sliced from it, and those that it
+        does not include are requested separately. If the server ignores the
+        ranges and answers with the whole file, the ranges are requested
+        separately, and multipart requests are disabled for this file system
+        instance.
+
+        :param path: (str) target file path
+        :param ranges: (list) tuples with first and last byte (excluded) of
+            the ranges, sorted and not overlapping
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (list) content of the ranges
+        """
+        webdav_url = self._get_webdav_url(path) or self.webdav_url
+
+        url = (URL(webdav_url) / self._strip_protocol(path)).as_uri()
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        headers = request_kwargs.pop("headers", {}).copy()
+        headers["Range"] = "bytes=" + ",".join(
+            f"{start}-{end - 1}" for start, end in ranges
+        )
+        parts = None
+        async with self._request(
+                "GET", url, headers=headers, **request_kwargs) as r:
             if r.status == 404:
                 raise FileNotFoundError(url)
             r.raise_for_status()
-            out = await r.read()
-        return out
+            if r.status == 206 and r.content_type == "multipart/byteranges":
+                parts = []
+                reader = aiohttp.MultipartReader(r.headers, r.content)
+                async for part in reader:
+                    start = _range_start(part.headers["Content-Range"])
+                    parts.append((start, await part.read(decode=False)))
+            elif r.status == 206:
+                start = _range_start(r.headers["Content-Range"])
+                parts = [(start, await r.read())]
+        if parts is None:
+            logger.debug(
+                f"Multipart range requests not supported, ranges of {url} "
+                f"are requested separately"
+            )
+            self.multipart_ranges = False
+            parts = []
+
+        async def get_range(start, end):
+            for part_start, data in parts:
+                if part_start <= start < part_start + len(data):
+                    offset = start - part_start
+                    return bytes(data[offset:offset + end - start])
+            return await self._cat_file(path, start, end, **kwargs)
+
+        return await asyncio.gather(*(
+            get_range(start, end) for start, end in ranges
+        ))
+
+    @instrumented('cp_file')
+    async def _cp_file(self, path1, path2, **kwargs):
+        """
+        Copy a file within dCache, using a WebDAV COPY request. Data is copied
+        server-side, without being transferred through the client.
+
+        If the paths are URLs of different WebDAV doors (e.g. of different
+        dCache instances), the file is copied with an HTTP third-party copy
+        (see `tpc_file`).
+
+        :param path1: (str) source file path
+        :param path2: (str) destination file path
+        :param kwargs: (dict, optional) arguments passed on to requests
+        """
+        webdav_url = self._get_webdav_url(path1) or self.webdav_url
+        if (self._get_webdav_url(path2) or webdav_url) != webdav_url:
+            await self._tpc_file(path1, path2, **kwargs)
+            return
+
+        path1 = self._strip_protocol(path1)
+        path2 = self._strip_protocol(path2)
+        url = (URL(webdav_url) / path1).as_uri()
+        destination = (URL(webdav_url) / path2).as_uri()
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.update(kwargs)
+        headers = request_kwargs.pop("headers", {}).copy()
+        headers.update({"Destination": destination, "Overwrite": "T"})
+        async with self._request(
+                "COPY", url, headers=headers, **request_kwargs) as r:
+            if r.status == 404:
+                raise FileNotFoundError(url)
+            if r.status == 409:
+                # the parent of the destination does not exist
+                raise FileNotFoundError(_parent(destination))
+            r.raise_for_status()
+        self.invalidate_cache(path2)
+
+    def _transfer_headers(self, headers=None):
+        """
+        Headers that the active party of a third-party copy forwards to the
+        other party (e.g. its credentials).
+
+        :param headers: (dict, optional) headers to forward. If None, forward
+            the authorization header of the file system
+        :return: (dict) headers with the `TransferHeader` prefix
+        """
+        if headers is None:
+            headers = {}
+            auth = self.client_kwargs.get("auth")
+            authorization = self.client_kwargs.get("headers", {}).get(
+                "Authorization"
+            )
+            if authorization is not None:
+                headers["Authorization"] = authorization
+            elif auth is not None:
+                headers["Authorization"] = auth.encode()
+        return {
+            f"TransferHeader{key}": value for key, value in headers.items()
+        }
+
+    @instrumented(
+        'tpc_file', nbytes=lambda report, *args, **kwargs: report['bytes']
+    )
+    async def _tpc_file(
+        self,
+        source,
+        destination,
+        mode=None,
+        transfer_headers=None,
+        verify=None,
+        callback=DEFAULT_CALLBACK,
+        **kwargs
+    ):
+        """
+        Copy a file between WebDAV doors (e.g. of different dCache instances)
+        with an HTTP third-party copy.
+
+        In pull mode, a COPY request with a `Source` header is sent to the
+        destination door, which fetches the data; in push mode, a COPY
+        request with a `Destination` header is sent to the source door, which
+        sends the data. The active door reports the progress of the copy with
+        performance markers, which are tracked until the final status.
+
+        :param source: (str) source file path or URL
+        :param destination: (str) destination file path or URL
+        :param mode: (str, optional) "pull" or "push"; use instance value if
+            None
+        :param transfer_headers: (dict, optional) headers that the active door
+            forwards to the other one, e.g. its credentials
+            (`{"Authorization": "Bearer ..."}`). If None, the authorization of
+            the file system is forwarded
+        :param verify: (bool, optional) if True, require the active door to
+            verify the checksum of the data copied; use instance value
+            (`verify_checksums`) if None
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the bytes copied, as reported by the performance markers
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (dict) report of the copy (see `tpc_copy`)
+        """
+        mode = self.tpc_mode if mode is None else mode
+        if mode not in {"pull", "push"}:
+            raise ValueError('mode should be "pull" or "push"')
+        verify = self.verify_checksums if verify is None else verify
+        urls = []
+        for path in (source, destination):
+            webdav_url = self._get_webdav_url(path) or self.webdav_url
+            path = self._strip_protocol(path)
+            urls.append((URL(webdav_url) / path).as_uri())
+        source_url, destination_url = urls
+        request_kwargs = self.request_kwargs.copy()
+        request_kwargs.setdefault("timeout", aiohttp.ClientTimeout(
+            total=None, sock_connect=30, sock_read=TPC_IDLE_TIMEOUT
+        ))
+        request_kwargs.update(kwargs)
+        headers = request_kwargs.pop("headers", {}).copy()
+        headers.update(self._transfer_headers(transfer_headers))
+        headers.update({"Credential": "none", "Overwrite": "T"})
+        if verify:
+            headers["RequireChecksumVerification"] = "true"
+        if mode == "pull":
+            url, headers["Source"] = destination_url, source_url
+        else:
+            url, headers["Destination"] = source_url, destination_url
+
+        report = dict(
+            source=source_url,
+            destination=destination_url,
+            mode=mode,
+            status=None,
+            message=None,
+            bytes=0,
+            markers=0,
+            marker=None,
+            duration=None,
+            error=None
+        )
+        start = time.perf_counter()
+        async with self._request(
+                "COPY", url, headers=headers, **request_kwargs) as r:
+            if r.status == 404:
+                raise FileNotFoundError(url)
+            if r.status == 409:
+                # the parent of the destination does not exist
+                raise FileNotFoundError(_parent(destination_url))
+            r.raise_for_status()
+            if r.status != 202:
+                # copy completed synchronously
+                report['status'] = 'success'
+            marker, stripes = None, {}
+            async for line in r.content:
+                line = line.decode().strip()
+                if line == "Perf Marker":
+                    marker = {}
+                elif line == "End" and marker is not None:
+                    index = marker.get("Stripe Index", "0")
+                    transferred = marker.get("Stripe Bytes Transferred", "0")
+                    if transferred.isdigit():
+                        stripes[index] = int(transferred)
+                    report['bytes'] = sum(stripes.values())
+                    report['markers'] += 1
+                    report['marker'] = marker
+                    callback.absolute_update(report['bytes'])
+                    marker = None
+                elif marker is not None:
+                    key, _, value = line.partition(":")
+                    marker[key.strip()] = value.strip()
+                elif line:
+                    status, _, message = line.partition(":")
+                    if status.lower() in {"success", "failure", "aborted"}:
+                        report['status'] = status.lower()
+                        report['message'] = message.strip()
+        report['duration'] = time.perf_counter() - start
+        self.invalidate_cache(self._strip_protocol(destination))
+        if report['status'] != 'success':
+            report['error'] = report['message'] or \
+                "Copy ended without final status"
+            raise dCacheTPCError([report])
+        return report
+
+    async def _tpc_copy(
+        self,
+        sources,
+        destinations,
+        mode=None,
+        batch_size=None,
+        on_error="raise",
+        callback=DEFAULT_CALLBACK,
+        **kwargs
+    ):
+        """
+        Copy many files between WebDAV doors (e.g. of different dCache
+        instances) with concurrent HTTP third-party copies.
+
+        Copies are run by a `TransferScheduler`, starting a new copy as soon
+        as another one completes. The progress of each copy is tracked with
+        the performance markers of the active door.
+
+        :param sources: (list) source file paths or URLs
+        :param destinations: (list) destination file paths or URLs
+        :param mode: (str, optional) "pull" or "push"; use instance value if
+            None
+        :param batch_size: (int, optional) number of concurrent copies; use
+            instance value if None
+        :param on_error: (str, optional) if "raise", raise `dCacheTPCError`
+            once all copies have completed, if any failed; if "return",
+            only return the errors in the reports
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the number of files copied. Its hooks also receive the
+            bytes copied and the throughput (see `TransferScheduler`)
+        :param kwargs: (dict, optional) arguments passed on to `tpc_file`
+        :return: (list) reports of the copies, in the order of the paths:
+            source and destination URLs, mode, final status and message, bytes
+            copied, number of performance markers received and last marker,
+            duration (in seconds) and error (None if successful)
+        """
+        if len(sources) != len(destinations):
+            raise ValueError("Give as many sources as destinations")
+        batch_size = batch_size or self.batch_size or _get_batch_size()
+        # the sizes are only known for the files of this dCache instance
+        local = [
+            self._strip_protocol(path) for path in sources
+            if (self._get_webdav_url(path) or self.webdav_url) ==
+            self.webdav_url
+        ]
+        infos = await self._info_many(local, on_error="omit") \
+            if local else {}
+        scheduler = TransferScheduler(
+            batch_size, callback=callback, return_exceptions=True
+        )
+        for i, (source, destination) in enumerate(zip(sources, destinations)):
+            size = infos.get(self._strip_protocol(source), {}).get("size")
+            scheduler.submit(
+                i, size, self._tpc_file, source, destination, mode=mode,
+                **kwargs
+            )
+        scheduler.close()
+        results = await scheduler.run()
+        reports, failed = [], []
+        for i, (source, destination) in enumerate(zip(sources, destinations)):
+            report = results[i]
+            if isinstance(report, dCacheTPCError):
+                report = report.reports[0]
+            elif isinstance(report, Exception):
+                report = dict(
+                    source=source,
+                    destination=destination,
+                    mode=mode or self.tpc_mode,
+                    status='failure',
+                    message=None,
+                    bytes=0,
+                    markers=0,
+                    marker=None,
+                    duration=None,
+                    error=repr(report)
+                )
+            reports.append(report)
+            if report['error'] is not None:
+                failed.append(report)
+        if failed and on_error == "raise":
+            raise dCacheTPCError(failed)
+        return reports
+
+    tpc_file = sync_wrapper(_tpc_file)
+    tpc_copy = sync_wrapper(_tpc_copy)
+
+    async def _copy(
+        self,
+        path1,
+        path2,
+        recursive=False,
+        on_error=None,
+        maxdepth=None,
+        batch_size=None,
+        **kwargs
+    ):
+        """
+        Copy file(s) within dCache, using server-side copies.
+
+        When copying a directory tree, the destination directories are
+        created level by level, then all files are copied with concurrent
+        requests.
+
+        :param path1: (str or list) source path(s)
+        :param path2: (str or list) destination path(s)
+        :param recursive: (bool, optional) if True, and the source path is a
+            directory, copy all subdirectories and their files
+        :param on_error: (str, optional) if "raise", raise an error if a
+            source path is missing, if "ignore", skip it. Default is "ignore"
+            for recursive copies and "raise" otherwise
+        :param maxdepth: (int, optional) maximum recursion depth
+        :param batch_size: (int, optional) maximum number of paths copied
+            simultaneously; use instance value if None
+        :param kwargs: (dict, optional) arguments passed on to requests
+        """
+        if not recursive or not isinstance(path1, str) or has_magic(path1):
+            return await super()._copy(
+                path1,
+                path2,
+                recursive=recursive,
+                on_error=on_error,
+                maxdepth=maxdepth,
+                batch_size=batch_size,
+                **kwargs
+            )
+        on_error = "ignore" if on_error is None else on_error
+
+        source = self._strip_protocol(path1).rstrip('/') or '/'
+        found = await self._find(
+            source, maxdepth=maxdepth, withdirs=True, detail=True
+        )
+        if not found:
+            if on_error == "raise":
+                raise FileNotFoundError(path1)
+            return
+        if found.get(source, {}).get('type') != 'directory':
+            return await self._cp_file(path1, path2, **kwargs)
+
+        # targets on other instances are copied with third-party copies, and
+        # are only known to be directories if given with a trailing slash
+        webdav_url = self._get_webdav_url(path1) or self.webdav_url
+        door = self._get_webdav_url(path2) or webdav_url
+        door = "" if door == webdav_url else door
+        target = self._strip_protocol(path2).rstrip('/') or '/'
+        if not path1.endswith('/') and (path2.endswith('/') or (
+                not door and await self._isdir(target))):
+            target = f"{target.rstrip('/')}/{source.split('/')[-1]}"
+
+        def _target(p):
+            return door + target + p[len(source):]
+
+        files = []
+        levels = collections.defaultdict(list)
+        for p, info in found.items():
+            if info['type'] == 'directory':
+                levels[p.count('/')].append(_target(p))
+            else:
+                files.append((p, _target(p)))
+        groups = [
+            [self._makedirs(p, exist_ok=True) for p in levels[depth]]
+            for depth in sorted(levels)
+        ]
+        groups.append([self._cp_file(p1, p2, **kwargs) for p1, p2 in files])
+
+        batch_size = batch_size or self.batch_size
+        for coros in groups:
+            results = await _run_coros_in_chunks(
+                coros,
+                batch_size=batch_size,
+                return_exceptions=True,
+                nofiles=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    if on_error == "ignore" and \
+                            isinstance(result, FileNotFoundError):
+                        continue
+                    raise result
+
+    copy = sync_wrapper(_copy)
+
+    async def _sync(
+        self,
+        source,
+        destination,
+        direction="put",
+        delete=False,
+        checksum=False,
+        dry_run=False,
+        batch_size=None,
+        manifest=None,
+        callback=DEFAULT_CALLBACK,
+        **kwargs
+    ):
+        """
+        Synchronize a local directory tree with a dCache directory tree.
+
+        Both trees are listed concurrently, and only files that are missing
+        or that changed are transferred, with up to `batch_size` concurrent
+        transfers. A file is considered changed if its size differs, or if
+        the source file is more recent than the destination one (downloaded
+        files get the modification time of the remote file). If `checksum`
+        is True, files with the same size are compared by their ADLER32
+        checksum instead, which requires reading the local files.
+
+        :param source: (str) source directory, local if `direction` is "put",
+            on dCache if "get"
+        :param destination: (str) destination directory, on dCache if
+            `direction` is "put", local if "get"
+        :param direction: (str, optional) "put" to upload local files to
+            dCache, "get" to download them from dCache
+        :param delete: (bool, optional) if True, remove the destination files
+            and directories that are not in the source tree
+        :param checksum: (bool, optional) if True, compare files with the
+            same size by checksum rather than by modification time
+        :param dry_run: (bool, optional) if True, report what would be done
+            without transferring or removing anything
+        :param batch_size: (int, optional) maximum number of files
+            transferred simultaneously; use instance value if None
+        :param manifest: (str, optional) local path where to write the report
+            of the synchronization, as JSON
+        :param callback: (fsspec.callbacks.Callback, optional) callback to
+            track the number of files transferred
+        :param kwargs: (dict, optional) arguments passed on to `put_file` or
+            `get_file`
+        :return: (dict) report, with the relative paths of the files
+            transferred (with their sizes) and of the paths removed, the
+            number of unchanged files, and the errors. If any path could not
+            be synchronized, `dCacheSyncError` is raised once all others have
+            been processed
+        """
+        if direction not in {"put", "get"}:
+            raise ValueError('direction should be "put" or "get"')
+        started = time.time()
+        local, remote = (source, destination) if direction == "put" \
+            else (destination, source)
+        local = make_path_posix(local).rstrip('/') or '/'
+        remote = self._strip_protocol(remote).rstrip('/') or '/'
+
+        async def list_remote():
+            try:
+                found = await self._find(
+                    remote, withdirs=True, detail=True, checksum=checksum
+                )
+            except FileNotFoundError:
+                return {}
+            return {
+                path[len(remote):].lstrip('/'): dict(
+                    type=info['type'],
+                    size=info['size'],
+                    mtime=info['modified'].timestamp(),
+                    checksums=info.get('checksums', {})
+                )
+                for path, info in found.items() if path != remote
+            }
+
+        async def list_local():
+            if not os.path.isdir(local):
+                return {}
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, _list_local, local)
+
+        if direction == "put":
+            src, dst = await asyncio.gather(list_local(), list_remote())
+            if not src and not os.path.isdir(source):
+                raise FileNotFoundError(source)
+        else:
+            src, dst = await asyncio.gather(list_remote(), list_local())
+            if not src and not await self._isdir(remote):
+                raise FileNotFoundError(source)
+
+        errors = {}
+        transfers, directories, compare, unchanged = [], [], [], 0
+        for path, info in src.items():
+            other = dst.get(path)
+            if other is not None and other['type'] != info['type']:
+                error = IsADirectoryError \
+                    if other['type'] == 'directory' else NotADirectoryError
+                errors[path] = error(path)
+            elif info['type'] == 'directory':
+                if other is None:
+                    directories.append(path)
+            elif other is None or other['size'] != info['size']:
+                transfers.append(path)
+            elif checksum:
+                compare.append(path)
+            elif _newer(info['mtime'], other['mtime']):
+                transfers.append(path)
+            else:
+                unchanged += 1
+
+        if compare:
+            # local checksums are computed in threads, remote ones are part
+            # of the listings; fall back to modification times if missing
+            loop = asyncio.get_running_loop()
+            values = await asyncio.gather(*(
+                loop.run_in_executor(None, _local_adler32, f'{local}/{path}')
+                for path in compare
+            ))
+            for path, value in zip(compare, values):
+                info = dst[path] if direction == "put" else src[path]
+                stored = info['checksums'].get('adler32')
+                if stored is None:
+                    changed = _newer(src[path]['mtime'], dst[path]['mtime'])
+                else:
+                    changed = stored != value
+                if changed:
+                    transfers.append(path)
+                else:
+                    unchanged += 1
+
+        extraneous = []
+        if delete:
+            # sorted by path components, entries follow their parent
+            paths = sorted(set(dst) - set(src), key=lambda p: p.split('/'))
+            for path in paths:
+                if not extraneous or \
+                        not path.startswith(extraneous[-1] + '/'):
+                    extraneous.append(path)
+
+        report = dict(
+            source=source,
+            destination=destination,
+            direction=direction,
+            dry_run=dry_run,
+            transferred=[
+                dict(path=path, size=src[path]['size']) for path in transfers
+            ],
+            removed=extraneous,
+            unchanged=unchanged,
+            errors={}
+        )
+        if not dry_run:
+            batch_size = batch_size or self.batch_size or _get_batch_size()
+            scheduler = TransferScheduler(
+                batch_size,
+                max_bytes=self.transfer_bytes_limit,
+                callback=callback,
+                return_exceptions=True
+            )
+            if direction == "put":
+                levels = collections.defaultdict(set)
+                for path in directories:
+                    levels[path.count('/')].add(path)
+                if not dst:
+                    await self._makedirs(remote, exist_ok=True)
+                for depth in sorted(levels):
+                    await _run_coros_in_chunks(
+                        [self._makedirs(f'{remote}/{p}', exist_ok=True)
+                         for p in levels[depth]],
+                        batch_size=batch_size,
+                        nofiles=True
+                    )
+                for path in transfers:
+                    scheduler.submit(
+                        path, src[path]['size'], self._put_file,
+                        f'{local}/{path}', f'{remote}/{path}', **kwargs
+                    )
+            else:
+                os.makedirs(local, exist_ok=True)
+                for path in directories:
+                    os.makedirs(f'{local}/{path}', exist_ok=True)
+                for path in transfers:
+                    scheduler.submit(
+                        path, src[path]['size'], self._sync_get_file,
+                        f'{remote}/{path}', f'{local}/{path}',
+                        mtime=src[path]['mtime'], **kwargs
+                    )
+            scheduler.close()
+            results = await scheduler.run()
+            for path, result in results.items():
+                if isinstance(result, Exception):
+                    errors[path] = result
+            if extraneous:
+                if direction == "put":
+                    coros = [
+                        self._rm(f'{remote}/{p}', recursive=True)
+                        for p in extraneous
+                    ]
+                else:
+                    loop = asyncio.get_running_loop()
+                    coros = [
+                        loop.run_in_executor(
+                            None, _remove_local, f'{local}/{p}'
+                        )
+                        for p in extraneous
+                    ]
+                results = await _run_coros_in_chunks(
+                    coros,
+                    batch_size=batch_size,
+                    return_exceptions=True,
+                    nofiles=True
+                )
+                for path, result in zip(extraneous, results):
+                    if isinstance(result, Exception):
+                        errors[path] = result
+        report['errors'] = {path: repr(e) for path, e in errors.items()}
+        report['duration'] = time.time() - started
+        if manifest is not None:
+            with open(manifest, 'w') as f:
+                json.dump(report, f, indent=2)
+        if errors:
+            raise dCacheSyncError(errors, report)
+        return report
 
-    async def _get_file(self, rpath, lpath, chunk_size=5*2**20, **kwargs):
+    sync = sync_wrapper(_sync)
+
+    async def _sync_get_file(self, rpath, lpath, mtime=None, **kwargs):
         """
-        Copy file to local.
+        Download a file, and set its modification time to the remote one.
+        """
+        await self._get_file(rpath, lpath, **kwargs)
+        if mtime is not None:
+            os.utime(lpath, (mtime, mtime))
 
-        :param rpath: (str) remote target file path
-        :param lpath: (str) local file path where to copy the target file
-        :param chunk_size: (int, optional) number of bytes read in memory at
-            once
+    async def _mkdir(self, path, create_parents=True, exist_ok=False,
+                     **kwargs):
+        """
+        Create a directory, using a WebDAV MKCOL request.
+
+        :param path: (str) target directory path
+        :param create_parents: (bool, optional) if True, create missing
+            parent directories as well
+        :param exist_ok: (bool, optional) if False, raise an error if the
+            directory already exists
         :param kwargs: (dict, optional) arguments passed on to requests
         """
-        webdav_url = self._get_webdav_url(rpath) or self.webdav_url
+        webdav_url = self._get_webdav_url(path) or self.webdav_url
+        # directories of other instances are created through their door only
+        door = "" if webdav_url == self.webdav_url else webdav_url
 
-        path = self._strip_protocol(rpath)
-        url = URL(webdav_url) / path
-        url = url.as_uri()
+        path = self._strip_protocol(path)
+        url = (URL(webdav_url) / path).as_uri()
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
-        session = await self.set_session()
-        async with session.get(url, **request_kwargs) as r:
-            if r.status == 404:
-                raise FileNotFoundError(rpath)
-            r.raise_for_status()
-            with open(lpath, "wb") as fd:
-                chunk = True
-                while chunk:
-                    chunk = await r.content.read(chunk_size)
-                    fd.write(chunk)
+        async with self._request("MKCOL", url, **request_kwargs) as r:
+            status = r.status
+            if status not in {405, 409}:
+                r.raise_for_status()
+        if status == 405:
+            # the path already exists (only checked through the API of this
+            # instance)
+            if not exist_ok or (not door and not await self._isdir(path)):
+                raise FileExistsError(path)
+            return
+        if status == 409:
+            # the parent directory does not exist
+            if not create_parents:
+                raise FileNotFoundError(_parent(path))
+            await self._mkdir(f"{door}{_parent(path)}", exist_ok=True,
+                              **kwargs)
+            await self._mkdir(f"{door}{path}", create_parents=False,
+                              exist_ok=exist_ok, **kwargs)
+            return
+        self.invalidate_cache(path)
 
-    async def _put_file(self, lpath, rpath, **kwargs):
-        """
-        Copy file from local.
+    mkdir = sync_wrapper(_mkdir)
 
-        :param rpath: (str) local target file path
-        :param lpath: (str) remote file path where to copy the target file
-        :param kwargs: (dict, optional) arguments passed on to requests
+    async def _makedirs(self, path, exist_ok=False):
         """
-        webdav_url = self._get_webdav_url(rpath) or self.webdav_url
+        Create a directory, including missing parent directories.
 
-        path = self._strip_protocol(rpath)
-        url = URL(webdav_url) / path
-        url = url.as_uri()
-        request_kwargs = self.request_kwargs.copy()
-        request_kwargs.update(kwargs)
-        session = await self.set_session()
-        with open(lpath, "rb") as fd:
-            r = await session.put(url, data=fd, **request_kwargs)
-            r.raise_for_status()
+        :param path: (str) target directory path
+        :param exist_ok: (bool, optional) if False, raise an error if the
+            directory already exists
+        """
+        await self._mkdir(path, create_parents=True, exist_ok=exist_ok)
 
-    async def _cp_file(self, path1, path2, **kwargs):
-        raise NotImplementedError
+    makedirs = sync_wrapper(_makedirs)
 
+    @instrumented(
+        'pipe_file',
+        nbytes=lambda out, path, value, *args, **kwargs: len(value)
+    )
     async def _pipe_file(self, path, value, **kwargs):
         """
         Write data into a remote file.
@@ -379,10 +3117,12 @@ class dCacheFileSystem(AsyncFileSystem):
         url = url.as_uri()
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
-        session = await self.set_session()
-        async with session.put(url, data=value, **request_kwargs) as r:
+        async with self._request(
+                "PUT", url, data=value, **request_kwargs) as r:
             r.raise_for_status()
+        self.invalidate_cache(path)
 
+    @instrumented('mv')
     async def _mv(self, path1, path2, **kwargs):
         """
         Rename path1 to path2.
@@ -399,15 +3139,19 @@ class dCacheFileSystem(AsyncFileSystem):
         data = dict(action='mv', destination=path2)
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
-        session = await self.set_session()
-        async with session.post(url, json=data, **request_kwargs) as r:
+        async with self._request(
+                "POST", url, json=data, **request_kwargs) as r:
             if r.status == 404:
                 raise FileNotFoundError(url)
             r.raise_for_status()
-            return await r.json()
+            out = await r.json()
+        self.invalidate_cache(path1)
+        self.invalidate_cache(path2)
+        return out
 
     mv = sync_wrapper(_mv)
 
+    @instrumented('rm')
     async def _rm_file(self, path, **kwargs):
         """
         Remove file or directory (must be empty).
@@ -419,42 +3163,322 @@ class dCacheFileSystem(AsyncFileSystem):
         url = url.as_uri()
         request_kwargs = self.request_kwargs.copy()
         request_kwargs.update(kwargs)
-        session = await self.set_session()
-        async with session.delete(url, **request_kwargs) as r:
+        async with self._request("DELETE", url, **request_kwargs) as r:
             if r.status == 404:
                 raise FileNotFoundError(url)
             r.raise_for_status()
+        self.invalidate_cache(path)
 
-    async def _rm(self, path, recursive=False, **kwargs):
+    async def _rm(
+        self,
+        path,
+        recursive=False,
+        batch_size=None,
+        maxdepth=None,
+        **kwargs
+    ):
         """
         Remove file or directory tree.
 
-        :param path: (str) target path
+        All files are removed first, then directories are removed level by
+        level, starting from the deepest one. Paths within each of these steps
+        are removed concurrently. Directories with content that could not be
+        removed are skipped. Errors are raised once all removals have been
+        attempted.
+
+        :param path: (str or list) target path(s)
         :param recursive: (bool, optional) if True, and the target path is a
             directory, remove all subdirectories and their files
+        :param batch_size: (int, optional) maximum number of paths removed
+            simultaneously; use instance value if None
+        :param maxdepth: (int, optional) maximum recursion depth
         :param kwargs: (dict, optional) arguments passed on to requests
         """
-        path = await self._expand_path(path, recursive=recursive)
-        # Delete elements from branches towards root, awaiting tasks
-        for p in reversed(path):
-            await asyncio.gather(self._rm_file(p, **kwargs))
+        paths = await self._expand_path(path, recursive=False)
+        types = dict.fromkeys(paths)
+        if recursive:
+            found = await asyncio.gather(*(
+                self._find(p, maxdepth=maxdepth, withdirs=True, detail=True)
+                for p in paths
+            ))
+            for out in found:
+                types.update({p: info['type'] for p, info in out.items()})
+
+        files = [p for p, type in types.items() if type != 'directory']
+        levels = collections.defaultdict(list)
+        for p, type in types.items():
+            if type == 'directory':
+                levels[p.rstrip('/').count('/')].append(p)
+        groups = [files] + [levels[d] for d in sorted(levels, reverse=True)]
+
+        batch_size = batch_size or self.batch_size
+        errors = {}
+        failed_parents = set()
+        for group in groups:
+            group = [p for p in group if p.rstrip('/') not in failed_parents]
+            results = await _run_coros_in_chunks(
+                [self._rm_file(p, **kwargs) for p in group],
+                batch_size=batch_size,
+                return_exceptions=True,
+                nofiles=True
+            )
+            for p, result in zip(group, results):
+                if isinstance(result, Exception):
+                    errors[p] = result
+                    while p != '/':
+                        p = _parent(p)
+                        failed_parents.add(p)
+        if len(errors) == 1:
+            raise next(iter(errors.values()))
+        elif errors:
+            raise dCacheRemoveError(errors)
 
     rm = sync_wrapper(_rm)
 
-    async def _info(self, path, **kwargs):
+    @instrumented('info')
+    async def _info(self, path, locality=False, checksum=False, **kwargs):
         """
         Give details about a file or a directory.
 
+        If listings are cached and the listing of the parent directory is
+        available, the path metadata are retrieved from the cache, unless the
+        file locality or checksums are requested: the locality changes when
+        files are staged, and listings do not include checksums by default.
+
         :param path: (str) target path
+        :param locality: (bool, optional) if True, include the file locality
+            (e.g. ONLINE, NEARLINE) in the details
+        :param checksum: (bool, optional) if True, include the file checksums
+            stored by dCache in the details
         :param kwargs: (dict, optional) arguments passed on to requests
         :return: (dict) path metadata
         """
         path = self._strip_protocol(path)
-        info = await self._get_info(path, **kwargs)
+        cached = not (locality or checksum)
+        info = self._info_from_cache(path) if cached else None
+        if info is not None:
+            return info
+        info = await self._get_info(
+            path, locality=locality, checksum=checksum, **kwargs
+        )
         return _get_details(path, info)
 
     info = sync_wrapper(_info)
 
+    async def _info_many(
+        self,
+        paths,
+        on_error="return",
+        batch_size=None,
+        min_siblings=INFO_MIN_SIBLINGS,
+        listing_ratio=INFO_LISTING_RATIO,
+        locality=False,
+        **kwargs
+    ):
+        """
+        Give details about multiple files and/or directories.
+
+        Paths are grouped by parent directory. If at least `min_siblings`
+        paths share the same parent, their details are taken from the parent
+        directory listing, otherwise they are requested separately. Unless
+        the listing is cached, at most `listing_ratio` entries are listed for
+        each path: if the directory is larger, the paths not found in the
+        entries listed are requested separately. Listings and requests run
+        concurrently.
+
+        :param paths: (list) target paths
+        :param on_error: (str, optional) if "return", paths whose details
+            could not be retrieved (e.g. missing paths) are mapped to the
+            error raised. If "omit", these paths are left out, if "raise",
+            the first error is raised
+        :param batch_size: (int, optional) maximum number of requests sent
+            simultaneously; use instance value if None
+        :param min_siblings: (int, optional) minimum number of paths with the
+            same parent directory to retrieve their details from the listing
+        :param listing_ratio: (int, optional) maximum number of directory
+            entries listed for each path
+        :param locality: (bool, optional) if True, include the file locality
+            (e.g. ONLINE, NEARLINE) in the details
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (dict) path metadata, with the (stripped) paths as keys
+        """
+        out = dict.fromkeys(
+            self._strip_protocol(path).rstrip('/') or '/' for path in paths
+        )
+        groups = collections.defaultdict(list)
+        for path in out:
+            groups[_parent(path) if path != '/' else None].append(path)
+
+        coros, targets = [], []
+        for parent, children in groups.items():
+            if parent is not None and len(children) >= min_siblings:
+                coros.append(self._info_from_listing(
+                    parent,
+                    children,
+                    max_entries=listing_ratio * len(children),
+                    locality=locality,
+                    **kwargs
+                ))
+                targets.append((children, True))
+            else:
+                coros.extend(
+                    self._info(path, locality=locality, **kwargs)
+                    for path in children
+                )
+                targets.extend(([path], False) for path in children)
+
+        results = await _run_coros_in_chunks(
+            coros,
+            batch_size=batch_size or self.batch_size,
+            return_exceptions=True,
+            nofiles=True
+        )
+        for result, (children, listed) in zip(results, targets):
+            if listed and not isinstance(result, Exception):
+                out.update(result)
+            else:
+                out.update(dict.fromkeys(children, result))
+        errors = {p: i for p, i in out.items() if isinstance(i, Exception)}
+        if errors and on_error == "raise":
+            raise next(iter(errors.values()))
+        if on_error == "omit":
+            for path in errors:
+                del out[path]
+        return out
+
+    info_many = sync_wrapper(_info_many)
+
+    async def _info_from_listing(self, parent, paths, max_entries=None,
+                                 locality=False, **kwargs):
+        """
+        Look up the metadata of multiple paths in the parent directory listing.
+
+        A cached listing is used if available. Otherwise, the listing is
+        requested, up to `max_entries` entries; if it is not complete, the
+        paths that are not found in it are requested separately.
+
+        :param parent: (str) parent directory path
+        :param paths: (list) target paths
+        :param max_entries: (int, optional) maximum number of entries listed
+        :param locality: (bool, optional) if True, list the directory again to
+            include the file locality in the metadata, instead of using a
+            cached listing
+        :param kwargs: (dict, optional) arguments passed on to requests
+        :return: (dict) path metadata, or the error raised (e.g.
+            FileNotFoundError for missing paths)
+        """
+        listing = None
+        if not locality:
+            try:
+                listing = self.dircache[parent]
+            except KeyError:
+                pass
+        complete = listing is not None
+        if listing is None:
+            listing = [
+                details async for page in self._ls_pages(
+                    parent, limit=max_entries, locality=locality, **kwargs
+                ) for details in page
+            ]
+            complete = max_entries is None or len(listing) < max_entries
+            if complete and not locality and \
+                    self.dircache.use_listings_cache and \
+                    not _is_file_listing(parent, listing):
+                self.dircache[parent] = listing
+        entries = {info['name'].rstrip('/'): info for info in listing}
+        out = {
+            path: entries[path] if path in entries else FileNotFoundError(path)
+            for path in paths
+        }
+        missing = [path for path in paths if path not in entries]
+        if missing and not complete:
+            results = await _run_coros_in_chunks(
+                [self._info(path, locality=locality, **kwargs)
+                 for path in missing],
+                batch_size=self.batch_size,
+                return_exceptions=True,
+                nofiles=True
+            )
+            out.update(zip(missing, results))
+        return out
+
+    def _info_from_cache(self, path):
+        """
+        Look up path metadata in the listing of the parent directory.
+
+        :param path: (str) target path
+        :return: (dict) path metadata, None if the listing of the parent
+            directory is not cached. Raise FileNotFoundError if the listing
+            is cached but it does not include the path
+        """
+        path = path.rstrip('/')
+        if not path:
+            return None
+        try:
+            info = self.dircache.get_entry(_parent(path), path)
+        except KeyError:
+            return None
+        if info is None:
+            raise FileNotFoundError(path)
+        return info
+
+    def invalidate_cache(self, path=None):
+        """
+        Discard the cached listings affected by a change of path.
+
+        The cached pool URLs of the path and of its content are discarded as
+        well. The listings of the path and of its subdirectories are discarded,
+        together with the listing of its parent directory. If the latter is
+        not cached, the parent directory might have been created together with
+        the path: the closest cached ancestor listing is then discarded as
+        well if it does not include the child directory.
+
+        :param path: (str, optional) modified path. If None, clear the cache
+        """
+        if path is None:
+            self.dircache.clear()
+            self._redirects.clear()
+            self._redirect_paths.clear()
+            return
+        path = self._strip_protocol(path).rstrip('/') or '/'
+        prefix = path.rstrip('/') + '/'
+        for key in list(self._redirect_paths):
+            if key == path or key.startswith(prefix):
+                for url in self._redirect_paths.pop(key):
+                    self._redirects.pop(url, None)
+        for key in list(self.dircache._cache):
+            if key == path or key.startswith(prefix):
+                self.dircache.pop(key, None)
+        if path == '/' or self.dircache.pop(_parent(path), None) is not None:
+            return
+        child, parent = _parent(path), _parent(_parent(path))
+        while child != '/':
+            try:
+                if self.dircache.get_entry(parent, child) is None:
+                    self.dircache.pop(parent, None)
+                return
+            except KeyError:
+                child, parent = parent, _parent(parent)
+
+    def checksum(self, path, algorithm=None):
+        """
+        Checksum of a file, as stored by dCache.
+
+        :param path: (str) target path
+        :param algorithm: (str, optional) checksum type, "adler32" or "md5".
+            If None, use the first available in this order
+        :return: (int) checksum value. If dCache has no checksum for the
+            path (e.g. for directories), a token of the path details is
+            returned, as for other fsspec file systems
+        """
+        info = self.info(path, checksum=True)
+        checksum = select_checksum(info.get("checksums", {}), algorithm)
+        if checksum is None:
+            if algorithm is not None:
+                raise ValueError(f"No {algorithm} checksum for {path}")
+            return super().checksum(path)
+        return int(checksum[1], 16)
+
     def created(self, path):
         """
         Date and time in which the path was created.
@@ -525,6 +3549,47 @@ class dCacheFileSystem(AsyncFileSystem):
                 **kwargs
             )
 
+    async def open_async(
+        self,
+        path,
+        mode="rb",
+        block_size=None,
+        request_kwargs=None,
+        **kwargs
+    ):
+        """
+        Create an asynchronous file-like object, to be used in the event loop
+        of the file system (e.g. with `asynchronous=True`).
+
+        :param path: (str) target file path
+        :param mode: (str, optional) choose between "rb" and "wb"
+        :param block_size: (int, optional) minimum number of bytes downloaded
+            by each read request, and size of the chunks uploaded while
+            writing; use instance value if None
+        :param request_kwargs: (dict, optional) arguments passed on to requests
+        :param kwargs: (dict, optional) keyword arguments passed on to the
+            file object
+        :return: (dCacheAsyncFile) asynchronous file-like object
+        """
+        if mode not in {"rb", "wb"}:
+            raise NotImplementedError
+        block_size = self.block_size if block_size is None else block_size
+        rkw = self.request_kwargs.copy()
+        rkw.update(request_kwargs or {})
+        verify = kwargs.get("verify_checksums")
+        verify = self.verify_checksums if verify is None else verify
+        details = await self._info(path, checksum=verify) \
+            if mode == "rb" else None
+        return dCacheAsyncFile(
+            self,
+            path,
+            mode=mode,
+            block_size=block_size,
+            details=details,
+            request_kwargs=rkw,
+            **kwargs
+        )
+
     def open(
         self,
         path,
@@ -548,13 +3613,106 @@ class dCacheFileSystem(AsyncFileSystem):
         )
 
 
-class dCacheFile(HTTPFile):
+class _StreamingUpload:
+    """
+    Upload of the content of a file while it is written, with a single
+    request using chunked transfer encoding. If the server does not support
+    chunked uploads, the content is written to a temporary file on disk.
+    """
+
+    async def _start_stream(self):
+        """ Open the request streaming the file content. """
+        self._queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+        self._sent = False
+
+        async def body():
+            while True:
+                data = await self._queue.get()
+                if data is None:
+                    return
+                self._sent = True
+                yield data
+
+        # with "Expect: 100-continue", a server rejecting chunked uploads
+        # replies before any data is consumed
+        self._stream = asyncio.ensure_future(
+            self._write_chunked(body(), expect100=True)
+        )
+
+    async def _stream_chunk(self, data, final):
+        """
+        Feed data to the streaming request, waiting if the queue is full.
+
+        :param data: (bytes) data to upload
+        :param final: (bool) if True, finalize the request
+        """
+        items = [data, None] if final else [data]
+        while items:
+            put = asyncio.ensure_future(self._queue.put(items[0]))
+            await asyncio.wait(
+                [put, self._stream],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not put.done():
+                put.cancel()
+                break
+            items.pop(0)
+        if not (final or self._stream.done()):
+            return
+        try:
+            await self._stream
+        except aiohttp.ClientResponseError as e:
+            if e.status not in {411, 501} or self._sent:
+                raise
+            logger.debug(
+                f"Chunked uploads not supported ({e.status}), content of "
+                f"{self.url} is temporarily written to disk"
+            )
+            self.fs.chunked_uploads = False
+            queued = []
+            while not self._queue.empty():
+                queued.append(self._queue.get_nowait())
+            self._stream = None
+            self._spill = tempfile.TemporaryFile()
+            for block in queued + items:
+                if block is not None:
+                    self._spill.write(block)
+            return
+        if items:
+            raise IOError(f"Upload to {self.url} ended before completion")
+
+    async def _write_chunked(self, data=None, **kwargs):
+        """
+        Write data to remote file.
+
+        :param data: (optional) bytes, file-like object or async iterable to
+            write. If None, write buffered data
+        :param kwargs: (dict, optional) arguments passed on to requests
+        """
+        if data is None:
+            data = self.buffer
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        async with self.fs._request(
+            "PUT",
+            self.url,
+            data=data,
+            **kwargs,
+            **self.request_kwargs
+        ) as r:
+            r.raise_for_status()
+        self.fs.invalidate_cache(self.path)
+
+
+class dCacheFile(_StreamingUpload, HTTPFile):
     """
     A file-like object pointing to a target file on dCache.
 
     Supports reading, with read-ahead of a pre-determined block-size, and
-    writing, with the file content being first cached and then uploaded to
-    upon file closure.
+    writing. Content exceeding the block size is streamed to the remote file
+    while writing, using a single request with chunked transfer encoding. If
+    chunked uploads are disabled or not supported by the server, the content
+    is written to a temporary file on disk and uploaded upon file closure.
 
     :param fs: (dCacheFileSystem) file-system instance creating the file
     :param url: (str) target file path
@@ -567,6 +3725,18 @@ class dCacheFile(HTTPFile):
     :param session: (aiohttp.ClientSession, optional) All calls will be made
         within this session, to avoid restarting connections
     :param loop: (optional) if asynchronous, event loop where to run coroutines
+    :param chunked_uploads: (bool, optional) if False, do not stream content
+        while writing; use the file-system value if None
+    :param cache_type: (str, optional) caching strategy used when reading.
+        Choose "prefetch" to download the following blocks in the background
+        while the file is read sequentially (see `PrefetchCache`), or any of
+        the fsspec cache types
+    :param cache_options: (dict, optional) arguments passed on to the cache
+    :param verify_checksums: (bool, optional) if True, compute the checksum
+        of the data while reading or writing, and compare it with the one
+        stored by dCache when the end of the file is read sequentially, or
+        when the file is closed after writing (raising `ChecksumError` if
+        they differ); use the file-system value if None
     :param kwargs: (dict, optional) arguments passed on to the super-class
     """
 
@@ -580,6 +3750,10 @@ class dCacheFile(HTTPFile):
         asynchronous=False,
         session=None,
         loop=None,
+        chunked_uploads=None,
+        cache_type="readahead",
+        cache_options=None,
+        verify_checksums=None,
         **kwargs
     ):
         path = fs._strip_protocol(url)
@@ -589,49 +3763,168 @@ class dCacheFile(HTTPFile):
         self.session = session
         self.loop = loop
         self.request_kwargs = {} if request_kwargs is None else request_kwargs
+        self.chunked_uploads = fs.chunked_uploads if chunked_uploads is None \
+            else chunked_uploads
+        self._stream = None
+        self._spill = None
+        # pool URL the door redirects reads to, kept while the file is open
+        self._redirects = {}
         if mode not in {"rb", "wb"}:
             raise ValueError
+        prefetch = cache_type == PrefetchCache.name
         super(HTTPFile, self).__init__(
             fs=fs,
             path=path,
             mode=mode,
             block_size=block_size,
+            cache_type="none" if prefetch else cache_type,
+            cache_options=None if prefetch else cache_options,
             **kwargs
         )
+        if prefetch and mode == "rb":
+            self.cache = PrefetchCache(
+                self.blocksize,
+                self.async_fetch_range,
+                self.size,
+                self.loop,
+                **(cache_options or {})
+            )
+        if verify_checksums is None:
+            verify_checksums = fs.verify_checksums
+        self._hasher = None
+        self._hashed = 0
+        self._checksum = None
+        if verify_checksums and mode == "rb":
+            if not self.details.get("checksums"):
+                self.details = fs.info(path, checksum=True)
+            self._checksum = fs._expected_checksum(path, self.details)
+            if self._checksum is not None:
+                self._hasher = new_hasher(self._checksum[0])
+        elif verify_checksums:
+            self._hasher = new_hasher(CHECKSUM_TYPES[0])
 
-    def flush(self, force=False):
+    def read(self, length=-1):
         """
-        Write buffered data to remote file. Since byte-range writing is not
-        supported, the file content is only written when `force` is True (i.e.
-        when the file-like object is closed).
+        Read bytes from file, and verify their checksum once the end of the
+        file is reached, if the file has been read sequentially.
 
-        :param force: (bool, optional) Force writing of the remote file.
-            Disallows further writing to this file.
+        :param length: (int, optional) number of bytes to read; if < 0, read
+            until the end of the file
+        :return: (bytes) data read
         """
-        if self.closed:
-            raise ValueError("Flush on closed file")
-        if force and self.forced:
-            raise ValueError("Force flush cannot be called more than once")
-        if force:
-            self.write_chunked()
-            self.forced = True
+        loc = self.loc
+        out = super().read(length)
+        if self._hasher is None or self.mode != "rb":
+            return out
+        if loc != self._hashed:
+            logger.debug(f"{self.path} not read sequentially, the checksum "
+                         f"is not verified")
+            self._hasher = None
+            return out
+        self._hasher.update(out)
+        self._hashed += len(out)
+        if self._hashed == self.size:
+            hasher, self._hasher = self._hasher, None
+            self.fs._check_checksum(self.path, self._checksum,
+                                    hasher.hexdigest())
+        return out
 
-    async def _write_chunked(self):
-        """ Write buffered data to remote file. """
-        self.buffer.seek(0)
-        r = await self.session.put(
-            self.url,
-            data=self.buffer,
-            **self.request_kwargs
-        )
-        async with r:
-            r.raise_for_status()
+    def write(self, data):
+        """
+        Write data to the buffer, updating its checksum.
+
+        :param data: (bytes) data to write
+        :return: (int) number of bytes written
+        """
+        out = super().write(data)
+        if self._hasher is not None:
+            self._hasher.update(data)
+        return out
+
+    def _initiate_upload(self):
+        """ Start uploading the file content, which exceeds a block. """
+        if self.forced:
+            # all content fits in the buffer, it is uploaded at once
+            return
+        if self.chunked_uploads:
+            sync(self.loop, self._start_stream)
+        else:
+            self._spill = tempfile.TemporaryFile()
+
+    def _upload_chunk(self, final=False):
+        """
+        Upload the buffered data.
+
+        :param final: (bool, optional) if True, this is the last chunk and
+            the upload is finalized
+        """
+        if self._stream is None and self._spill is None:
+            self.write_chunked(self.buffer)
+            return True
+        if self._stream is not None:
+            sync(self.loop, self._stream_chunk, self.buffer.getvalue(), final)
+        else:
+            self._spill.write(self.buffer.getvalue())
+        if final and self._spill is not None:
+            self._spill.seek(0)
+            try:
+                self.write_chunked(self._spill)
+            finally:
+                self._spill.close()
+        return True
+
+    write_chunked = sync_wrapper(_StreamingUpload._write_chunked)
+
+    @property
+    def metrics(self):
+        return self.fs.metrics
+
+    @instrumented(
+        'file_fetch',
+        nbytes=lambda out, *args, **kwargs: len(out)
+    )
+    async def async_fetch_range(self, start, end):
+        """
+        Download a block of data, resuming the download if interrupted.
+
+        Blocks are requested to the pool that the WebDAV door redirected the
+        first request to, if any, as long as the pool serves them.
+
+        :param start: (int) first byte of the block
+        :param end: (int) last byte (excluded) of the block
+        :return: (bytes) block content
+        """
+        if self.fs.block_cache is not None and "modified" in self.details:
+            return await self.fs._cat_cached(
+                self.url,
+                self.details,
+                start=start,
+                end=end,
+                redirects=self._redirects,
+                **self.request_kwargs
+            )
+        chunks = [
+            chunk async for chunk in self.fs._iter_content(
+                self.url,
+                start,
+                end,
+                redirects=self._redirects,
+                **self.request_kwargs
+            )
+        ]
+        return b"".join(chunks)
 
-    write_chunked = sync_wrapper(_write_chunked)
+    _fetch_range = sync_wrapper(async_fetch_range)
 
     def close(self):
-        """ Close file. Finalize writes, discard cache. """
+        """
+        Close file. Finalize writes, discard cache, and verify the checksum
+        of the data written if requested.
+        """
+        closed = self.closed
         super(HTTPFile, self).close()
+        if not closed and self.mode == "wb" and self._hasher is not None:
+            sync(self.loop, self.fs._verify_upload, self.path, self._hasher)
 
 
 class dCacheStreamFile(HTTPStreamFile):
@@ -680,7 +3973,7 @@ class dCacheStreamFile(HTTPStreamFile):
         if self.mode == "rb":
 
             async def get():
-                r = await self.session.get(self.url, **self.request_kwargs)
+                r = await self.fs._send("GET", self.url, **self.request_kwargs)
                 return r
 
             self.r = sync(self.loop, get)
@@ -701,7 +3994,8 @@ class dCacheStreamFile(HTTPStreamFile):
             raise ValueError("File not in write mode")
 
         async def put():
-            r = await self.session.put(
+            r = await self.fs._send(
+                "PUT",
                 self.url,
                 data=data,
                 **self.request_kwargs
@@ -710,6 +4004,7 @@ class dCacheStreamFile(HTTPStreamFile):
 
         self.r = sync(self.loop, put)
         self.r.raise_for_status()
+        self.fs.invalidate_cache(self.path)
 
     def read(self, num=-1):
         """
@@ -722,3 +4017,249 @@ class dCacheStreamFile(HTTPStreamFile):
         if self.mode != "rb":
             raise ValueError("File not in read mode")
         return super().read(num=num)
+
+
+class dCacheAsyncFile(_StreamingUpload, AbstractAsyncStreamedFile):
+    """
+    An asynchronous file-like object pointing to a target file on dCache, as
+    returned by `dCacheFileSystem.open_async`.
+
+    Reading, writing, seeking and closing are coroutines, run in the event
+    loop of the file system with its shared session, so that many files can
+    be read or written concurrently from the same loop, without threads.
+    Reads download at least a block at a time, from the pool the WebDAV door
+    redirected the first request to, if any. Content written is streamed to
+    the remote file as with `dCacheFile`. The file can be used as an
+    asynchronous context manager.
+
+    :param fs: (dCacheFileSystem) file-system instance creating the file
+    :param url: (str) target file path
+    :param mode: (str, optional) choose between "rb" and "wb"
+    :param block_size: (int, optional) minimum number of bytes downloaded by
+        each read request, and size of the chunks uploaded while writing.
+        Default is 5MB
+    :param details: (dict, optional) file details, as returned by `info`;
+        required in read mode
+    :param request_kwargs: (dict, optional) arguments passed on to requests
+    :param chunked_uploads: (bool, optional) if False, do not stream content
+        while writing; use the file-system value if None
+    :param verify_checksums: (bool, optional) if True, compute the checksum
+        of the data while reading or writing, and compare it with the one
+        stored by dCache (see `dCacheFile`); use the file-system value if None
+    :param kwargs: (dict, optional) arguments passed on to the super-class
+    """
+
+    def __init__(
+        self,
+        fs,
+        url,
+        mode="rb",
+        block_size=None,
+        details=None,
+        request_kwargs=None,
+        chunked_uploads=None,
+        verify_checksums=None,
+        **kwargs
+    ):
+        webdav_url = fs._get_webdav_url(url) or fs.webdav_url
+        path = fs._strip_protocol(url)
+        self.url = _file_url(webdav_url, path)
+        self.request_kwargs = {} if request_kwargs is None else request_kwargs
+        self.chunked_uploads = fs.chunked_uploads if chunked_uploads is None \
+            else chunked_uploads
+        self._stream = None
+        self._spill = None
+        # pool URL the door redirects reads to, kept while the file is open
+        self._redirects = {}
+        # last block downloaded, with its offset
+        self._block = (0, b"")
+        if mode not in {"rb", "wb"}:
+            raise ValueError
+        if mode == "rb" and details is None:
+            raise ValueError("File details are required in read mode")
+        self._details = details
+        super().__init__(
+            fs=fs,
+            path=path,
+            mode=mode,
+            block_size=block_size,
+            cache_type="none",
+            size=None if details is None else details["size"],
+            **kwargs
+        )
+        if verify_checksums is None:
+            verify_checksums = fs.verify_checksums
+        self._hasher = None
+        self._hashed = 0
+        self._checksum = None
+        if verify_checksums and mode == "rb":
+            self._checksum = fs._expected_checksum(path, details)
+            if self._checksum is not None:
+                self._hasher = new_hasher(self._checksum[0])
+        elif verify_checksums:
+            self._hasher = new_hasher(CHECKSUM_TYPES[0])
+
+    @property
+    def metrics(self):
+        return self.fs.metrics
+
+    async def read(self, length=-1):
+        """
+        Read bytes from file, and verify their checksum once the end of the
+        file is reached, if the file has been read sequentially.
+
+        :param length: (int, optional) number of bytes to read; if < 0, read
+            until the end of the file
+        :return: (bytes) data read
+        """
+        loc = self.loc
+        out = await super().read(length)
+        if self._hasher is None:
+            return out
+        if loc != self._hashed:
+            logger.debug(f"{self.path} not read sequentially, the checksum "
+                         f"is not verified")
+            self._hasher = None
+            return out
+        self._hasher.update(out)
+        self._hashed += len(out)
+        if self._hashed == self.size:
+            hasher, self._hasher = self._hasher, None
+            self.fs._check_checksum(self.path, self._checksum,
+                                    hasher.hexdigest())
+        return out
+
+    async def readinto(self, b):
+        """
+        Read bytes from file into a pre-allocated buffer.
+
+        :param b: (bytearray or memoryview) buffer to fill
+        :return: (int) number of bytes read
+        """
+        out = memoryview(b).cast("B")
+        data = await self.read(out.nbytes)
+        out[:len(data)] = data
+        return len(data)
+
+    async def seek(self, loc, whence=0):
+        """
+        Set the current position in the file.
+
+        :param loc: (int) position, relative to `whence`
+        :param whence: (int, optional) 0, 1 or 2 for positions relative to
+            the start of the file, to the current position or to the end of
+            the file, respectively
+        :return: (int) new position
+        """
+        return super().seek(loc, whence)
+
+    async def write(self, data):
+        """
+        Write data to the buffer, updating its checksum.
+
+        :param data: (bytes) data to write
+        :return: (int) number of bytes written
+        """
+        out = await super().write(data)
+        if self._hasher is not None:
+            self._hasher.update(data)
+        return out
+
+    async def close(self):
+        """
+        Close file. Finalize writes, and verify the checksum of the data
+        written if requested.
+        """
+        closed = self.closed
+        await super().close()
+        if not closed and self.mode == "wb" and self._hasher is not None:
+            await self.fs._verify_upload(self.path, self._hasher)
+
+    async def _fetch_range(self, start, end):
+        """
+        Get a byte range of the file, from the last block downloaded if it
+        includes the range, downloading at least a block otherwise.
+
+        :param start: (int) first byte of the range
+        :param end: (int) last byte (excluded) of the range
+        :return: (bytes) range content
+        """
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        offset, block = self._block
+        if offset <= start and end <= offset + len(block):
+            return block[start - offset:end - offset]
+        head = b""
+        if offset <= start < offset + len(block):
+            # the beginning of the range is in the last block
+            head = block[start - offset:]
+            start = offset + len(block)
+        stop = min(max(end, start + self.blocksize), self.size)
+        block = await self._download(start, stop)
+        self._block = (start, block)
+        return head + block[:end - start]
+
+    @instrumented(
+        'file_fetch',
+        nbytes=lambda out, *args, **kwargs: len(out)
+    )
+    async def _download(self, start, end):
+        """
+        Download a block of data (see `dCacheFile.async_fetch_range`).
+
+        :param start: (int) first byte of the block
+        :param end: (int) last byte (excluded) of the block
+        :return: (bytes) block content
+        """
+        if self.fs.block_cache is not None and "modified" in self.details:
+            return await self.fs._cat_cached(
+                self.url,
+                self.details,
+                start=start,
+                end=end,
+                redirects=self._redirects,
+                **self.request_kwargs
+            )
+        chunks = [
+            chunk async for chunk in self.fs._iter_content(
+                self.url,
+                start,
+                end,
+                redirects=self._redirects,
+                **self.request_kwargs
+            )
+        ]
+        return b"".join(chunks)
+
+    async def _initiate_upload(self):
+        """ Start uploading the file content, which exceeds a block. """
+        if self.forced:
+            # all content fits in the buffer, it is uploaded at once
+            return
+        if self.chunked_uploads:
+            await self._start_stream()
+        else:
+            self._spill = tempfile.TemporaryFile()
+
+    async def _upload_chunk(self, final=False):
+        """
+        Upload the buffered data.
+
+        :param final: (bool, optional) if True, this is the last chunk and
+            the upload is finalized
+        """
+        if self._stream is None and self._spill is None:
+            await self._write_chunked(self.buffer)
+            return True
+        if self._stream is not None:
+            await self._stream_chunk(self.buffer.getvalue(), final)
+        else:
+            self._spill.write(self.buffer.getvalue())
+        if final and self._spill is not None:
+            self._spill.seek(0)
+            try:
+                await self._write_chunked(self._spill)
+            finally:
+                self._spill.close()
+        return True
@@ -0,0 +1,93 @@
+import collections
+import time
+
+from fsspec.dircache import DirCache
+
+
+class dCacheDirCache(DirCache):
+    """
+    Caching of directory listings, with expiry time and least-recently-used
+    eviction.
+
+    Listings are stored in the same structure as for the fsspec `DirCache`,
+    i.e. directory paths are mapped to lists of dictionaries with the children
+    paths info. Differently from the fsspec `DirCache`, caching is disabled by
+    default.
+
+    :param use_listings_cache: (bool, optional) if False, this cache never
+        returns items and setting items has no effect
+    :param listings_expiry_time: (float, optional) time in seconds that a
+        listing is considered valid. If None, listings do not expire
+    :param max_paths: (int, optional) maximum number of listings stored. When
+        exceeded, the least-recently-used listings are discarded
+    :param kwargs: (dict, optional) ignored
+    """
+
+    def __init__(
+        self,
+        use_listings_cache=False,
+        listings_expiry_time=None,
+        max_paths=None,
+        **kwargs
+    ):
+        self._cache = collections.OrderedDict()
+        self._times = {}
+        self._entries = {}
+        self.use_listings_cache = use_listings_cache
+        self.listings_expiry_time = listings_expiry_time
+        self.max_paths = max_paths
+
+    def __getitem__(self, item):
+        if not self.use_listings_cache:
+            raise KeyError(item)
+        if self.listings_expiry_time is not None:
+            age = time.monotonic() - self._times.get(item, 0)
+            if item in self._cache and age > self.listings_expiry_time:
+                del self[item]
+        value = self._cache[item]  # maybe raises KeyError
+        self._cache.move_to_end(item)
+        return value
+
+    def __setitem__(self, key, value):
+        if not self.use_listings_cache:
+            return
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        self._times[key] = time.monotonic()
+        self._entries.pop(key, None)
+        if self.max_paths:
+            while len(self._cache) > self.max_paths:
+                del self[next(iter(self._cache))]
+
+    def __delitem__(self, key):
+        del self._cache[key]
+        self._times.pop(key, None)
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._cache.clear()
+        self._times.clear()
+        self._entries.clear()
+
+    def get_entry(self, key, name):
+        """
+        Look up a single entry in a cached listing.
+
+        :param key: (str) directory path
+        :param name: (str) path of the entry
+        :return: (dict) path info, None if the listing does not include the
+            entry. Raise KeyError if the listing is not cached
+        """
+        listing = self[key]
+        entries = self._entries.get(key)
+        if entries is None:
+            entries = {info['name']: info for info in listing}
+            self._entries[key] = entries
+        return entries.get(name)
+
+    def __reduce__(self):
+        return (
+            dCacheDirCache,
+            (self.use_listings_cache, self.listings_expiry_time,
+             self.max_paths),
+        )
@@ -0,0 +1,197 @@
+import collections
+import contextvars
+import functools
+import math
+import threading
+import time
+
+import aiohttp
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., math.inf
+)
+
+# operation being run in the current context (task)
+_operation = contextvars.ContextVar('dcachefs_operation', default=None)
+
+
+class Histogram:
+    """
+    Histogram of observed values, with cumulative buckets as for Prometheus.
+
+    :param buckets: (tuple) upper bounds of the buckets, sorted
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self, reset=False):
+        """
+        :param reset: (bool, optional) if True, discard the recorded data
+            after reading it
+        :return: (dict) number of observations, their sum and the cumulative
+            counts for each bucket upper bound
+        """
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[bound] = total
+        return dict(count=self.count, sum=self.sum, buckets=cumulative)
+
+
+class Metrics:
+    """
+    Metrics of the operations run by a file system.
+
+    For each operation type, the number of calls, of HTTP requests (including
+    retries) and of errors (by HTTP status code, or by error type) are
+    counted, together with the bytes transferred. Latencies are recorded in
+    histograms.
+
+    Hooks are called for each operation recorded, with the operation name,
+    its duration (in seconds), the bytes transferred and the error raised (or
+    None). They can be used to forward metrics to exporters, e.g. to
+    observe a Prometheus histogram.
+
+    :param buckets: (tuple, optional) upper bounds of the latency histogram
+        buckets, in seconds
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.hooks = []
+        self._lock = threading.Lock()
+        self._clear()
+
+    def reset(self):
+        """ Discard all recorded data. """
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._calls = collections.Counter()
+        self._requests = collections.Counter()
+        self._bytes = collections.Counter()
+        self._errors = collections.defaultdict(collections.Counter)
+        self._latency = collections.defaultdict(
+            lambda: Histogram(self.buckets)
+        )
+
+    def add_hook(self, hook):
+        """
+        Register a function to be called for each operation recorded.
+
+        :param hook: (callable) function accepting operation name, duration,
+            number of bytes transferred and error (or None)
+        """
+        self.hooks.append(hook)
+
+    def record(self, operation, duration, nbytes=0, error=None):
+        """
+        Record a completed operation.
+
+        :param operation: (str) operation name
+        :param duration: (float) duration in seconds
+        :param nbytes: (int, optional) number of bytes transferred
+        :param error: (Exception, optional) error raised by the operation
+        """
+        with self._lock:
+            self._calls[operation] += 1
+            self._latency[operation].observe(duration)
+            self._bytes[operation] += nbytes or 0
+            if error is not None:
+                self._errors[operation][_error_key(error)] += 1
+        for hook in self.hooks:
+            hook(operation, duration, nbytes, error)
+
+    def record_request(self):
+        """ Count an HTTP request for the operation being run. """
+        with self._lock:
+            self._requests[_operation.get() or 'other'] += 1
+
+    def snapshot(self, reset=False):
+        """
+        :param reset: (bool, optional) if True, discard the recorded data
+            after reading it
+        :return: (dict) for each operation, number of calls, HTTP requests
+            and errors, bytes transferred, average throughput (bytes per
+            second of operation time) and latency histogram
+        """
+        with self._lock:
+            operations = sorted(set(self._calls) | set(self._requests))
+            stats = {}
+            for operation in operations:
+                latency = self._latency[operation].snapshot() \
+                    if operation in self._latency else None
+                nbytes = self._bytes[operation]
+                elapsed = latency['sum'] if latency else 0.
+                stats[operation] = dict(
+                    calls=self._calls[operation],
+                    requests=self._requests[operation],
+                    errors=dict(self._errors.get(operation, {})),
+                    bytes=nbytes,
+                    throughput=nbytes / elapsed if elapsed else 0.,
+                    latency=latency
+                )
+            if reset:
+                self._clear()
+            return stats
+
+
+def _error_key(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status
+    if isinstance(error, FileNotFoundError):
+        return 404
+    return type(error).__name__
+
+
+def instrumented(operation, nbytes=None):
+    """
+    Decorate a coroutine method of the file system (or of its files), to
+    record its calls in the file-system metrics.
+
+    Calls made while another instrumented operation is running (e.g. `_info`
+    while running `_get_file`) are part of the outer operation, and are not
+    recorded separately.
+
+    :param operation: (str) operation name
+    :param nbytes: (callable, optional) function returning the number of
+        bytes transferred, given the result and the method arguments
+    """
+    def decorator(func):
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None or _operation.get() is not None:
+                return await func(self, *args, **kwargs)
+            token = _operation.set(operation)
+            start = time.perf_counter()
+            try:
+                result = await func(self, *args, **kwargs)
+            except Exception as e:
+                metrics.record(operation, time.perf_counter() - start,
+                               error=e)
+                raise
+            finally:
+                _operation.reset(token)
+            size = nbytes(result, *args, **kwargs) if nbytes else 0
+            metrics.record(operation, time.perf_counter() - start, size)
+            return result
+
+        return wrapper
+
+    return decorator
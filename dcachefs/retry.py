@@ -0,0 +1,224 @@
+import asyncio
+import email.utils
+import random
+import time
+
+import aiohttp
+
+
+RETRY_STATUSES = frozenset({408, 429, 502, 503, 504})
+
+IDEMPOTENT_METHODS = frozenset(
+    {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'COPY', 'PROPFIND'}
+)
+
+# errors raised while connecting or transferring data, which might succeed
+# if the request is repeated
+TRANSIENT_ERRORS = (
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError
+)
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Error raised when requests to a host are suspended because of repeated
+    failures.
+    """
+
+
+class RetryPolicy:
+    """
+    Policy to retry requests that fail with transient errors.
+
+    Requests are retried if the connection fails, or if the server replies
+    with one of the given status codes. Requests with methods that are not
+    idempotent (e.g. POST) are only retried if the connection to the server
+    could not be established, unless `retry_non_idempotent` is True.
+
+    The n-th retry (starting from zero) waits a random time between zero and
+    `min(backoff_max, backoff_base * 2**n)` seconds ("full jitter"). If the
+    server reply includes a `Retry-After` header, its value is used instead,
+    up to `backoff_max` seconds.
+
+    Failed requests to a host are also tracked by a circuit breaker: after
+    `breaker_threshold` consecutive failures, requests to the host are not
+    sent for `breaker_timeout` seconds. Requests that can still be retried
+    wait for the circuit to be half-open, the others fail with
+    `CircuitOpenError`. Afterwards, a single trial request is let through,
+    and the circuit is closed again if it succeeds. Replies asking to slow
+    down (429 or 503 with a `Retry-After` header) are not counted as
+    failures.
+
+    :param max_retries: (int, optional) maximum number of times a request is
+        retried. If 0, requests are never retried
+    :param backoff_base: (float, optional) base delay, in seconds
+    :param backoff_max: (float, optional) maximum delay, in seconds
+    :param statuses: (iterable, optional) status codes of the responses that
+        are retried
+    :param retry_non_idempotent: (bool, optional) if True, retry requests
+        with methods that are not idempotent as well
+    :param breaker_threshold: (int, optional) number of consecutive failures
+        that suspend requests to a host. If None, requests are never
+        suspended
+    :param breaker_timeout: (float, optional) time (in seconds) requests to a
+        failing host are suspended
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        backoff_base=0.5,
+        backoff_max=60.,
+        statuses=RETRY_STATUSES,
+        retry_non_idempotent=False,
+        breaker_threshold=10,
+        breaker_timeout=30.
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.statuses = frozenset(statuses)
+        self.retry_non_idempotent = retry_non_idempotent
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+
+    def is_retryable(self, method, error=None):
+        """
+        Whether a failed request can be repeated.
+
+        :param method: (str) HTTP method of the request
+        :param error: (Exception, optional) error raised by the request. If
+            None, the request failed with a retryable status code
+        :return: (bool)
+        """
+        if isinstance(error, aiohttp.ClientConnectorError):
+            # the request has not been sent
+            return True
+        return method.upper() in IDEMPOTENT_METHODS or \
+            self.retry_non_idempotent
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Time to wait before retrying a request.
+
+        :param attempt: (int) number of retries already attempted
+        :param retry_after: (str, optional) value of the `Retry-After` header
+        :return: (float) delay in seconds
+        """
+        if retry_after is not None:
+            seconds = _parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(seconds, self.backoff_max)
+        cap = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return random.uniform(0, cap)
+
+    def __repr__(self):
+        return (
+            f'{type(self).__name__}(max_retries={self.max_retries}, '
+            f'backoff_base={self.backoff_base}, '
+            f'backoff_max={self.backoff_max}, '
+            f'breaker_threshold={self.breaker_threshold}, '
+            f'breaker_timeout={self.breaker_timeout})'
+        )
+
+
+class CircuitBreaker:
+    """
+    Track the failures of requests to a host, and suspend requests after
+    repeated failures.
+
+    :param threshold: (int) number of consecutive failures that open the
+        circuit (i.e. suspend requests). If None, it is never opened
+    :param timeout: (float) time (in seconds) after which a trial request is
+        let through an open circuit
+    """
+
+    def __init__(self, threshold, timeout):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+
+    @property
+    def state(self):
+        """ Circuit state: "closed", "open" or "half-open". """
+        if self._opened is None:
+            return 'closed'
+        if time.monotonic() - self._opened < self.timeout:
+            return 'open'
+        return 'half-open'
+
+    def retry_in(self):
+        """
+        :return: (float) time (in seconds) until a trial request is let
+            through, zero if the circuit is not open
+        """
+        if self._opened is None:
+            return 0.
+        return max(self.timeout - (time.monotonic() - self._opened), 0.)
+
+    def check(self, host=None):
+        """
+        Raise CircuitOpenError if requests are suspended.
+
+        :param host: (str, optional) host name, used in the error message
+        """
+        state = self.state
+        if state == 'closed':
+            return
+        if state == 'half-open' and not self._trial:
+            self._trial = True
+            return
+        raise CircuitOpenError(
+            f'Requests to {host or "host"} suspended after {self.failures} '
+            f'consecutive failures, retry in {self.retry_in():.1f} s'
+        )
+
+    def record_success(self):
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+
+    def record_throttled(self):
+        # the host replied, but the failures are not reset: another trial
+        # request can be let through
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.threshold and self.failures >= self.threshold:
+            self._opened = time.monotonic()
+
+
+def is_throttled(status, headers):
+    """
+    Whether a reply asks the client to slow down, rather than reporting a
+    failure of the server.
+
+    :param status: (int) status code of the reply
+    :param headers: (dict) headers of the reply
+    :return: (bool)
+    """
+    return status in {429, 503} and 'Retry-After' in headers
+
+
+def _parse_retry_after(value):
+    """
+    Parse the value of a `Retry-After` header.
+
+    :param value: (str) delay in seconds or HTTP date
+    :return: (float) delay in seconds, None if the value cannot be parsed
+    """
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.)
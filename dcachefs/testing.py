@@ -0,0 +1,751 @@
+import aiohttp
+import asyncio
+import collections
+import functools
+import hashlib
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+from aiohttp import web
+from urllib.parse import unquote, urlparse
+
+
+DCACHE_FILE_TYPES = {
+    'file': 'REGULAR',
+    'directory': 'DIR'
+}
+
+_STREAM_CHUNK_SIZE = 2**16
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_checksums(path, size, mtime):
+    # the file size and modification time invalidate cached values
+    adler32, md5 = 1, hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_STREAM_CHUNK_SIZE), b''):
+            adler32 = zlib.adler32(chunk, adler32)
+            md5.update(chunk)
+    return [
+        dict(type='ADLER32', value=f'{adler32:08x}'),
+        dict(type='MD5_TYPE', value=md5.hexdigest())
+    ]
+
+
+def _perf_marker(nbytes):
+    # performance marker of a third-party copy, as sent by dCache
+    return (
+        f'Perf Marker\n'
+        f'\tTimestamp: {int(time.time())}\n'
+        f'\tState: Running\n'
+        f'\tStripe Index: 0\n'
+        f'\tStripe Bytes Transferred: {nbytes}\n'
+        f'\tTotal Stripe Count: 1\n'
+        f'End\n'
+    ).encode()
+
+
+def _transfer_headers(request):
+    # headers to forward to the remote party of a third-party copy
+    prefix = 'transferheader'
+    return {
+        key[len(prefix):]: value for key, value in request.headers.items()
+        if key.lower().startswith(prefix)
+    }
+
+
+def _get_metadata(path, name=None, checksum=False, locality=None):
+    """
+    Build the metadata of a local path as returned by the dCache API
+
+    :param path: (pathlib.Path) local path
+    :param name: (str, optional) if provided, include it as `fileName`
+    :param checksum: (bool, optional) if True, include the file checksums
+    :param locality: (str, optional) if provided, include it as the file
+        locality
+    :return: (dict) metadata
+    """
+    stat = path.stat()
+    file_type = 'directory' if path.is_dir() else 'file'
+    metadata = dict(
+        fileMimeType='application/octet-stream',
+        fileType=DCACHE_FILE_TYPES[file_type],
+        size=stat.st_size if file_type == 'file' else 512,
+        mtime=int(stat.st_mtime * 1000),
+        creationTime=int(stat.st_ctime * 1000)
+    )
+    if name is not None:
+        metadata['fileName'] = name
+    if checksum and file_type == 'file':
+        metadata['checksums'] = _get_checksums(
+            str(path), stat.st_size, stat.st_mtime_ns
+        )
+    if locality is not None and file_type == 'file':
+        metadata['fileLocality'] = locality
+    return metadata
+
+
+def _parse_range(header, size):
+    """
+    Parse a `Range` header.
+
+    :param header: (str) header value, e.g. "bytes=0-9" or "bytes=0-9,20-29"
+    :param size: (int) size of the target file
+    :return: (list) tuples with first and last byte of the ranges (inclusive)
+        that can be satisfied, or None if the header is not valid
+    """
+    unit, _, byte_ranges = header.partition('=')
+    if unit.strip() != 'bytes':
+        return None
+    ranges = []
+    for byte_range in byte_ranges.split(','):
+        start, _, end = byte_range.strip().partition('-')
+        if not start:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        if start < size and start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+class dCacheTestServer:
+    """
+    Local stand-in for a dCache instance, for testing and benchmarking.
+
+    The server exposes the subset of the dCache API `namespace` and
+    `bulk-requests` endpoints and of the WebDAV door (GET, PUT, COPY and
+    MKCOL) that is used by dCacheFileSystem, serving the content of a local
+    directory. The API, the WebDAV door and (optionally) a pool run as
+    separate aiohttp applications on different ports of the local host, in
+    a background thread with its own event loop.
+
+    COPY requests with a `Source` header, or with a `Destination` header
+    pointing to another host, are run as HTTP third-party copies (pull and
+    push mode, respectively), streaming performance markers while the data
+    is transferred. Headers with the `TransferHeader` prefix are forwarded
+    to the remote party (and recorded in `transfer_headers`).
+
+    :param root: (str, optional) local directory whose content is served. If
+        None, a temporary directory is created and removed on stop
+    :param latency: (float, optional) delay (in seconds) added to each request
+    :param bandwidth: (float, optional) maximum transfer rate (in bytes per
+        second) of each WebDAV response; unlimited if None
+    :param redirect: (bool, optional) if True, the WebDAV door answers GET
+        requests with a redirect (307) to a pool serving the data
+    :param chunked_uploads: (bool, optional) if False, uploads without
+        `Content-Length` (i.e. with chunked transfer encoding) are rejected
+    :param multipart_ranges: (bool, optional) if False, requests for multiple
+        byte ranges are answered with the whole file content, otherwise with
+        a multipart/byteranges response
+    :param coalesce_ranges: (bool, optional) if True, requests for multiple
+        byte ranges are answered with a single range spanning all of them
+    :param stage_time: (float, optional) time (in seconds) to stage a file
+        from tape. Files whose paths are added to `nearline` are only stored
+        on tape, and are staged by WebDAV GET requests (which wait for it) or
+        by bulk STAGE requests
+    :param host: (str, optional) interface where to bind the server
+    """
+
+    def __init__(
+        self,
+        root=None,
+        latency=0.,
+        bandwidth=None,
+        redirect=False,
+        chunked_uploads=True,
+        multipart_ranges=True,
+        coalesce_ranges=False,
+        stage_time=0.,
+        host='127.0.0.1'
+    ):
+        self._tmpdir = None
+        if root is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='dcache-')
+            root = self._tmpdir
+        self.root = pathlib.Path(root)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.redirect = redirect
+        self.chunked_uploads = chunked_uploads
+        self.multipart_ranges = multipart_ranges
+        self.coalesce_ranges = coalesce_ranges
+        self.stage_time = stage_time
+        self.nearline = set()
+        self.host = host
+        self._staging = {}
+        self._bulk_requests = {}
+        self.transfer_headers = []
+        self.requests = collections.Counter()
+        self._faults = []
+        self._truncate = {}
+        self._ports = {}
+        self._loop = None
+        self._thread = None
+        self._runners = []
+
+    @property
+    def api_url(self):
+        return f'http://{self.host}:{self._ports["api"]}/api/v1'
+
+    @property
+    def webdav_url(self):
+        return f'http://{self.host}:{self._ports["webdav"]}'
+
+    @property
+    def pool_url(self):
+        return f'http://{self.host}:{self._ports["pool"]}'
+
+    def start(self):
+        """ Start the server in a background thread. """
+        if self._thread is not None:
+            raise RuntimeError('Server already running')
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        """ Stop the server and remove temporary data. """
+        if self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._stop(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = None
+        self._loop = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    async def _start(self):
+        apps = {
+            'api': self._api_app(),
+            'webdav': self._webdav_app(door=True),
+            'pool': self._webdav_app(door=False),
+        }
+        for name, app in apps.items():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            self._ports[name] = site._server.sockets[0].getsockname()[1]
+            self._runners.append(runner)
+
+    async def _stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+        # cancel handlers of connections kept alive by clients
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def add_fault(
+        self,
+        app='webdav',
+        method=None,
+        status=503,
+        headers=None,
+        truncate=None,
+        count=1
+    ):
+        """
+        Make the following requests fail, e.g. to test retries.
+
+        :param app: (str, optional) application whose requests fail: "api",
+            "webdav" (door) or "pool"
+        :param method: (str, optional) HTTP method of the requests that fail.
+            If None, requests with any method fail
+        :param status: (int, optional) status code of the failure response
+        :param headers: (dict, optional) headers of the failure response,
+            e.g. `Retry-After`
+        :param truncate: (int, optional) if given, GET requests of the WebDAV
+            door and pool are not answered with an error, but the connection
+            is dropped after sending this number of bytes of content
+        :param count: (int, optional) number of requests that fail
+        """
+        self._faults.append(dict(
+            app=app,
+            method=method,
+            status=status,
+            headers=headers,
+            truncate=truncate,
+            count=count
+        ))
+
+    def _pop_fault(self, app, method):
+        for fault in self._faults:
+            if fault['app'] == app and fault['method'] in {None, method}:
+                fault['count'] -= 1
+                if fault['count'] <= 0:
+                    self._faults.remove(fault)
+                return fault
+        return None
+
+    def _middleware(self, name):
+
+        @web.middleware
+        async def middleware(request, handler):
+            self.requests[(name, request.method)] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            fault = self._pop_fault(name, request.method)
+            if fault is None:
+                return await handler(request)
+            if fault['truncate'] is None:
+                return web.Response(
+                    status=fault['status'],
+                    headers=fault['headers']
+                )
+            self._truncate[id(request)] = fault['truncate']
+            try:
+                return await handler(request)
+            finally:
+                del self._truncate[id(request)]
+
+        return middleware
+
+    def _remote_path(self, local_path):
+        """ Map a local path to the remote path. """
+        path = local_path.relative_to(self.root.resolve()).as_posix()
+        return '/' if path == '.' else f'/{path}'
+
+    def _locality(self, local_path):
+        if self._remote_path(local_path) in self.nearline:
+            return 'NEARLINE'
+        return 'ONLINE'
+
+    async def _stage(self, local_path):
+        """ Stage a file from tape, if not online. """
+        path = self._remote_path(local_path)
+        if path not in self.nearline:
+            return
+        if path not in self._staging:
+
+            async def stage():
+                await asyncio.sleep(self.stage_time)
+                self.nearline.discard(path)
+                del self._staging[path]
+
+            self._staging[path] = asyncio.ensure_future(stage())
+        await asyncio.shield(self._staging[path])
+
+    def _local_path(self, path):
+        """ Map a remote path to the local directory served. """
+        path = unquote(path).strip('/')
+        local_path = (self.root / path).resolve()
+        if local_path != self.root.resolve() and \
+                self.root.resolve() not in local_path.parents:
+            raise web.HTTPForbidden()
+        return local_path
+
+    # dCache API
+
+    def _api_app(self):
+        app = web.Application(middlewares=[self._middleware('api')])
+        prefix = '/api/v1/namespace'
+        app.router.add_get(prefix + '{path:.*}', self._namespace_get)
+        app.router.add_post(prefix + '{path:.*}', self._namespace_post)
+        app.router.add_delete(prefix + '{path:.*}', self._namespace_delete)
+        app.router.add_post('/api/v1/bulk-requests', self._bulk_post)
+        app.router.add_get('/api/v1/bulk-requests/{uid}', self._bulk_get)
+        return app
+
+    def _namespace_path(self, request):
+        # use the raw path, since the file path is URL-encoded as a single
+        # path element
+        raw_path = request.raw_path.split('?')[0]
+        path = raw_path[len('/api/v1/namespace'):]
+        return self._local_path(path)
+
+    @staticmethod
+    def _error(status, message):
+        return web.json_response(
+            dict(errors=[dict(status=f'{status}', message=message)]),
+            status=status
+        )
+
+    async def _namespace_get(self, request):
+        path = self._namespace_path(request)
+        if not path.exists():
+            return self._error(404, 'Not Found')
+        query = {
+            key: request.query.get(key, 'false').lower() == 'true'
+            for key in ('checksum', 'locality', 'children')
+        }
+
+        def metadata(path, name=None):
+            locality = self._locality(path) if query['locality'] else None
+            return _get_metadata(path, name=name, checksum=query['checksum'],
+                                 locality=locality)
+
+        out = metadata(path)
+        if query['children'] and path.is_dir():
+            offset = int(request.query.get('offset', 0))
+            limit = request.query.get('limit')
+            names = sorted(os.listdir(path))
+            end = None if limit is None else offset + int(limit)
+            out['children'] = [
+                metadata(path / name, name=name)
+                for name in names[offset:end]
+            ]
+        return web.json_response(out)
+
+    async def _namespace_post(self, request):
+        path = self._namespace_path(request)
+        data = await request.json()
+        if data.get('action') != 'mv':
+            return self._error(400, 'Unsupported action')
+        if not path.exists():
+            return self._error(404, 'Not Found')
+        destination = self._local_path(data['destination'])
+        if not destination.parent.is_dir():
+            return self._error(404, 'Destination parent not found')
+        os.replace(path, destination)
+        return web.json_response(dict(status='success'))
+
+    async def _namespace_delete(self, request):
+        path = self._namespace_path(request)
+        if not path.exists():
+            return self._error(404, 'Not Found')
+        if path.is_dir():
+            if any(path.iterdir()):
+                return self._error(400, 'Directory is not empty')
+            path.rmdir()
+        else:
+            path.unlink()
+        return web.json_response(dict(status='success'))
+
+    async def _bulk_post(self, request):
+        data = await request.json()
+        if data.get('activity') != 'STAGE':
+            return self._error(400, 'Unsupported activity')
+        targets = []
+        for target in data.get('target', []):
+            path = self._local_path(target)
+            if path.is_file():
+                task = asyncio.ensure_future(self._stage(path))
+                targets.append(dict(target=target, task=task))
+            else:
+                targets.append(dict(target=target, task=None))
+        uid = str(uuid.uuid4())
+        self._bulk_requests[uid] = targets
+        location = f'{self.api_url}/bulk-requests/{uid}'
+        return web.Response(status=201, headers={'request-url': location})
+
+    async def _bulk_get(self, request):
+        targets = self._bulk_requests.get(request.match_info['uid'])
+        if targets is None:
+            return self._error(404, 'Not Found')
+        out = []
+        for target in targets:
+            task = target['task']
+            if task is None:
+                state = 'FAILED'
+            else:
+                state = 'COMPLETED' if task.done() else 'RUNNING'
+            out.append(dict(target=target['target'], state=state))
+        completed = all(t['state'] != 'RUNNING' for t in out)
+        return web.json_response(dict(
+            uid=request.match_info['uid'],
+            status='COMPLETED' if completed else 'STARTED',
+            targets=out,
+            nextId=-1
+        ))
+
+    # WebDAV door and pool
+
+    def _webdav_app(self, door=True):
+        name = 'webdav' if door else 'pool'
+        app = web.Application(
+            middlewares=[self._middleware(name)],
+            client_max_size=0
+        )
+        get = self._webdav_door_get if door else self._webdav_get
+        app.router.add_get('/{path:.*}', get)
+        app.router.add_put(
+            '/{path:.*}',
+            self._webdav_put,
+            expect_handler=self._expect_handler
+        )
+        app.router.add_route('COPY', '/{path:.*}', self._webdav_copy)
+        app.router.add_route('MKCOL', '/{path:.*}', self._webdav_mkcol)
+        return app
+
+    def _length_required(self, request):
+        return not self.chunked_uploads and \
+            'Content-Length' not in request.headers
+
+    async def _expect_handler(self, request):
+        if self._length_required(request):
+            raise web.HTTPLengthRequired()
+        if request.headers.get('Expect', '').lower() == '100-continue':
+            await request.writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+    async def _webdav_door_get(self, request):
+        path = self._local_path(request.match_info['path'])
+        if not path.is_file():
+            raise web.HTTPNotFound()
+        await self._stage(path)
+        if self.redirect:
+            location = f'{self.pool_url}{request.path}'
+            raise web.HTTPTemporaryRedirect(
+                f'{location}?dcache-http-uuid={uuid.uuid4()}'
+            )
+        return await self._webdav_get(request)
+
+    async def _webdav_get(self, request):
+        path = self._local_path(request.match_info['path'])
+        if not path.is_file():
+            raise web.HTTPNotFound()
+        size = path.stat().st_size
+        ranges = None
+        if 'Range' in request.headers:
+            ranges = _parse_range(request.headers['Range'], size)
+            if ranges == []:
+                raise web.HTTPRequestRangeNotSatisfiable(
+                    headers={'Content-Range': f'bytes */{size}'}
+                )
+            if ranges is not None and len(ranges) > 1 and \
+                    not self.multipart_ranges:
+                ranges = None
+            if ranges and self.coalesce_ranges:
+                ranges = [(min(r[0] for r in ranges),
+                           max(r[1] for r in ranges))]
+        headers = {'Accept-Ranges': 'bytes'}
+        if ranges is None:
+            status = 200
+            parts = [(b'', 0, size - 1)]
+        elif len(ranges) == 1:
+            status = 206
+            start, end = ranges[0]
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+            parts = [(b'', start, end)]
+        else:
+            status = 206
+            boundary = uuid.uuid4().hex
+            headers['Content-Type'] = \
+                f'multipart/byteranges; boundary={boundary}'
+            parts = [
+                (f'--{boundary}\r\n'
+                 f'Content-Type: application/octet-stream\r\n'
+                 f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+                 .encode(), start, end)
+                for start, end in ranges
+            ]
+            epilogue = f'\r\n--{boundary}--\r\n'.encode()
+        length = sum(len(head) + end - start + 1 for head, start, end in parts)
+        if len(parts) > 1:
+            length += 2 * (len(parts) - 1) + len(epilogue)
+        headers['Content-Length'] = f'{length}'
+        response = web.StreamResponse(status=status, headers=headers)
+        if len(parts) == 1:
+            response.content_type = 'application/octet-stream'
+        await response.prepare(request)
+        with path.open('rb') as f:
+            for n, (head, start, end) in enumerate(parts):
+                if n > 0:
+                    await response.write(b'\r\n')
+                await response.write(head)
+                sent = await self._send(
+                    request, response, f, start, end - start + 1
+                )
+                if not sent:
+                    return response
+        if len(parts) > 1:
+            await response.write(epilogue)
+        await response.write_eof()
+        return response
+
+    async def _send(self, request, response, f, start, length):
+        """
+        Send part of a local file as (throttled) response content. Return
+        False if the connection is dropped (see `add_fault`).
+        """
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(_STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            await self._throttle(len(chunk))
+            if id(request) in self._truncate:
+                # emulate a connection dropped while sending the content
+                chunk = chunk[:self._truncate[id(request)]]
+                self._truncate[id(request)] -= len(chunk)
+                await response.write(chunk)
+                if self._truncate[id(request)] <= 0:
+                    request.transport.close()
+                    return False
+            else:
+                await response.write(chunk)
+        return True
+
+    async def _webdav_put(self, request):
+        if self._length_required(request):
+            raise web.HTTPLengthRequired()
+        path = self._local_path(request.match_info['path'])
+        if path.is_dir():
+            raise web.HTTPConflict()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}')
+        try:
+            with tmp_path.open('wb') as f:
+                async for chunk in request.content.iter_chunked(
+                        _STREAM_CHUNK_SIZE):
+                    await self._throttle(len(chunk))
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return web.Response(status=201)
+
+    async def _webdav_copy(self, request):
+        if 'Source' in request.headers:
+            return await self._tpc_pull(request)
+        path = self._local_path(request.match_info['path'])
+        if not path.exists():
+            raise web.HTTPNotFound()
+        if 'Destination' not in request.headers:
+            raise web.HTTPBadRequest()
+        destination = urlparse(request.headers['Destination'])
+        if destination.netloc != request.host:
+            return await self._tpc_push(request, path)
+        destination = self._local_path(destination.path)
+        if not destination.parent.is_dir():
+            raise web.HTTPConflict()
+        exists = destination.exists()
+        if exists and request.headers.get('Overwrite', 'T') == 'F':
+            raise web.HTTPPreconditionFailed()
+        if path.is_dir():
+            if exists:
+                shutil.rmtree(destination)
+            shutil.copytree(path, destination)
+        else:
+            shutil.copyfile(path, destination)
+        return web.Response(status=204 if exists else 201)
+
+    async def _tpc_pull(self, request):
+        path = self._local_path(request.match_info['path'])
+        if path.is_dir() or not path.parent.is_dir():
+            raise web.HTTPConflict()
+        if path.exists() and request.headers.get('Overwrite', 'T') == 'F':
+            raise web.HTTPPreconditionFailed()
+        headers = _transfer_headers(request)
+        self.transfer_headers.append(headers)
+        response = web.StreamResponse(status=202)
+        response.content_type = 'text/plain'
+        await response.prepare(request)
+        tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}')
+        received = 0
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                        request.headers['Source'], headers=headers) as r:
+                    r.raise_for_status()
+                    with tmp_path.open('wb') as f:
+                        async for chunk in r.content.iter_chunked(
+                                _STREAM_CHUNK_SIZE):
+                            f.write(chunk)
+                            received += len(chunk)
+                            await response.write(_perf_marker(received))
+            os.replace(tmp_path, path)
+            await response.write(b'success: Created\n')
+        except aiohttp.ClientError as e:
+            await response.write(f'failure: {e!r}\n'.encode())
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        await response.write_eof()
+        return response
+
+    async def _tpc_push(self, request, path):
+        if not path.is_file():
+            raise web.HTTPConflict()
+        headers = _transfer_headers(request)
+        self.transfer_headers.append(dict(headers))
+        headers['Content-Length'] = f'{path.stat().st_size}'
+        response = web.StreamResponse(status=202)
+        response.content_type = 'text/plain'
+        await response.prepare(request)
+
+        async def content(f):
+            sent = 0
+            for chunk in iter(lambda: f.read(_STREAM_CHUNK_SIZE), b''):
+                yield chunk
+                sent += len(chunk)
+                await response.write(_perf_marker(sent))
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                with path.open('rb') as f:
+                    async with session.put(
+                            request.headers['Destination'],
+                            data=content(f),
+                            headers=headers) as r:
+                        r.raise_for_status()
+            await response.write(b'success: Created\n')
+        except aiohttp.ClientError as e:
+            await response.write(f'failure: {e!r}\n'.encode())
+        await response.write_eof()
+        return response
+
+    async def _webdav_mkcol(self, request):
+        path = self._local_path(request.match_info['path'])
+        if path.exists():
+            raise web.HTTPMethodNotAllowed('MKCOL', ['GET', 'PUT', 'COPY'])
+        if not path.parent.is_dir():
+            raise web.HTTPConflict()
+        path.mkdir()
+        return web.Response(status=201)
+
+    async def _throttle(self, nbytes):
+        if self.bandwidth:
+            await asyncio.sleep(nbytes / self.bandwidth)
+
+
+def populate(root, tree):
+    """
+    Create a directory tree on local disk.
+
+    :param root: (str) local directory where to create the tree
+    :param tree: (dict) nested dictionary describing the tree: keys are names,
+        values are either bytes/str (file content) or dictionaries
+        (subdirectories)
+    """
+    root = pathlib.Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    for name, content in tree.items():
+        path = root / name
+        if isinstance(content, dict):
+            populate(path, content)
+        elif isinstance(content, str):
+            path.write_text(content)
+        else:
+            path.write_bytes(content)
@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from fsspec.callbacks import DEFAULT_CALLBACK, Callback
+
+
+class TransferScheduler:
+    """
+    Run file transfers concurrently, keeping a steady number of them in
+    flight.
+
+    A transfer is started as soon as another one completes, instead of
+    waiting for a whole batch. Up to half of the slots run the largest
+    transfers pending, the other ones run the smallest transfers, so that
+    large files do not hold back the small ones and the link is kept busy.
+    The aggregate size of the transfers in flight can be capped as well: a
+    transfer larger than the cap only runs alone.
+
+    Transfers can be submitted while the scheduler is running, until it is
+    closed. Progress is reported to a fsspec callback, whose value counts the
+    transfers completed; its hooks also receive the bytes transferred
+    (`bytes_done`, `bytes_total`), the average throughput (`throughput`, in
+    bytes per second) and the estimated time left (`eta`, in seconds, None if
+    not known yet).
+
+    :param max_files: (int) maximum number of transfers in flight
+    :param max_bytes: (int, optional) maximum aggregate size of the
+        transfers in flight
+    :param callback: (fsspec.callbacks.Callback, optional) callback to track
+        the progress of the transfers
+    :param return_exceptions: (bool, optional) if True, errors are returned as
+        results; otherwise, the first error cancels the transfers in flight
+        and is raised
+    """
+
+    def __init__(self, max_files, max_bytes=None, callback=DEFAULT_CALLBACK,
+                 return_exceptions=False):
+        self.max_files = max(1, max_files)
+        self.max_bytes = max_bytes
+        self.callback = callback
+        self.return_exceptions = return_exceptions
+        self.results = {}
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self._counter = itertools.count()
+        self._pending = {}
+        self._smallest = []
+        self._largest = []
+        self._running = {}
+        self._nlarge = 0
+        self._bytes_in_flight = 0
+        self._submitted = 0
+        self._closed = False
+        self._error = None
+        self._event = asyncio.Event()
+        self._start = None
+
+    def submit(self, key, size, func, path1, path2, **kwargs):
+        """
+        Add a transfer to be run.
+
+        :param key: key of the result of the transfer in `results`
+        :param size: (int) size of the file transferred, in bytes
+        :param func: (coroutine function) transfer function, called with the
+            source and target paths, a child callback (`callback`) and the
+            keyword arguments
+        :param path1: (str) source path
+        :param path2: (str) target path
+        :param kwargs: (dict, optional) arguments passed on to `func`
+        """
+        if self._closed:
+            raise RuntimeError("Transfer scheduler is closed")
+        seq = next(self._counter)
+        size = size or 0
+        self._pending[seq] = (key, size, func, path1, path2, kwargs)
+        heapq.heappush(self._smallest, (size, seq))
+        heapq.heappush(self._largest, (-size, seq))
+        self.bytes_total += size
+        self._submitted += 1
+        self.callback.set_size(self._submitted)
+        self._event.set()
+
+    def close(self):
+        """ Signal that no more transfers are going to be submitted. """
+        self._closed = True
+        self._event.set()
+
+    def progress(self):
+        """
+        :return: (dict) bytes transferred and to be transferred, average
+            throughput and estimated time left
+        """
+        elapsed = time.perf_counter() - self._start if self._start else 0.
+        throughput = self.bytes_done / elapsed if elapsed else 0.
+        remaining = max(self.bytes_total - self.bytes_done, 0)
+        eta = remaining / throughput if throughput else None
+        return dict(
+            bytes_done=self.bytes_done,
+            bytes_total=self.bytes_total,
+            throughput=throughput,
+            eta=eta
+        )
+
+    async def run(self):
+        """
+        Run the transfers, until the scheduler is closed and all transfers
+        have completed.
+
+        :return: (dict) results of the transfers, by key
+        """
+        self._start = time.perf_counter()
+        try:
+            while True:
+                self._event.clear()
+                if self._error is not None:
+                    raise self._error
+                self._start_transfers()
+                if self._closed and not self._pending and not self._running:
+                    return self.results
+                await self._event.wait()
+        finally:
+            for task in list(self._running):
+                task.cancel()
+
+    def _start_transfers(self):
+        while self._pending and len(self._running) < self.max_files:
+            # the largest transfers take up to half of the slots
+            large = self._nlarge < max(1, self.max_files // 2)
+            heap = self._largest if large else self._smallest
+            seq = self._peek(heap)
+            size = self._pending[seq][1]
+            if self.max_bytes is not None and self._running and \
+                    self._bytes_in_flight + size > self.max_bytes:
+                if not large:
+                    return
+                # try with the smallest transfer instead
+                large, heap = False, self._smallest
+                seq = self._peek(heap)
+                size = self._pending[seq][1]
+                if self._bytes_in_flight + size > self.max_bytes:
+                    return
+            heapq.heappop(heap)
+            key, size, func, path1, path2, kwargs = self._pending.pop(seq)
+            task = asyncio.ensure_future(
+                self._transfer(size, func, path1, path2, kwargs)
+            )
+            self._running[task] = (key, size, large)
+            self._nlarge += large
+            self._bytes_in_flight += size
+            task.add_done_callback(self._done)
+
+    def _peek(self, heap):
+        # entries of transfers started from the other heap are dropped lazily
+        while heap[0][1] not in self._pending:
+            heapq.heappop(heap)
+        return heap[0][1]
+
+    async def _transfer(self, size, func, path1, path2, kwargs):
+        child = self.callback.branched(path1, path2)
+        with _TransferCallback(self, child) as progress:
+            result = await func(path1, path2, callback=progress, **kwargs)
+        # not all transfers report their progress (e.g. copies)
+        self._update(max(size - progress.reported, 0))
+        return result
+
+    def _done(self, task):
+        key, size, large = self._running.pop(task)
+        self._nlarge -= large
+        self._bytes_in_flight -= size
+        self._event.set()
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            if not self.return_exceptions:
+                self._error = self._error or error
+                return
+            self.results[key] = error
+        else:
+            self.results[key] = task.result()
+        self.callback.value += 1
+        self.callback.call(**self.progress())
+
+    def _update(self, nbytes):
+        if nbytes:
+            self.bytes_done += nbytes
+            self.callback.call(**self.progress())
+
+
+class _TransferCallback(Callback):
+    """
+    Callback of a single transfer, forwarding the progress to the scheduler
+    and to the child callback of the scheduler callback.
+    """
+
+    def __init__(self, scheduler, child):
+        super().__init__()
+        self.scheduler = scheduler
+        self.child = child
+        self.reported = 0
+
+    def call(self, *args, **kwargs):
+        if self.child.size != self.size:
+            self.child.set_size(self.size)
+        if self.child.value != self.value:
+            self.child.absolute_update(self.value)
+        self.scheduler._update(self.value - self.reported)
+        self.reported = self.value
+
+    def close(self):
+        self.child.close()
@@ -0,0 +1,152 @@
+import asyncio
+import concurrent.futures
+import os
+
+from fsspec.asyn import get_loop
+
+from dcachefs.caching import DiskBlockCache, PrefetchCache
+
+
+_data = bytes(range(100))
+
+
+def _get_cache(**kwargs):
+    async def fetcher(start, end):
+        if 50 <= start < 80:
+            # these blocks are never served
+            await asyncio.Event().wait()
+        return _data[start:end]
+
+    cache = PrefetchCache(10, fetcher, len(_data), get_loop(), **kwargs)
+    return cache
+
+
+def test_blocks_are_not_prefetched_on_first_read():
+    cache = _get_cache()
+    assert cache._fetch(5, 15) == _data[5:15]
+    assert sorted(cache.blocks) == [0, 1]
+    assert cache.miss_count == 2
+
+
+def test_blocks_are_prefetched_on_sequential_reads():
+    cache = _get_cache(prefetch_blocks=2)
+    assert cache._fetch(0, 5) == _data[0:5]
+    assert cache._fetch(5, 10) == _data[5:10]
+    assert sorted(cache.blocks) == [0, 1, 2]
+    assert cache._fetch(10, 20) == _data[10:20]
+    assert sorted(cache.blocks) == [1, 2, 3]
+    assert cache.hit_count == 2
+
+
+def test_prefetched_blocks_are_limited_by_max_bytes():
+    cache = _get_cache(prefetch_blocks=4, max_bytes=20)
+    assert cache.prefetch_blocks == 2
+
+
+def test_prefetching_stops_at_end_of_file():
+    cache = _get_cache(prefetch_blocks=4)
+    cache._fetch(80, 90)
+    assert cache._fetch(90, 100) == _data[90:100]
+    assert sorted(cache.blocks) == [9]
+    assert cache._fetch(100, 110) == b''
+
+
+def test_distant_seek_cancels_prefetching():
+    cache = _get_cache(prefetch_blocks=3)
+    cache._fetch(30, 40)
+    cache._fetch(40, 50)
+    pending = [cache.blocks[i] for i in (5, 6, 7)]
+    assert cache._fetch(0, 10) == _data[0:10]
+    assert sorted(cache.blocks) == [0]
+    assert all(future.cancelled() for future in pending)
+
+
+def test_close_cancels_prefetching():
+    cache = _get_cache(prefetch_blocks=2)
+    cache._fetch(30, 40)
+    cache._fetch(40, 50)
+    pending = [cache.blocks[i] for i in (5, 6)]
+    cache.close()
+    assert not cache.blocks
+    assert all(future.cancelled() for future in pending)
+
+
+def test_disk_cache_stores_blocks(tmp_path):
+    cache = DiskBlockCache(tmp_path, blocksize=30)
+    key = cache.key('https://webdav/file', len(_data), 'today')
+    with cache.open(key, len(_data)) as f:
+        assert f.get(0) is None
+        f.put(0, _data[0:30])
+        f.put(3, _data[90:100])
+    # cache files are shared by cache instances
+    with DiskBlockCache(tmp_path, blocksize=30).open(key, len(_data)) as f:
+        assert f.get(0) == _data[0:30]
+        assert f.get(1) is None
+        assert f.get(3) == _data[90:100]
+
+
+def test_disk_cache_skips_blocks_of_unexpected_size(tmp_path):
+    cache = DiskBlockCache(tmp_path, blocksize=30)
+    with cache.open('key', len(_data)) as f:
+        assert not f.put(0, _data[0:20])
+        assert not f.put(4, b'')
+        assert f.put(1, _data[30:60])
+        assert f.get(0) is None
+        assert f.get(1) == _data[30:60]
+
+
+def test_disk_cache_keys_depend_on_file_version(tmp_path):
+    cache = DiskBlockCache(tmp_path)
+    key = cache.key('https://webdav/file', 100, 'today')
+    assert key == cache.key('https://webdav/file', 100, 'today')
+    assert key != cache.key('https://webdav/file', 101, 'today')
+    assert key != cache.key('https://webdav/file', 100, 'tomorrow')
+
+
+def test_disk_cache_evicts_least_recently_used_files(tmp_path):
+    blocksize = 2**16
+    cache = DiskBlockCache(tmp_path, max_size=int(3.9 * blocksize),
+                           blocksize=blocksize)
+    for n, name in enumerate(('a', 'b', 'c')):
+        with cache.open(name, blocksize) as f:
+            f.put(0, bytes(blocksize))
+        os.utime(tmp_path / f'{name}.blocks', (n, n))
+    with cache.open('a', blocksize):
+        pass  # mark as recently used
+    with cache.open('d', blocksize) as f:
+        f.put(0, bytes(blocksize))
+    names = sorted(path.name for path in tmp_path.glob('*.blocks'))
+    assert names == ['a.blocks', 'c.blocks', 'd.blocks']
+
+
+def test_disk_cache_is_scanned_only_when_it_might_be_full(tmp_path):
+    cache = DiskBlockCache(tmp_path, max_size=2**20, blocksize=2**16)
+    scans = []
+    usage = cache.usage
+    cache.usage = lambda: scans.append(None) or usage()
+    for name in range(8):
+        with cache.open(f'{name}', 2**16) as f:
+            f.put(0, bytes(2**16))
+    # the first scan measures the disk space used
+    assert len(scans) == 1
+    with cache.open('key', 2**16) as f:
+        f.get(0)
+    assert len(scans) == 1
+    for name in range(8, 24):
+        with cache.open(f'{name}', 2**16) as f:
+            f.put(0, bytes(2**16))
+    assert 1 < len(scans) <= 4
+    assert sum(file[2] for file in usage()) <= 2**20
+
+
+def _put_block(directory, index):
+    cache = DiskBlockCache(directory, blocksize=10)
+    with cache.open('key', len(_data)) as f:
+        f.put(index, _data[index * 10:(index + 1) * 10])
+
+
+def test_disk_cache_is_shared_by_processes(tmp_path):
+    with concurrent.futures.ProcessPoolExecutor(4) as executor:
+        list(executor.map(_put_block, [tmp_path] * 10, range(10)))
+    with DiskBlockCache(tmp_path, blocksize=10).open('key', len(_data)) as f:
+        assert b''.join(f.get(i) for i in range(10)) == _data
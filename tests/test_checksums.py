@@ -0,0 +1,53 @@
+import hashlib
+import io
+import os
+import zlib
+
+from dcachefs.checksums import Adler32, HashingReader, adler32_combine
+from dcachefs.checksums import parse_checksums, select_checksum
+
+
+def test_adler32_checksums_are_combined():
+    data = os.urandom(100000)
+    for split in (0, 1, 65521, 70000, 100000):
+        a, b = data[:split], data[split:]
+        combined = adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b))
+        assert combined == zlib.adler32(data)
+    checksum, other = Adler32(data[:10]), Adler32(data[10:])
+    checksum.combine(other, len(data) - 10)
+    assert checksum.hexdigest() == f'{zlib.adler32(data):08x}'
+
+
+def test_checksums_are_parsed():
+    checksums = parse_checksums([
+        dict(type='ADLER32', value='0A1B2C3D'),
+        dict(type='MD5_TYPE', value='d41d8cd98f00b204e9800998ecf8427e')
+    ])
+    assert checksums == dict(adler32='0a1b2c3d',
+                             md5='d41d8cd98f00b204e9800998ecf8427e')
+    assert parse_checksums(None) == {}
+
+
+def test_checksums_are_selected():
+    checksums = dict(md5='d41d8cd98f00b204e9800998ecf8427e', adler32='1')
+    assert select_checksum(checksums) == ('adler32', '1')
+    assert select_checksum(checksums, 'md5')[0] == 'md5'
+    assert select_checksum({}) is None
+    assert select_checksum(checksums, 'sha1') is None
+
+
+def test_hashing_reader_restarts_when_rewound():
+    data = os.urandom(1000)
+    reader = HashingReader(io.BytesIO(data), 'md5')
+    reader.read(100)
+    reader.seek(0)
+    while reader.read(300):
+        pass
+    assert reader.hasher.hexdigest() == hashlib.md5(data).hexdigest()
+
+
+def test_hashing_reader_stops_if_data_is_skipped():
+    reader = HashingReader(io.BytesIO(bytes(1000)), 'adler32')
+    reader.read(100)
+    reader.seek(200)
+    assert reader.hasher is None
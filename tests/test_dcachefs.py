@@ -1,42 +1,76 @@
+import aiohttp
+import asyncio
 import datetime
+import hashlib
 import io
+import json
 import os
 import pathlib
 import pytest
 import tempfile
+import time
+import zlib
 
+from fsspec.asyn import sync
+from fsspec.callbacks import Callback
+from fsspec.exceptions import FSTimeoutError
 from webdav3.client import Client
 
+from dcachefs.caching import DiskBlockCache, PrefetchCache
+from dcachefs.checksums import ChecksumError
 from dcachefs.dcachefs import dCacheFileSystem, dCacheFile, dCacheStreamFile
+from dcachefs.dcachefs import dCacheRemoveError, dCacheSyncError
+from dcachefs.dcachefs import dCacheTPCError
+from dcachefs.retry import CircuitOpenError, RetryPolicy
+from dcachefs.testing import dCacheTestServer, populate
 
 
 _file_content = 'Hello world!'
 
 
+def _make_test_dir(path):
+    root = path/'test'
+    root.mkdir()
+    for subdir in {'testdir_1', 'testdir_2', 'empty_testdir'}:
+        path = root / subdir
+        path.mkdir()
+        if 'empty' in subdir:
+            continue
+        for file in {'file_1.txt', 'file_2.txt'}:
+            file = path/file
+            file.write_text(_file_content)
+    return root
+
+
 def _setup_test_dir(webdav_url, token):
     with tempfile.TemporaryDirectory() as tmpdirname:
-        path = pathlib.Path(tmpdirname)
-        root = path/'test'
-        root.mkdir()
-        for subdir in {'testdir_1', 'testdir_2', 'empty_testdir'}:
-            path = root / subdir
-            path.mkdir()
-            if 'empty' in subdir:
-                continue
-            for file in {'file_1.txt', 'file_2.txt'}:
-                file = path/file
-                file.write_text(_file_content)
+        root = _make_test_dir(pathlib.Path(tmpdirname))
         client = Client(dict(webdav_hostname=webdav_url, webdav_token=token))
         client.upload(f'/{root.name}', root.as_posix())
 
 
 @pytest.fixture(scope='session')
-def test_fs():
-    api_url = os.environ['DCACHE_API_URL']
-    webdav_url = os.environ['DCACHE_WEBDAV_URL']
-    token = os.environ['DCACHE_TOKEN']
-    print(token)
-    _setup_test_dir(webdav_url, token)
+def dcache_server():
+    # run against the local stand-in server if no dCache instance is provided
+    if 'DCACHE_API_URL' in os.environ:
+        yield None
+        return
+    with dCacheTestServer() as server:
+        _make_test_dir(server.root)
+        yield server
+
+
+@pytest.fixture(scope='session')
+def test_fs(dcache_server):
+    if dcache_server is None:
+        api_url = os.environ['DCACHE_API_URL']
+        webdav_url = os.environ['DCACHE_WEBDAV_URL']
+        token = os.environ['DCACHE_TOKEN']
+        _setup_test_dir(webdav_url, token)
+    else:
+        api_url = dcache_server.api_url
+        webdav_url = dcache_server.webdav_url
+        token = 'test_token'
     return dCacheFileSystem(api_url=api_url,
                             token=token,
                             webdav_url=webdav_url)
@@ -70,6 +104,50 @@ def test_initialize_fs_without_webdav_url():
         fs.get('/test/test.txt', 'test.txt')
 
 
+def test_connection_pools(test_fs):
+    test_fs.ls('/test')
+    test_fs.cat('/test/testdir_1/file_1.txt')
+    stats = test_fs.pool_stats()
+    assert set(stats) == {'api', 'webdav'}
+    assert stats['api']['limit'] == 100
+    assert all(s['active'] == 0 and s['waiting'] == 0 for s in stats.values())
+    assert all(s['idle'] > 0 for s in stats.values())
+
+
+def test_connection_pool_options():
+    fs = dCacheFileSystem(api_url='https://dcache.org:3880/api/v1',
+                          webdav_url='https://webdav.dcache.org:2880',
+                          connection_limit=10,
+                          connection_limit_per_host=4,
+                          separate_api_pool=False,
+                          skip_instance_cache=True)
+    stats = fs.pool_stats()
+    assert list(stats) == ['webdav']
+    assert stats['webdav']['limit'] == 10
+    assert stats['webdav']['limit_per_host'] == 4
+
+
+def test_connection_pool_usage_is_reported():
+    with dCacheTestServer(latency=0.2) as server:
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              connection_limit=1,
+                              skip_instance_cache=True)
+
+        async def info():
+            paths = ['/', '/file_1', '/file_2']
+            await asyncio.gather(*(fs._info(p) for p in paths),
+                                 return_exceptions=True)
+
+        future = asyncio.run_coroutine_threadsafe(info(), fs.loop)
+        time.sleep(0.1)
+        stats = fs.pool_stats()
+        assert stats['api']['active'] == 1
+        assert stats['api']['waiting'] == 2
+        assert stats['webdav']['active'] == 0
+        future.result()
+
+
 def test_ls_dir(test_fs):
     out = test_fs.ls('/test/testdir_1')
     assert len(out) == 2
@@ -93,6 +171,160 @@ def test_ls_nonexistent_file(test_fs):
         test_fs.ls(path)
 
 
+@pytest.fixture(scope='session')
+def test_fs_paged(test_fs):
+    # list one entry at a time
+    return dCacheFileSystem(api_url=test_fs.api_url,
+                            webdav_url=test_fs.webdav_url,
+                            client_kwargs=test_fs.client_kwargs,
+                            page_size=1,
+                            skip_instance_cache=True)
+
+
+def test_ls_dir_in_pages(test_fs_paged):
+    out = test_fs_paged.ls('/test/testdir_1', detail=False)
+    assert sorted(out) == ['/test/testdir_1/file_1.txt',
+                           '/test/testdir_1/file_2.txt']
+
+
+def test_ls_dir_with_limit(test_fs_paged):
+    out = test_fs_paged.ls('/test', limit=2)
+    assert len(out) == 2
+
+
+def test_ls_limit_is_not_multiple_of_page_size():
+    with dCacheTestServer() as server:
+        populate(server.root, {'d': {f'f{i:02}': '' for i in range(30)}})
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              page_size=10,
+                              use_listings_cache=True,
+                              skip_instance_cache=True)
+        assert len(fs.ls('/d', limit=25)) == 25
+        assert len(list(fs.ls_iter('/d', limit=25))) == 25
+        assert fs.info_requests['sent'] == 6
+        # the sync iterator uses the listings cache, as ls does
+        assert len(fs.ls('/d')) == 30
+        sent = fs.info_requests['sent']
+        assert len(list(fs.ls_iter('/d', limit=25))) == 25
+        assert fs.info_requests['sent'] == sent
+
+
+def test_ls_iter_dir(test_fs_paged):
+    out = test_fs_paged.ls_iter('/test/testdir_1')
+    assert not isinstance(out, list)
+    assert len(list(out)) == 2
+
+
+def test_ls_iter_file(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+    out = list(test_fs.ls_iter(path, detail=False))
+    assert out == [path]
+
+
+def test_find_dir(test_fs_paged):
+    out = test_fs_paged.find('/test/testdir_1')
+    assert out == ['/test/testdir_1/file_1.txt',
+                   '/test/testdir_1/file_2.txt']
+
+
+def test_find_with_dirs_and_maxdepth(test_fs):
+    out = test_fs.find('/test', maxdepth=1, withdirs=True)
+    assert '/test' in out
+    assert '/test/empty_testdir' in out
+    assert '/test/testdir_1/file_1.txt' not in out
+
+
+def test_find_file(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+    assert test_fs.find(path) == [path]
+
+
+def test_find_nonexistent_path(test_fs):
+    assert test_fs.find('/test/nonexistent_dir') == []
+
+
+def test_walk_dir(test_fs_paged):
+    out = list(test_fs_paged.walk('/test/testdir_1'))
+    assert out == [('/test/testdir_1', [], ['file_1.txt', 'file_2.txt'])]
+
+
+def test_walk_tree_with_pruning(test_fs):
+    out = []
+    for root, dirs, files in test_fs.walk('/test'):
+        out.append(root)
+        if root == '/test':
+            dirs[:] = ['testdir_1']
+    assert out == ['/test', '/test/testdir_1']
+
+
+def test_walk_tree_bottom_up(test_fs):
+    out = [root for root, _, _ in test_fs.walk('/test', topdown=False)]
+    assert out[-1] == '/test'
+    assert {'/test/testdir_1', '/test/empty_testdir'} < set(out)
+
+
+def test_find_with_batch_size(test_fs):
+    out = test_fs.find('/test', batch_size=1)
+    assert '/test/testdir_1/file_1.txt' in out
+
+
+def test_du_dir(test_fs):
+    out = test_fs.du('/test/testdir_1', total=False)
+    assert out == {'/test/testdir_1/file_1.txt': len(_file_content),
+                   '/test/testdir_1/file_2.txt': len(_file_content)}
+
+
+@pytest.fixture(scope='session')
+def test_fs_cached(test_fs):
+    return dCacheFileSystem(api_url=test_fs.api_url,
+                            webdav_url=test_fs.webdav_url,
+                            client_kwargs=test_fs.client_kwargs,
+                            use_listings_cache=True,
+                            skip_instance_cache=True)
+
+
+def test_ls_fills_listings_cache(test_fs_cached):
+    out = test_fs_cached.ls('/test/testdir_1')
+    assert test_fs_cached.dircache['/test/testdir_1'] == out
+
+
+def test_info_from_listings_cache(test_fs_cached):
+    test_fs_cached.ls('/test/testdir_1')
+    path = '/test/testdir_1/file_1.txt'
+    cached = test_fs_cached.dircache.get_entry('/test/testdir_1', path)
+    assert test_fs_cached.info(path) is cached
+
+
+def test_info_nonexistent_file_from_listings_cache(test_fs_cached):
+    test_fs_cached.ls('/test/testdir_1')
+    with pytest.raises(FileNotFoundError):
+        test_fs_cached.info('/test/testdir_1/nonexistent_file.txt')
+
+
+def test_listings_cache_is_invalidated_on_write(test_fs_cached):
+    test_fs_cached.ls('/test/testdir_2')
+    remote_path = '/test/testdir_2/file_cached.txt'
+    test_fs_cached.pipe(remote_path, b'cached')
+    assert test_fs_cached.exists(remote_path)
+    test_fs_cached.ls('/test/testdir_2')
+    with test_fs_cached.open('/test/testdir_2/new/file.txt', 'wb') as f:
+        f.write(b'cached')
+    assert test_fs_cached.isdir('/test/testdir_2/new')
+
+
+def test_listings_cache_is_invalidated_on_mv_and_rm(test_fs_cached):
+    old = '/test/testdir_2/file_to_move.txt'
+    new = '/test/testdir_2/file_moved.txt'
+    test_fs_cached.pipe(old, b'cached')
+    test_fs_cached.ls('/test/testdir_2')
+    test_fs_cached.mv(old, new)
+    assert not test_fs_cached.exists(old)
+    assert test_fs_cached.exists(new)
+    test_fs_cached.rm(new)
+    assert not test_fs_cached.exists(new)
+
+
 def test_info_dir(test_fs):
     out = test_fs.info('/test/testdir_1')
     assert out['type'] == 'directory'
@@ -120,6 +352,89 @@ def test_info_nonexistent_file(test_fs):
         test_fs.info(path)
 
 
+def test_concurrent_info_requests_are_coalesced(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+
+    async def info():
+        return await asyncio.gather(*(test_fs._info(path) for _ in range(10)))
+
+    sent = test_fs.info_requests['sent']
+    coalesced = test_fs.info_requests['coalesced']
+    out = sync(test_fs.loop, info)
+    assert all(details == out[0] for details in out)
+    assert test_fs.info_requests['sent'] == sent + 1
+    assert test_fs.info_requests['coalesced'] == coalesced + 9
+    # requests are only shared while in flight
+    test_fs.info(path)
+    assert test_fs.info_requests['sent'] == sent + 2
+
+
+def test_concurrent_info_requests_share_errors(test_fs):
+    path = '/test/testdir_2/nonexistent_file.txt'
+
+    async def info():
+        return await asyncio.gather(
+            *(test_fs._info(path) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    out = sync(test_fs.loop, info)
+    assert all(isinstance(error, FileNotFoundError) for error in out)
+
+
+def test_info_many(test_fs):
+    paths = ['/test/testdir_1/file_1.txt',
+             '/test/testdir_1/file_2.txt',
+             '/test/testdir_1/nonexistent_file.txt',
+             '/test/nonexistent_dir/file.txt',
+             '/test/testdir_1']
+    for min_siblings in (1, 100):
+        out = test_fs.info_many(paths, min_siblings=min_siblings)
+        assert list(out) == paths
+        assert out[paths[0]] == test_fs.info(paths[0])
+        assert out[paths[1]]['size'] == len(_file_content)
+        assert isinstance(out[paths[2]], FileNotFoundError)
+        assert isinstance(out[paths[3]], FileNotFoundError)
+        assert out[paths[4]]['type'] == 'directory'
+
+
+def test_info_many_uses_directory_listings(test_fs):
+    paths = ['/test/testdir_1/file_1.txt', '/test/testdir_1/file_2.txt']
+    sent = test_fs.info_requests['sent']
+    test_fs.info_many(paths, min_siblings=2)
+    assert test_fs.info_requests['sent'] == sent + 1
+
+
+def test_info_many_does_not_list_large_directories():
+    with dCacheTestServer() as server:
+        populate(server.root, {
+            'large': {f'file_{i:03}.txt': '' for i in range(200)},
+            'small': {f'file_{i}.txt': '' for i in range(10)},
+        })
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              skip_instance_cache=True)
+        paths = [f'/large/file_{i:03}.txt' for i in range(190, 198)]
+        out = fs.info_many(paths, min_siblings=8)
+        assert [info['name'] for info in out.values()] == paths
+        # the first 32 entries are listed, the paths are then requested
+        assert fs.info_requests['sent'] == 1 + 8
+        paths = [f'/small/file_{i}.txt' for i in range(8)]
+        paths.append('/small/missing.txt')
+        out = fs.info_many(paths, min_siblings=8)
+        assert isinstance(out.pop('/small/missing.txt'), FileNotFoundError)
+        assert [info['name'] for info in out.values()] == paths[:-1]
+        assert fs.info_requests['sent'] == 1 + 8 + 1
+
+
+def test_info_many_with_errors(test_fs):
+    paths = ['/test/testdir_1/file_1.txt',
+             '/test/testdir_1/nonexistent_file.txt']
+    assert list(test_fs.info_many(paths, on_error='omit')) == paths[:1]
+    with pytest.raises(FileNotFoundError):
+        test_fs.info_many(paths, on_error='raise')
+
+
 def test_rename_file(test_fs):
     old = '/test/testdir_2/file_1.txt'
     new = '/test/testdir_2/file_renamed.txt'
@@ -135,6 +450,54 @@ def test_rename_nonexistent_file(test_fs):
         test_fs.mv(old, new)
 
 
+def test_copy_file(test_fs):
+    path1 = '/test/testdir_1/file_1.txt'
+    path2 = '/test/testdir_2/file_copied.txt'
+    test_fs.copy(path1, path2)
+    assert test_fs.cat(path2) == bytes(_file_content, 'utf-8')
+    assert test_fs.exists(path1)
+
+
+def test_copy_nonexistent_file(test_fs):
+    path1 = '/test/testdir_2/nonexistent_file.txt'
+    path2 = '/test/testdir_2/file_copied.txt'
+    with pytest.raises(FileNotFoundError):
+        test_fs.copy(path1, path2)
+
+
+def test_copy_dir_recursively(test_fs):
+    test_fs.pipe({
+        '/test/copy_src/file_1.txt': b'1',
+        '/test/copy_src/subdir/file_2.txt': b'2',
+    })
+    test_fs.makedirs('/test/copy_src/empty_subdir')
+    test_fs.copy('/test/copy_src', '/test/copy_dst', recursive=True)
+    assert test_fs.find('/test/copy_dst', withdirs=True) == [
+        '/test/copy_dst',
+        '/test/copy_dst/empty_subdir',
+        '/test/copy_dst/file_1.txt',
+        '/test/copy_dst/subdir',
+        '/test/copy_dst/subdir/file_2.txt',
+    ]
+    assert test_fs.cat('/test/copy_dst/subdir/file_2.txt') == b'2'
+    # copying into an existing directory, the source directory is nested
+    test_fs.copy('/test/copy_src', '/test/copy_dst', recursive=True)
+    assert test_fs.exists('/test/copy_dst/copy_src/subdir/file_2.txt')
+    test_fs.rm(['/test/copy_src', '/test/copy_dst'], recursive=True)
+
+
+def test_mkdir(test_fs):
+    path = '/test/testdir_2/new_dir/subdir'
+    with pytest.raises(FileNotFoundError):
+        test_fs.mkdir(path, create_parents=False)
+    test_fs.mkdir(path)
+    assert test_fs.isdir(path)
+    with pytest.raises(FileExistsError):
+        test_fs.mkdir(path)
+    test_fs.makedirs(path, exist_ok=True)
+    test_fs.rm('/test/testdir_2/new_dir', recursive=True)
+
+
 def test_remove_file(test_fs):
     path = '/test/testdir_2/file_2.txt'
     test_fs.rm(path)
@@ -147,6 +510,22 @@ def test_remove_nonexistent_file(test_fs):
         test_fs.rm(path)
 
 
+def test_remove_dir_recursively(test_fs):
+    root = '/test/testdir_2/tree'
+    for path in ['a/file_1.txt', 'a/b/file_2.txt', 'file_3.txt']:
+        test_fs.pipe(f'{root}/{path}', _file_content)
+    test_fs.rm(root, recursive=True)
+    assert not test_fs.exists(root)
+
+
+def test_remove_multiple_nonexistent_files(test_fs):
+    paths = ['/test/testdir_2/nonexistent_file_1.txt',
+             '/test/testdir_2/nonexistent_file_2.txt']
+    with pytest.raises(dCacheRemoveError) as e:
+        test_fs.rm(paths)
+    assert set(e.value.errors) == set(paths)
+
+
 def test_created(test_fs):
     path = '/test/testdir_1/file_1.txt'
     out = test_fs.created(path)
@@ -171,12 +550,97 @@ def test_cat_with_range(test_fs):
     assert content == b'world'
 
 
+def test_cat_ranges(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+    starts, ends = [6, 0, 2, 0], [11, 5, 4, 12]
+    for max_gap in (0, 10):
+        out = test_fs.cat_ranges([path] * 4, starts, ends, max_gap=max_gap)
+        assert out == [b'world', b'Hello', b'll', b'Hello world!']
+
+
+def test_cat_ranges_relative_to_file_size(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+    missing = '/test/testdir_1/nonexistent_file.txt'
+    out = test_fs.cat_ranges([path] * 5 + [missing],
+                             [-6, None, 6, -100, -1, -1],
+                             [None, 5, -1, -7, None, None])
+    assert out[:5] == [b'world!', b'Hello', b'world', b'Hello', b'!']
+    assert isinstance(out[5], FileNotFoundError)
+
+
+def test_cat_ranges_with_multipart_requests(test_fs):
+    path = '/test/testdir_1/file_1.txt'
+    out = test_fs.cat_ranges([path] * 3, [6, 0, 2], [11, 1, 4], max_gap=0,
+                             multipart=True)
+    assert out == [b'world', b'H', b'll']
+
+
+def test_cat_ranges_from_server_without_multipart_requests():
+    with dCacheTestServer(multipart_ranges=False) as server:
+        (server.root / 'file.txt').write_text(_file_content)
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              multipart_ranges=True,
+                              skip_instance_cache=True)
+        out = fs.cat_ranges(['/file.txt'] * 2, [0, 6], [5, 11], max_gap=0)
+        assert out == [b'Hello', b'world']
+        assert not fs.multipart_ranges
+
+
+def test_cat_ranges_from_server_coalescing_ranges():
+    with dCacheTestServer(coalesce_ranges=True) as server:
+        (server.root / 'file.txt').write_text(_file_content)
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              multipart_ranges=True,
+                              skip_instance_cache=True)
+        out = fs.cat_ranges(['/file.txt'] * 2, [0, 6], [5, 11], max_gap=0)
+        assert out == [b'Hello', b'world']
+        assert fs.multipart_ranges
+        assert server.requests[('webdav', 'GET')] == 1
+
+
+def test_cat_ranges_nonexistent_file(test_fs):
+    paths = ['/test/testdir_1/file_1.txt',
+             '/test/testdir_2/nonexistent_file.txt']
+    out = test_fs.cat_ranges(paths, 0, 5)
+    assert out[0] == b'Hello'
+    assert isinstance(out[1], FileNotFoundError)
+    with pytest.raises(FileNotFoundError):
+        test_fs.cat_ranges(paths, 0, 5, on_error='raise')
+
+
 def test_cat_nonexistent_file(test_fs):
     path = '/test/testdir_2/nonexistent_file.txt'
     with pytest.raises(FileNotFoundError):
         _ = test_fs.cat(path)
 
 
+def test_cat_many_files(test_fs):
+    paths = ['/test/testdir_1/file_1.txt',
+             f'{test_fs.webdav_url}/test/testdir_1/file_2.txt',
+             '/test/testdir_2/nonexistent_file.txt']
+    out = test_fs.cat(paths, on_error='return', batch_size=2)
+    assert list(out) == ['/test/testdir_1/file_1.txt',
+                         '/test/testdir_1/file_2.txt',
+                         '/test/testdir_2/nonexistent_file.txt']
+    assert out['/test/testdir_1/file_2.txt'] == bytes(_file_content, 'utf-8')
+    assert isinstance(out['/test/testdir_2/nonexistent_file.txt'],
+                      FileNotFoundError)
+    assert list(test_fs.cat(paths, on_error='omit')) == \
+        ['/test/testdir_1/file_1.txt', '/test/testdir_1/file_2.txt']
+    with pytest.raises(FileNotFoundError):
+        test_fs.cat(paths)
+
+
+def test_mapper_getitems(test_fs):
+    mapper = test_fs.get_mapper('/test/testdir_1')
+    out = mapper.getitems(['file_1.txt', 'file_2.txt', 'missing'],
+                          on_error='omit')
+    assert out == {key: bytes(_file_content, 'utf-8')
+                   for key in ('file_1.txt', 'file_2.txt')}
+
+
 def test_get(test_fs):
     remote_path = '/test/testdir_1/file_1.txt'
     with tempfile.TemporaryDirectory() as tmpdirname:
@@ -187,6 +651,16 @@ def test_get(test_fs):
             assert f.read() == _file_content
 
 
+def test_get_with_multiple_streams(test_fs):
+    remote_path = '/test/testdir_1/file_1.txt'
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        local_path = pathlib.Path(tmpdirname) / 'tmp.txt'
+        test_fs.get(remote_path, local_path.as_posix(), streams=2,
+                    part_size=5)
+        with local_path.open() as f:
+            assert f.read() == _file_content
+
+
 def test_put(test_fs):
     remote_path = '/test/testdir_2/file_uploaded.txt'
     with tempfile.TemporaryDirectory() as tmpdirname:
@@ -199,6 +673,180 @@ def test_put(test_fs):
     assert test_fs.cat(remote_path) == bytes(_file_content, 'utf-8')
 
 
+def test_get_recursively(test_fs, tmp_path):
+    test_fs.pipe({
+        '/test/get_src/small.txt': b'1',
+        '/test/get_src/subdir/large.txt': b'2' * 1000,
+    })
+    test_fs.makedirs('/test/get_src/empty_subdir')
+    calls = []
+    callback = Callback(hooks=dict(
+        progress=lambda size, value, **kwargs: calls.append(kwargs)
+    ))
+    test_fs.get('/test/get_src', tmp_path.as_posix(), recursive=True,
+                callback=callback)
+    root = tmp_path / 'get_src'
+    assert (root / 'small.txt').read_bytes() == b'1'
+    assert (root / 'subdir/large.txt').read_bytes() == b'2' * 1000
+    assert (root / 'empty_subdir').is_dir()
+    assert callback.value == 2
+    assert calls[-1]['bytes_done'] == calls[-1]['bytes_total'] == 1001
+    test_fs.rm('/test/get_src', recursive=True)
+
+
+def test_put_recursively(test_fs, tmp_path):
+    local = tmp_path / 'put_src'
+    (local / 'subdir').mkdir(parents=True)
+    (local / 'empty_subdir').mkdir()
+    (local / 'small.txt').write_bytes(b'1')
+    (local / 'subdir/large.txt').write_bytes(b'2' * 1000)
+    callback = Callback()
+    test_fs.put(local.as_posix(), '/test/', recursive=True,
+                callback=callback, bytes_limit=100)
+    assert test_fs.find('/test/put_src', withdirs=True) == [
+        '/test/put_src',
+        '/test/put_src/empty_subdir',
+        '/test/put_src/small.txt',
+        '/test/put_src/subdir',
+        '/test/put_src/subdir/large.txt',
+    ]
+    assert test_fs.cat('/test/put_src/subdir/large.txt') == b'2' * 1000
+    assert callback.value == 2
+    test_fs.rm('/test/put_src', recursive=True)
+
+
+def test_put_file_reports_progress(test_fs, tmp_path):
+    content = os.urandom(2**20)
+    lpath = tmp_path / 'large.bin'
+    lpath.write_bytes(content)
+    values = []
+
+    class Recorder(Callback):
+        def call(self, *args, **kwargs):
+            values.append(self.value)
+
+    callback = Recorder()
+    test_fs.put_file(lpath.as_posix(), '/test/large.bin', callback=callback)
+    assert callback.size == len(content)
+    assert values[-1] == len(content)
+    # progress is reported while the file is being sent
+    assert any(0 < value < len(content) for value in values)
+    assert values == sorted(values)
+    test_fs.rm('/test/large.bin')
+
+
+def _write_tree(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+
+def test_sync_put(test_fs, tmp_path):
+    local = tmp_path / 'src'
+    _write_tree(local, {'a.txt': b'a', 'sub/b.txt': b'b'})
+    (local / 'empty').mkdir()
+    report = test_fs.sync(local.as_posix(), '/test/sync_put')
+    assert sorted(f['path'] for f in report['transferred']) == \
+        ['a.txt', 'sub/b.txt']
+    assert test_fs.find('/test/sync_put', withdirs=True) == [
+        '/test/sync_put',
+        '/test/sync_put/a.txt',
+        '/test/sync_put/empty',
+        '/test/sync_put/sub',
+        '/test/sync_put/sub/b.txt',
+    ]
+    # nothing has changed, nothing is transferred
+    report = test_fs.sync(local.as_posix(), '/test/sync_put')
+    assert report['transferred'] == []
+    assert report['unchanged'] == 2
+    # only the file modified is uploaded again
+    time.sleep(0.01)
+    (local / 'sub/b.txt').write_bytes(b'bb')
+    report = test_fs.sync(local.as_posix(), '/test/sync_put')
+    assert report['transferred'] == [dict(path='sub/b.txt', size=2)]
+    assert test_fs.cat('/test/sync_put/sub/b.txt') == b'bb'
+    test_fs.rm('/test/sync_put', recursive=True)
+
+
+def test_sync_get(test_fs, tmp_path):
+    test_fs.pipe({
+        '/test/sync_get/a.txt': b'a',
+        '/test/sync_get/sub/b.txt': b'b',
+    })
+    local = tmp_path / 'dst'
+    report = test_fs.sync('/test/sync_get', local.as_posix(), direction='get')
+    assert len(report['transferred']) == 2
+    assert (local / 'sub/b.txt').read_bytes() == b'b'
+    # downloaded files get the remote modification time
+    modified = test_fs.modified('/test/sync_get/a.txt').timestamp()
+    assert (local / 'a.txt').stat().st_mtime == pytest.approx(modified)
+    report = test_fs.sync('/test/sync_get', local.as_posix(), direction='get')
+    assert report['transferred'] == []
+    test_fs.rm('/test/sync_get', recursive=True)
+
+
+def test_sync_with_checksum(test_fs, tmp_path):
+    local = tmp_path / 'src'
+    _write_tree(local, {'a.txt': b'a'})
+    test_fs.sync(local.as_posix(), '/test/sync_checksum')
+    # same size and older, but different content
+    (local / 'a.txt').write_bytes(b'b')
+    os.utime(local / 'a.txt', (0, 0))
+    report = test_fs.sync(local.as_posix(), '/test/sync_checksum')
+    assert report['transferred'] == []
+    report = test_fs.sync(local.as_posix(), '/test/sync_checksum',
+                          checksum=True)
+    assert report['transferred'] == [dict(path='a.txt', size=1)]
+    assert test_fs.cat('/test/sync_checksum/a.txt') == b'b'
+    test_fs.rm('/test/sync_checksum', recursive=True)
+
+
+def test_sync_with_delete_and_dry_run(test_fs, tmp_path):
+    local = tmp_path / 'src'
+    _write_tree(local, {'a.txt': b'a', 'new.txt': b'new'})
+    test_fs.pipe({
+        '/test/sync_delete/a.txt': b'a',
+        '/test/sync_delete/old.txt': b'old',
+        '/test/sync_delete/old/c.txt': b'c',
+    })
+    report = test_fs.sync(local.as_posix(), '/test/sync_delete',
+                          delete=True, dry_run=True)
+    assert report['transferred'] == [dict(path='new.txt', size=3)]
+    assert report['removed'] == ['old', 'old.txt']
+    assert test_fs.exists('/test/sync_delete/old.txt')
+    assert not test_fs.exists('/test/sync_delete/new.txt')
+    manifest = tmp_path / 'manifest.json'
+    test_fs.sync(local.as_posix(), '/test/sync_delete', delete=True,
+                 manifest=manifest.as_posix())
+    assert test_fs.ls('/test/sync_delete', detail=False) == [
+        '/test/sync_delete/a.txt',
+        '/test/sync_delete/new.txt',
+    ]
+    report = json.loads(manifest.read_text())
+    assert report['removed'] == ['old', 'old.txt']
+    assert report['errors'] == {}
+    test_fs.rm('/test/sync_delete', recursive=True)
+
+
+def test_sync_reports_errors(test_fs, tmp_path):
+    test_fs.pipe('/test/sync_errors/sub', b'file')
+    local = tmp_path / 'src'
+    _write_tree(local, {'a.txt': b'a', 'sub/b.txt': b'b'})
+    with pytest.raises(dCacheSyncError) as e:
+        test_fs.sync(local.as_posix(), '/test/sync_errors')
+    assert isinstance(e.value.errors['sub'], NotADirectoryError)
+    # the other files are transferred anyway
+    assert test_fs.cat('/test/sync_errors/a.txt') == b'a'
+    test_fs.rm('/test/sync_errors', recursive=True)
+
+
+def test_sync_nonexistent_source(test_fs, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        test_fs.sync('/test/nonexistent', tmp_path.as_posix(),
+                     direction='get')
+
+
 def test_pipe_with_path_and_value(test_fs):
     remote_path = '/test/testdir_2/file_uploaded.txt'
     test_fs.pipe(path=remote_path, value=_file_content)
@@ -223,6 +871,25 @@ def test_read_remote_file(test_fs):
         assert f.read(5) == b'world'
 
 
+def test_read_remote_file_with_prefetching(test_fs):
+    remote_path = '/test/testdir_1/file_1.txt'
+    with test_fs.open(remote_path, block_size=2, cache_type='prefetch',
+                      cache_options=dict(prefetch_blocks=2)) as f:
+        assert isinstance(f.cache, PrefetchCache)
+        assert f.read(2) == b'He'
+        assert set(f.cache.blocks) == {0}
+        # sequential access: the following blocks are requested too
+        assert f.read(2) == b'll'
+        assert set(f.cache.blocks) == {1, 2, 3}
+        assert f.read(4) == b'o wo'
+        assert set(f.cache.blocks) == {2, 3, 4, 5}
+        # distant seek: the prefetched blocks are discarded
+        f.seek(0)
+        assert f.read(2) == b'He'
+        assert set(f.cache.blocks) == {0}
+        assert f.read() == b'llo world!'
+
+
 def test_read_nonexistent_file(test_fs):
     remote_path = '/test/testdir_2/nonexistent_file.txt'
     with pytest.raises(FileNotFoundError):
@@ -257,6 +924,37 @@ def test_write_remote_file(test_fs):
     assert test_fs.cat(remote_path) == file_content
 
 
+def test_write_remote_file_in_blocks(test_fs):
+    remote_path = '/test/testdir_2/file_blocks.txt'
+    file_content = bytes(_file_content, 'utf-8')
+    with test_fs.open(remote_path, 'wb', block_size=5) as f:
+        for i in range(0, len(file_content), 3):
+            f.write(file_content[i:i+3])
+    assert test_fs.cat(remote_path) == file_content
+
+
+def test_write_remote_file_in_blocks_without_chunked_uploads(test_fs):
+    remote_path = '/test/testdir_2/file_blocks.txt'
+    file_content = bytes(_file_content, 'utf-8')
+    with test_fs.open(remote_path, 'wb', block_size=5,
+                      chunked_uploads=False) as f:
+        for i in range(0, len(file_content), 3):
+            f.write(file_content[i:i+3])
+    assert test_fs.cat(remote_path) == file_content
+
+
+def test_write_remote_file_to_server_without_chunked_uploads():
+    with dCacheTestServer(chunked_uploads=False) as server:
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              skip_instance_cache=True)
+        file_content = bytes(_file_content, 'utf-8')
+        with fs.open('/file.txt', 'wb', block_size=5) as f:
+            f.write(file_content)
+        assert fs.cat('/file.txt') == file_content
+        assert not fs.chunked_uploads
+
+
 def test_write_remote_file_as_stream(test_fs):
     remote_path = '/test/testdir_2/file_open.txt'
     file_content = bytes(_file_content, 'utf-8')
@@ -284,3 +982,619 @@ def test_append_mode_is_not_supported(test_fs):
     remote_path = '/test/testdir_2/file_1.txt'
     with pytest.raises(NotImplementedError):
         _ = test_fs.open(remote_path, mode='a')
+
+
+@pytest.fixture
+def faulty_server():
+    # these tests need a local server, where failures can be injected
+    with dCacheTestServer(redirect=True) as server:
+        (server.root / 'file.txt').write_bytes(os.urandom(2**20))
+        yield server
+
+
+def _get_fs(server, **kwargs):
+    policy = dict(backoff_base=0.01)
+    policy.update(kwargs)
+    return dCacheFileSystem(api_url=server.api_url,
+                            webdav_url=server.webdav_url,
+                            retry_policy=RetryPolicy(**policy),
+                            skip_instance_cache=True)
+
+
+def test_requests_are_retried(faulty_server):
+    fs = _get_fs(faulty_server)
+    faulty_server.add_fault('api', status=503, count=2,
+                            headers={'Retry-After': '0.05'})
+    assert fs.info('/file.txt')['size'] == 2**20
+    assert faulty_server.requests[('api', 'GET')] == 3
+
+
+def test_requests_are_retried_up_to_max_retries(faulty_server):
+    fs = _get_fs(faulty_server, max_retries=1)
+    faulty_server.add_fault('api', status=502, count=2)
+    with pytest.raises(aiohttp.ClientResponseError):
+        fs.info('/file.txt')
+    assert faulty_server.requests[('api', 'GET')] == 2
+
+
+def test_uploads_of_files_are_retried(faulty_server, tmp_path):
+    fs = _get_fs(faulty_server)
+    content = os.urandom(10**5)
+    lpath = tmp_path / 'file.bin'
+    lpath.write_bytes(content)
+    faulty_server.add_fault('webdav', method='PUT', status=503)
+    callback = Callback()
+    fs.put_file(lpath.as_posix(), '/uploaded.bin', callback=callback)
+    assert (faulty_server.root / 'uploaded.bin').read_bytes() == content
+    # the progress of the failed attempt is not counted twice
+    assert callback.value == len(content)
+    # content written to a temporary file is uploaded on close
+    faulty_server.add_fault('webdav', method='PUT', status=503)
+    with fs.open('/written.bin', 'wb', block_size=1024,
+                 chunked_uploads=False) as f:
+        f.write(content[:5000])
+    assert (faulty_server.root / 'written.bin').read_bytes() == \
+        content[:5000]
+    assert faulty_server.requests[('webdav', 'PUT')] == 4
+
+
+def test_non_idempotent_requests_are_not_retried(faulty_server):
+    fs = _get_fs(faulty_server)
+    faulty_server.add_fault('api', method='POST', status=503)
+    with pytest.raises(aiohttp.ClientResponseError):
+        fs.mv('/file.txt', '/file_renamed.txt')
+    assert faulty_server.requests[('api', 'POST')] == 1
+
+
+def test_interrupted_downloads_are_resumed(faulty_server, tmp_path):
+    fs = _get_fs(faulty_server)
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    faulty_server.add_fault('pool', method='GET', truncate=2**18, count=2)
+    assert fs.cat('/file.txt') == content
+    faulty_server.add_fault('pool', method='GET', truncate=2**18)
+    fs.get('/file.txt', (tmp_path / 'file.txt').as_posix())
+    assert (tmp_path / 'file.txt').read_bytes() == content
+    faulty_server.add_fault('pool', method='GET', truncate=2**18)
+    with fs.open('/file.txt', block_size=2**19) as f:
+        f.seek(2**10)
+        assert f.read(2**19) == content[2**10:2**10 + 2**19]
+
+
+def test_pool_urls_are_cached(faulty_server):
+    fs = _get_fs(faulty_server)
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    for start in range(0, 2**20, 2**18):
+        end = start + 2**18
+        assert fs.cat_file('/file.txt', start, end) == content[start:end]
+    # only the first request is redirected by the door
+    assert faulty_server.requests[('webdav', 'GET')] == 1
+    assert faulty_server.requests[('pool', 'GET')] == 4
+    # the pool URL is discarded when writing the file
+    fs.pipe_file('/file.txt', content)
+    fs.cat_file('/file.txt', 0, 10)
+    assert faulty_server.requests[('webdav', 'GET')] == 2
+
+
+def test_pool_urls_expire(faulty_server):
+    fs = _get_fs(faulty_server)
+    fs.redirect_cache_ttl = 0.05
+    fs.cat_file('/file.txt', 0, 10)
+    fs.cat_file('/file.txt', 0, 10)
+    assert faulty_server.requests[('webdav', 'GET')] == 1
+    time.sleep(0.1)
+    fs.cat_file('/file.txt', 0, 10)
+    assert faulty_server.requests[('webdav', 'GET')] == 2
+    # pool URLs are not cached across calls
+    fs = _get_fs(faulty_server)
+    fs.redirect_cache_ttl = 0
+    fs.cat_file('/file.txt', 0, 10)
+    fs.cat_file('/file.txt', 0, 10)
+    assert faulty_server.requests[('webdav', 'GET')] == 4
+
+
+def test_pool_urls_of_modified_paths_are_discarded(monkeypatch):
+    monkeypatch.setattr('dcachefs.dcachefs.REDIRECT_CACHE_SIZE', 4)
+    fs = dCacheFileSystem(api_url='http://api', webdav_url='http://door',
+                          skip_instance_cache=True)
+    for name in ('a/1', 'a/2', 'b/1', 'ab', 'c/1'):
+        fs._set_redirect(f'http://door/{name}', f'http://pool/{name}')
+    # the oldest entry is dropped
+    assert fs._get_redirect('http://door/a/1') is None
+    assert sorted(fs._redirect_paths) == ['/a/2', '/ab', '/b/1', '/c/1']
+    fs.invalidate_cache('/a')
+    assert fs._get_redirect('http://door/a/2') is None
+    assert fs._get_redirect('http://door/ab') == 'http://pool/ab'
+    assert sorted(fs._redirect_paths) == ['/ab', '/b/1', '/c/1']
+    fs._discard_redirect('http://door/b/1')
+    assert sorted(fs._redirect_paths) == ['/ab', '/c/1']
+    fs.invalidate_cache()
+    assert not fs._redirects and not fs._redirect_paths
+
+
+def test_open_file_reads_from_pool(faulty_server):
+    fs = _get_fs(faulty_server)
+    fs.redirect_cache_ttl = 0
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    with fs.open('/file.txt', block_size=2**18, cache_type='none') as f:
+        for start in range(0, 2**20, 2**18):
+            f.seek(start)
+            assert f.read(2**18) == content[start:start + 2**18]
+    assert faulty_server.requests[('webdav', 'GET')] == 1
+    assert faulty_server.requests[('pool', 'GET')] == 4
+
+
+def test_failing_pool_url_falls_back_to_door(faulty_server):
+    fs = _get_fs(faulty_server)
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    fs.cat_file('/file.txt', 0, 10)
+    # the cached pool URL is not valid anymore
+    faulty_server.add_fault('pool', method='GET', status=404)
+    assert fs.cat_file('/file.txt', 10, 20) == content[10:20]
+    assert faulty_server.requests[('webdav', 'GET')] == 2
+    faulty_server.add_fault('pool', method='GET', status=503)
+    assert fs.cat_file('/file.txt', 20, 30) == content[20:30]
+    assert faulty_server.requests[('webdav', 'GET')] == 3
+
+
+def test_requests_to_failing_host_are_suspended(faulty_server):
+    fs = _get_fs(faulty_server, max_retries=0, breaker_threshold=2,
+                 breaker_timeout=0.1)
+    faulty_server.add_fault('api', status=503, count=2)
+    for _ in range(2):
+        with pytest.raises(aiohttp.ClientResponseError):
+            fs.info('/file.txt')
+    with pytest.raises(CircuitOpenError):
+        fs.info('/file.txt')
+    assert faulty_server.requests[('api', 'GET')] == 2
+    # requests to other hosts are still sent
+    assert fs.cat_file('/file.txt', start=0, end=1)
+    time.sleep(0.1)
+    assert fs.info('/file.txt')['size'] == 2**20
+
+
+def test_reads_wait_for_suspended_host(faulty_server):
+    populate(faulty_server.root, {f'f_{i:02}': f'{i}' for i in range(20)})
+    fs = _get_fs(faulty_server, breaker_threshold=10, breaker_timeout=0.1)
+    # a burst of failures longer than the breaker threshold
+    faulty_server.add_fault('webdav', status=503, count=25)
+    out = fs.cat([f'/f_{i:02}' for i in range(20)], on_error='return')
+    assert out == {f'/f_{i:02}': f'{i}'.encode() for i in range(20)}
+
+
+def test_throttled_requests_do_not_suspend_host(faulty_server):
+    fs = _get_fs(faulty_server, max_retries=3, breaker_threshold=2)
+    faulty_server.add_fault('api', status=503, count=3,
+                            headers={'Retry-After': '0.01'})
+    assert fs.info('/file.txt')['size'] == 2**20
+    assert fs._get_breaker(fs.api_url).state == 'closed'
+
+
+def test_operations_are_recorded(faulty_server, tmp_path):
+    fs = _get_fs(faulty_server)
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    fs.ls('/')
+    assert fs.cat('/file.txt') == content
+    fs.get('/file.txt', (tmp_path / 'file.txt').as_posix())
+    fs.put((tmp_path / 'file.txt').as_posix(), '/file_copy.txt')
+    fs.mv('/file_copy.txt', '/file_renamed.txt')
+    fs.rm('/file_renamed.txt')
+    stats = fs.stats()
+    for operation in ('ls', 'cat_file', 'get_file', 'put_file', 'mv', 'rm'):
+        assert stats[operation]['calls'] == 1
+        assert stats[operation]['errors'] == {}
+        assert stats[operation]['latency']['count'] == 1
+    for operation in ('cat_file', 'get_file', 'put_file'):
+        assert stats[operation]['bytes'] == len(content)
+        assert stats[operation]['throughput'] > 0
+    # fsspec checks the paths given to get and put
+    assert stats['info']['calls'] > 0
+
+
+def test_file_block_fetches_are_recorded(faulty_server):
+    fs = _get_fs(faulty_server)
+    with fs.open('/file.txt', cache_type='none') as f:
+        f.read(2**18)
+        f.read(2**18)
+    stats = fs.stats()
+    assert stats['file_fetch']['calls'] == 2
+    assert stats['file_fetch']['bytes'] == 2**19
+    assert 'cat_file' not in stats
+
+
+def test_retries_and_errors_are_recorded(faulty_server):
+    fs = _get_fs(faulty_server, max_retries=1)
+    faulty_server.add_fault('api', status=503)
+    fs.info('/file.txt')
+    faulty_server.add_fault('api', status=503, count=2)
+    with pytest.raises(aiohttp.ClientResponseError):
+        fs.info('/file.txt')
+    with pytest.raises(FileNotFoundError):
+        fs.info('/nonexistent.txt')
+    stats = fs.stats(reset=True)
+    assert stats['info']['calls'] == 3
+    assert stats['info']['requests'] == 5
+    assert stats['info']['errors'] == {503: 1, 404: 1}
+    assert fs.stats() == {}
+
+
+def test_metrics_hooks_and_opt_out(faulty_server):
+    fs = _get_fs(faulty_server)
+    records = []
+    fs.metrics.add_hook(lambda *args: records.append(args))
+    fs.info('/file.txt')
+    assert [r[0] for r in records] == ['info']
+    fs = dCacheFileSystem(api_url=faulty_server.api_url,
+                          webdav_url=faulty_server.webdav_url,
+                          metrics=False,
+                          skip_instance_cache=True)
+    fs.info('/file.txt')
+    assert fs.stats() == {}
+
+
+def test_blocks_are_read_from_disk_cache(tmp_path):
+    with dCacheTestServer() as server:
+        content = os.urandom(2**20)
+        (server.root / 'file.txt').write_bytes(content)
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              block_cache=DiskBlockCache(tmp_path,
+                                                         blocksize=2**18),
+                              skip_instance_cache=True)
+        assert fs.cat_file('/file.txt', start=10, end=2**18 + 10) == \
+            content[10:2**18 + 10]
+        assert server.requests[('webdav', 'GET')] == 1
+        assert fs.cat_file('/file.txt') == content
+        assert server.requests[('webdav', 'GET')] == 2
+        # blocks are shared with files and with other instances
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              block_cache=DiskBlockCache(tmp_path,
+                                                         blocksize=2**18),
+                              skip_instance_cache=True)
+        with fs.open('/file.txt', block_size=2**16) as f:
+            f.seek(2**19)
+            assert f.read(2**16) == content[2**19:2**19 + 2**16]
+        assert fs.cat_file('/file.txt') == content
+        assert server.requests[('webdav', 'GET')] == 2
+
+
+def test_many_files_are_read_from_disk_cache(tmp_path):
+    with dCacheTestServer() as server:
+        populate(server.root, {'dir': {f'{i}': f'{i}' for i in range(10)}})
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              block_cache=tmp_path.as_posix(),
+                              skip_instance_cache=True)
+        paths = [f'/dir/{i}' for i in range(10)]
+        for _ in range(2):
+            out = fs.cat(paths)
+            assert out == {path: path[-1].encode() for path in paths}
+        # the details of the files are taken from the directory listing
+        assert server.requests[('api', 'GET')] == 2
+        assert server.requests[('webdav', 'GET')] == 10
+
+
+def test_disk_cache_is_not_used_for_modified_files(tmp_path):
+    with dCacheTestServer() as server:
+        path = server.root / 'file.txt'
+        path.write_bytes(b'old content')
+        os.utime(path, (1e9, 1e9))
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              block_cache=tmp_path.as_posix(),
+                              skip_instance_cache=True)
+        assert fs.cat_file('/file.txt') == b'old content'
+        path.write_bytes(b'new content')
+        os.utime(path, (2e9, 2e9))
+        assert fs.cat_file('/file.txt') == b'new content'
+        assert server.requests[('webdav', 'GET')] == 2
+
+
+@pytest.fixture
+def checksum_fs(faulty_server):
+    return dCacheFileSystem(api_url=faulty_server.api_url,
+                            webdav_url=faulty_server.webdav_url,
+                            verify_checksums=True,
+                            skip_instance_cache=True)
+
+
+def test_checksums(faulty_server, checksum_fs):
+    content = (faulty_server.root / 'file.txt').read_bytes()
+    # checksums are only requested if needed
+    assert checksum_fs.info('/file.txt')['checksums'] == {}
+    assert checksum_fs.ls('/')[0]['checksums'] == {}
+    info = checksum_fs.info('/file.txt', checksum=True)
+    assert info['checksums'] == dict(adler32=f'{zlib.adler32(content):08x}',
+                                     md5=hashlib.md5(content).hexdigest())
+    assert checksum_fs.checksum('/file.txt') == zlib.adler32(content)
+    assert checksum_fs.checksum('/file.txt', algorithm='md5') == \
+        int(hashlib.md5(content).hexdigest(), 16)
+    # fall back to a token of the details for directories
+    assert isinstance(checksum_fs.checksum('/'), int)
+    with pytest.raises(ValueError):
+        checksum_fs.checksum('/', algorithm='md5')
+
+
+@pytest.mark.parametrize('streams', [1, 4])
+def test_downloads_are_verified(faulty_server, checksum_fs, tmp_path,
+                                monkeypatch, streams):
+    lpath = (tmp_path / 'file.txt').as_posix()
+    checksum_fs.get_file('/file.txt', lpath, streams=streams,
+                         part_size=2**18)
+    monkeypatch.setattr('dcachefs.dcachefs.parse_checksums',
+                        lambda checksums: dict(adler32='00000001'))
+    checksum_fs.invalidate_cache()
+    with pytest.raises(ChecksumError):
+        checksum_fs.get_file('/file.txt', lpath, streams=streams,
+                             part_size=2**18)
+    assert not os.path.exists(lpath)
+    # verification can be disabled per call
+    checksum_fs.get_file('/file.txt', lpath, verify=False)
+
+
+def test_uploads_are_verified(faulty_server, checksum_fs, tmp_path,
+                              monkeypatch):
+    lpath = tmp_path / 'file.txt'
+    lpath.write_bytes(os.urandom(2**16))
+    # the upload is retried after a failure
+    faulty_server.add_fault('webdav', method='PUT', status=503)
+    checksum_fs.put_file(lpath.as_posix(), '/uploaded.txt')
+    with checksum_fs.open('/written.txt', 'wb') as f:
+        f.write(b'some data')
+    monkeypatch.setattr('dcachefs.dcachefs.parse_checksums',
+                        lambda checksums: dict(adler32='00000001'))
+    with pytest.raises(ChecksumError):
+        checksum_fs.put_file(lpath.as_posix(), '/uploaded.txt')
+    with pytest.raises(ChecksumError):
+        with checksum_fs.open('/written.txt', 'wb') as f:
+            f.write(b'some data')
+
+
+def test_sequential_reads_are_verified(faulty_server, checksum_fs,
+                                       monkeypatch):
+    with checksum_fs.open('/file.txt', block_size=2**18) as f:
+        while f.read(2**17):
+            pass
+    monkeypatch.setattr('dcachefs.dcachefs.parse_checksums',
+                        lambda checksums: dict(md5='0' * 32))
+    checksum_fs.invalidate_cache()
+    with checksum_fs.open('/file.txt', block_size=2**18) as f:
+        f.read(2**19)
+        with pytest.raises(ChecksumError):
+            f.read()
+    # files read non-sequentially are not verified
+    with checksum_fs.open('/file.txt', block_size=2**18) as f:
+        f.seek(10)
+        f.read()
+
+
+@pytest.fixture
+def tape_server():
+    with dCacheTestServer(stage_time=0.3) as server:
+        populate(server.root, {f'file_{i}.txt': f'{i}' for i in range(4)})
+        server.nearline.update({'/file_0.txt', '/file_1.txt'})
+        yield server
+
+
+def test_locality_is_in_details(tape_server):
+    fs = _get_fs(tape_server)
+    assert fs.info('/file_0.txt')['locality'] is None
+    assert fs.info('/file_0.txt', locality=True)['locality'] == 'NEARLINE'
+    assert fs.info('/file_2.txt', locality=True)['locality'] == 'ONLINE'
+    infos = fs.info_many([f'/file_{i}.txt' for i in range(4)],
+                         min_siblings=2, locality=True)
+    assert [info['locality'] for info in infos.values()] == \
+        ['NEARLINE', 'NEARLINE', 'ONLINE', 'ONLINE']
+
+
+def test_files_are_staged(tape_server):
+    fs = _get_fs(tape_server)
+    out = fs.stage(['/file_0.txt', '/file_1.txt', '/missing.txt'],
+                   poll_interval=0.05)
+    assert out == {'/file_0.txt': 'COMPLETED', '/file_1.txt': 'COMPLETED',
+                   '/missing.txt': 'FAILED'}
+    assert not tape_server.nearline
+    assert tape_server.requests[('api', 'POST')] == 1
+
+
+def test_bulk_request_url_from_location_header(tape_server):
+    fs = _get_fs(tape_server)
+    url = f'{tape_server.api_url}/bulk-requests/1'
+    tape_server.add_fault('api', method='POST', status=201,
+                          headers={'Location': url})
+    assert sync(fs.loop, fs._submit_stage, ['/file_0.txt']) == url
+
+
+def test_staging_times_out(tape_server):
+    fs = _get_fs(tape_server)
+    request = fs.stage('/file_0.txt', wait=False)
+    with pytest.raises(FSTimeoutError):
+        sync(fs.loop, _consume, fs._stage_progress(request, timeout=0.1,
+                                                   poll_interval=0.05))
+
+
+async def _consume(generator):
+    return [item async for item in generator]
+
+
+def test_online_files_are_downloaded_first(tape_server, tmp_path):
+    fs = _get_fs(tape_server)
+    downloaded = []
+    get_file = fs._get_file
+
+    async def record(rpath, lpath, **kwargs):
+        await get_file(rpath, lpath, **kwargs)
+        downloaded.append(rpath)
+
+    fs._get_file = record
+    fs.get([f'/file_{i}.txt' for i in range(4)], f'{tmp_path}/',
+           batch_size=1)
+    assert sorted(downloaded[:2]) == ['/file_2.txt', '/file_3.txt']
+    assert sorted(downloaded[2:]) == ['/file_0.txt', '/file_1.txt']
+    assert (tmp_path / 'file_1.txt').read_text() == '1'
+    assert tape_server.requests[('api', 'POST')] == 1
+
+
+def test_files_are_read_if_staging_fails(tape_server, tmp_path, caplog):
+    fs = _get_fs(tape_server)
+
+    async def fail(paths, **kwargs):
+        raise RuntimeError('staging is not available')
+
+    fs._submit_stage = fail
+    fs.get([f'/file_{i}.txt' for i in range(4)], f'{tmp_path}/')
+    assert (tmp_path / 'file_0.txt').read_text() == '0'
+    assert 'could not be staged' in caplog.text
+
+
+def test_names_with_special_characters():
+    with dCacheTestServer() as server:
+        populate(server.root, {'a b': {'x y.txt': 'x', 'q#1?': 'y'}})
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              skip_instance_cache=True)
+        assert fs.ls('/', detail=False) == ['/a b']
+        assert sorted(fs.ls('/a b', detail=False)) == \
+            ['/a b/q#1?', '/a b/x y.txt']
+        assert fs.info('/a b/x y.txt')['name'] == '/a b/x y.txt'
+        assert fs.cat('/a b/x y.txt') == b'x'
+
+
+@pytest.fixture
+def tpc_servers():
+    with dCacheTestServer() as source, dCacheTestServer() as destination:
+        populate(source.root, {
+            'data': {'large.bin': os.urandom(2**18), 'small.txt': 'small'},
+        })
+        yield source, destination
+
+
+def test_copy_between_instances(tpc_servers):
+    source, destination = tpc_servers
+    fs = dCacheFileSystem(api_url=source.api_url,
+                          webdav_url=source.webdav_url,
+                          token='test_token',
+                          skip_instance_cache=True)
+    fs.copy('/data/large.bin', f'{destination.webdav_url}/large.bin')
+    assert (destination.root / 'large.bin').read_bytes() == \
+        (source.root / 'data/large.bin').read_bytes()
+    # the destination door pulls the data, with the forwarded credentials
+    assert destination.requests[('webdav', 'COPY')] == 1
+    assert source.requests[('webdav', 'GET')] == 1
+    assert destination.transfer_headers == \
+        [{'Authorization': 'Bearer test_token'}]
+
+
+def test_copy_between_instances_in_push_mode(tpc_servers):
+    source, destination = tpc_servers
+    fs = _get_fs(source)
+    report = fs.tpc_file('/data/large.bin',
+                         f'{destination.webdav_url}/large.bin', mode='push',
+                         transfer_headers={'Authorization': 'Bearer other'})
+    assert report['status'] == 'success'
+    assert report['bytes'] == 2**18
+    assert report['markers'] == 4
+    assert report['marker']['Stripe Bytes Transferred'] == f'{2**18}'
+    assert (destination.root / 'large.bin').stat().st_size == 2**18
+    assert source.requests[('webdav', 'COPY')] == 1
+    assert source.transfer_headers == [{'Authorization': 'Bearer other'}]
+
+
+def test_copy_dir_between_instances(tpc_servers):
+    source, destination = tpc_servers
+    fs = _get_fs(source)
+    fs.copy('/data', f'{destination.webdav_url}/copy/', recursive=True)
+    assert sorted(os.listdir(destination.root / 'copy/data')) == \
+        ['large.bin', 'small.txt']
+    assert (destination.root / 'copy/data/small.txt').read_text() == 'small'
+
+
+def test_failed_copies_between_instances_are_reported(tpc_servers):
+    source, destination = tpc_servers
+    fs = _get_fs(source)
+    sources = ['/data/large.bin', '/data/missing.txt', '/data/small.txt']
+    destinations = [f'{destination.webdav_url}/{i}' for i in range(3)]
+    callback = Callback()
+    with pytest.raises(dCacheTPCError) as excinfo:
+        fs.tpc_copy(sources, destinations, callback=callback)
+    [report] = excinfo.value.reports
+    assert report['source'] == f'{source.webdav_url}/data/missing.txt'
+    assert report['status'] == 'failure'
+    assert '404' in report['error']
+    assert callback.value == 3
+    # the other files are copied
+    assert sorted(os.listdir(destination.root)) == ['0', '2']
+    reports = fs.tpc_copy(sources, destinations, on_error='return')
+    assert [r['error'] is None for r in reports] == [True, False, True]
+    assert reports[0]['bytes'] == 2**18
+
+
+def _run_with_async_fs(server, func, **kwargs):
+    # run a coroutine function with a file system in asynchronous mode
+    async def run():
+        fs = dCacheFileSystem(api_url=server.api_url,
+                              webdav_url=server.webdav_url,
+                              asynchronous=True,
+                              skip_instance_cache=True,
+                              **kwargs)
+        try:
+            return await func(fs)
+        finally:
+            for session in (fs._session, fs._api_session):
+                if session is not None:
+                    await session.close()
+    return asyncio.run(run())
+
+
+def test_async_file_read(faulty_server):
+    content = (faulty_server.root / 'file.txt').read_bytes()
+
+    async def read(fs):
+        async with await fs.open_async('/file.txt', block_size=2**18) as f:
+            assert await f.read(10) == content[:10]
+            assert await f.seek(-10, 2) == 2**20 - 10
+            buffer = bytearray(20)
+            assert await f.readinto(buffer) == 10
+            assert bytes(buffer[:10]) == content[-10:]
+            await f.seek(2**18 - 10)
+            assert await f.read(20) == content[2**18 - 10:2**18 + 10]
+            assert await f.read(0) == b''
+        assert f.closed
+
+    _run_with_async_fs(faulty_server, read)
+    # three blocks are downloaded, only the first one through the door
+    assert faulty_server.requests[('webdav', 'GET')] == 1
+    assert faulty_server.requests[('pool', 'GET')] == 3
+
+
+def test_async_files_are_read_concurrently(faulty_server):
+    content = (faulty_server.root / 'file.txt').read_bytes()
+
+    async def read(fs, start):
+        async with await fs.open_async('/file.txt', block_size=2**10) as f:
+            await f.seek(start)
+            return await f.read()
+
+    async def read_all(fs):
+        starts = range(0, 2**20, 2**15)
+        out = await asyncio.gather(*(read(fs, start) for start in starts))
+        assert out == [content[start:] for start in starts]
+
+    _run_with_async_fs(faulty_server, read_all, verify_checksums=True)
+
+
+def test_async_file_write(faulty_server):
+    content = os.urandom(2**20)
+
+    async def write(fs):
+        async with await fs.open_async('/new.txt', 'wb',
+                                       block_size=2**18) as f:
+            for i in range(0, len(content), 1000):
+                await f.write(content[i:i + 1000])
+        with pytest.raises(FileNotFoundError):
+            await fs.open_async('/missing.txt')
+
+    _run_with_async_fs(faulty_server, write, verify_checksums=True)
+    assert (faulty_server.root / 'new.txt').read_bytes() == content
+    # the content is streamed with a single request
+    assert faulty_server.requests[('webdav', 'PUT')] == 1
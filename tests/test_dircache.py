@@ -0,0 +1,50 @@
+import time
+
+from dcachefs.dircache import dCacheDirCache
+
+
+_listing = [{'name': '/dir/file', 'type': 'file', 'size': 1}]
+
+
+def test_listings_are_not_cached_by_default():
+    cache = dCacheDirCache()
+    cache['/dir'] = _listing
+    assert '/dir' not in cache
+
+
+def test_listings_are_cached():
+    cache = dCacheDirCache(use_listings_cache=True)
+    cache['/dir'] = _listing
+    assert cache['/dir'] == _listing
+
+
+def test_listings_expire():
+    cache = dCacheDirCache(use_listings_cache=True, listings_expiry_time=0.01)
+    cache['/dir'] = _listing
+    time.sleep(0.02)
+    assert '/dir' not in cache
+    assert len(cache) == 0
+
+
+def test_least_recently_used_listings_are_evicted():
+    cache = dCacheDirCache(use_listings_cache=True, max_paths=2)
+    cache['/a'] = []
+    cache['/b'] = []
+    _ = cache['/a']
+    cache['/c'] = []
+    assert set(cache) == {'/a', '/c'}
+
+
+def test_get_entry():
+    cache = dCacheDirCache(use_listings_cache=True)
+    cache['/dir'] = _listing
+    assert cache.get_entry('/dir', '/dir/file') == _listing[0]
+    assert cache.get_entry('/dir', '/dir/nonexistent') is None
+
+
+def test_get_entry_from_updated_listing():
+    cache = dCacheDirCache(use_listings_cache=True)
+    cache['/dir'] = []
+    assert cache.get_entry('/dir', '/dir/file') is None
+    cache['/dir'] = _listing
+    assert cache.get_entry('/dir', '/dir/file') == _listing[0]
@@ -0,0 +1,87 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from dcachefs.metrics import Histogram, Metrics, instrumented
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1., float('inf')))
+    for value in (0.05, 0.5, 0.7, 5.):
+        histogram.observe(value)
+    out = histogram.snapshot()
+    assert out['count'] == 4
+    assert out['sum'] == pytest.approx(6.25)
+    assert out['buckets'] == {0.1: 1, 1.: 3, float('inf'): 4}
+
+
+def test_metrics_are_recorded():
+    metrics = Metrics()
+    metrics.record('cat_file', 0.5, nbytes=100)
+    metrics.record('cat_file', 1.5, nbytes=300)
+    metrics.record('cat_file', 0.1, error=FileNotFoundError())
+    metrics.record('info', 0.1, error=ValueError())
+    stats = metrics.snapshot()
+    assert stats['cat_file']['calls'] == 3
+    assert stats['cat_file']['bytes'] == 400
+    assert stats['cat_file']['throughput'] == pytest.approx(400 / 2.1)
+    assert stats['cat_file']['errors'] == {404: 1}
+    assert stats['info']['errors'] == {'ValueError': 1}
+
+
+def test_metrics_are_reset():
+    metrics = Metrics()
+    metrics.record('ls', 0.1)
+    assert metrics.snapshot(reset=True)['ls']['calls'] == 1
+    assert metrics.snapshot() == {}
+
+
+def test_hooks_are_called():
+    metrics = Metrics()
+    records = []
+    metrics.add_hook(lambda *args: records.append(args))
+    error = aiohttp.ClientResponseError(None, (), status=503)
+    metrics.record('mv', 0.2, error=error)
+    assert records == [('mv', 0.2, 0, error)]
+    assert metrics.snapshot()['mv']['errors'] == {503: 1}
+
+
+class _FileSystem:
+
+    def __init__(self):
+        self.metrics = Metrics()
+
+    @instrumented('info')
+    async def _info(self):
+        self.metrics.record_request()
+        return {}
+
+    @instrumented('cat_file', nbytes=lambda out, *args, **kwargs: len(out))
+    async def _cat_file(self, nbytes):
+        await self._info()
+        self.metrics.record_request()
+        return b'0' * nbytes
+
+    @instrumented('rm')
+    async def _rm_file(self):
+        raise FileNotFoundError
+
+
+def test_nested_operations_are_not_recorded():
+    fs = _FileSystem()
+    assert asyncio.run(fs._cat_file(10)) == b'0' * 10
+    asyncio.run(fs._info())
+    stats = fs.metrics.snapshot()
+    assert stats['cat_file']['calls'] == 1
+    assert stats['cat_file']['requests'] == 2
+    assert stats['cat_file']['bytes'] == 10
+    assert stats['info']['calls'] == 1
+    assert stats['info']['requests'] == 1
+
+
+def test_failed_operations_are_recorded():
+    fs = _FileSystem()
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(fs._rm_file())
+    assert fs.metrics.snapshot()['rm']['errors'] == {404: 1}
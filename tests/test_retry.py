@@ -0,0 +1,65 @@
+import aiohttp
+import email.utils
+import pytest
+import time
+
+from dcachefs.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def test_delay_uses_full_jitter():
+    policy = RetryPolicy(backoff_base=1., backoff_max=5.)
+    for attempt in range(5):
+        delays = [policy.delay(attempt) for _ in range(100)]
+        assert all(0 <= d <= min(5., 2 ** attempt) for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_delay_honours_retry_after():
+    policy = RetryPolicy(backoff_max=10.)
+    assert policy.delay(0, retry_after='3') == 3.
+    assert policy.delay(0, retry_after='30') == 10.
+    date = email.utils.formatdate(time.time() + 5, usegmt=True)
+    assert 3. < policy.delay(0, retry_after=date) <= 5.
+
+
+def test_non_idempotent_methods_are_not_retried():
+    policy = RetryPolicy()
+    assert policy.is_retryable('GET')
+    assert policy.is_retryable('PUT')
+    assert not policy.is_retryable('POST')
+    assert RetryPolicy(retry_non_idempotent=True).is_retryable('POST')
+    # requests that could not be sent are always retried
+    error = aiohttp.ClientConnectorError(None, OSError())
+    assert policy.is_retryable('POST', error)
+
+
+def test_circuit_breaker_opens_after_repeated_failures():
+    breaker = CircuitBreaker(threshold=2, timeout=0.05)
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.05)
+    assert breaker.state == 'half-open'
+    breaker.check()  # a single trial request is let through
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.check()
+
+
+def test_circuit_breaker_retry_time():
+    breaker = CircuitBreaker(threshold=1, timeout=10.)
+    assert breaker.retry_in() == 0.
+    breaker.record_failure()
+    assert 9. < breaker.retry_in() <= 10.
+
+
+def test_circuit_breaker_can_be_disabled():
+    breaker = CircuitBreaker(threshold=None, timeout=1.)
+    for _ in range(100):
+        breaker.record_failure()
+    breaker.check()
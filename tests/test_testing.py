@@ -0,0 +1,173 @@
+import aiohttp
+import asyncio
+import pytest
+
+from dcachefs.testing import dCacheTestServer, populate
+
+
+@pytest.fixture(scope='module')
+def server():
+    with dCacheTestServer(redirect=True) as server:
+        populate(server.root, {'dir': {'file.txt': 'Hello world!'}})
+        yield server
+
+
+def _request(method, url, **kwargs):
+    async def request():
+        async with aiohttp.ClientSession() as session:
+            async with session.request(method, url, **kwargs) as r:
+                return r.status, dict(r.headers), await r.read()
+    return asyncio.run(request())
+
+
+def test_namespace_get_children(server):
+    url = f'{server.api_url}/namespace/%2Fdir?children=true'
+    status, _, content = _request('GET', url)
+    assert status == 200
+    assert b'"fileName": "file.txt"' in content
+
+
+def test_namespace_get_with_offset_and_limit(server):
+    populate(server.root / 'many', {f'file_{i}': '' for i in range(5)})
+    url = f'{server.api_url}/namespace/%2Fmany?children=true&offset=1&limit=2'
+
+    async def request():
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as r:
+                return await r.json()
+    out = asyncio.run(request())
+    assert [c['fileName'] for c in out['children']] == ['file_1', 'file_2']
+
+
+def test_namespace_get_with_checksums(server):
+    url = f'{server.api_url}/namespace/%2Fdir%2Ffile.txt?checksum=true'
+    status, _, content = _request('GET', url)
+    assert status == 200
+    assert b'"type": "ADLER32", "value": "1d09045e"' in content
+    assert b'"MD5_TYPE"' in content
+    status, _, content = _request('GET', url.split('?')[0])
+    assert b'checksums' not in content
+
+
+def test_namespace_get_with_locality(server):
+    populate(server.root, {'tape': {'file.txt': 'on tape'}})
+    server.nearline.add('/tape/file.txt')
+    url = f'{server.api_url}/namespace/%2Ftape?children=true&locality=true'
+    _, _, content = _request('GET', url)
+    assert b'"fileLocality": "NEARLINE"' in content
+
+
+def test_bulk_stage_request():
+    with dCacheTestServer(stage_time=0.2) as server:
+        populate(server.root, {'a.txt': 'a', 'b.txt': 'b'})
+        server.nearline.add('/b.txt')
+        url = f'{server.api_url}/bulk-requests'
+        body = dict(activity='STAGE', target=['/a.txt', '/b.txt', '/c'])
+        status, headers, _ = _request('POST', url, json=body)
+        assert status == 201
+        status, _, content = _request('GET', headers['request-url'])
+        assert b'"status": "STARTED"' in content
+        assert b'"target": "/b.txt", "state": "RUNNING"' in content
+        assert b'"target": "/c", "state": "FAILED"' in content
+        asyncio.run(asyncio.sleep(0.3))
+        status, _, content = _request('GET', headers['request-url'])
+        assert b'"status": "COMPLETED"' in content
+        assert not server.nearline
+
+
+def test_namespace_get_nonexistent_path(server):
+    url = f'{server.api_url}/namespace/%2Fnonexistent'
+    status, _, _ = _request('GET', url)
+    assert status == 404
+
+
+def test_webdav_get_with_range_is_redirected_to_pool(server):
+    url = f'{server.webdav_url}/dir/file.txt'
+    status, headers, content = _request(
+        'GET', url, headers={'Range': 'bytes=6-10'}
+    )
+    assert status == 206
+    assert content == b'world'
+    assert headers['Content-Range'] == 'bytes 6-10/12'
+    assert server.requests[('pool', 'GET')] > 0
+
+
+def test_webdav_get_with_multiple_ranges(server):
+    url = f'{server.webdav_url}/dir/file.txt'
+
+    async def request():
+        async with aiohttp.ClientSession() as session:
+            headers = {'Range': 'bytes=0-4,6-10'}
+            async with session.get(url, headers=headers) as r:
+                assert r.status == 206
+                reader = aiohttp.MultipartReader(r.headers, r.content)
+                return [
+                    (part.headers['Content-Range'], await part.read())
+                    async for part in reader
+                ]
+    assert asyncio.run(request()) == [
+        ('bytes 0-4/12', b'Hello'),
+        ('bytes 6-10/12', b'world'),
+    ]
+
+
+def test_webdav_get_with_multiple_ranges_not_supported():
+    with dCacheTestServer(multipart_ranges=False) as server:
+        populate(server.root, {'file.txt': 'Hello world!'})
+        url = f'{server.webdav_url}/file.txt'
+        status, _, content = _request(
+            'GET', url, headers={'Range': 'bytes=0-4,6-10'}
+        )
+    assert status == 200
+    assert content == b'Hello world!'
+
+
+def test_webdav_put(server):
+    url = f'{server.webdav_url}/new_dir/file.txt'
+    status, _, _ = _request('PUT', url, data=b'content')
+    assert status == 201
+    assert (server.root / 'new_dir' / 'file.txt').read_bytes() == b'content'
+
+
+def test_webdav_get_nonexistent_file(server):
+    status, _, _ = _request('GET', f'{server.webdav_url}/nonexistent')
+    assert status == 404
+
+
+def test_webdav_copy(server):
+    url = f'{server.webdav_url}/dir/file.txt'
+    destination = f'{server.webdav_url}/dir/copy.txt'
+    status, _, _ = _request('COPY', url, headers={'Destination': destination})
+    assert status == 201
+    assert (server.root / 'dir' / 'copy.txt').read_text() == 'Hello world!'
+
+
+def test_webdav_copy_to_nonexistent_parent(server):
+    url = f'{server.webdav_url}/dir/file.txt'
+    destination = f'{server.webdav_url}/nonexistent/copy.txt'
+    status, _, _ = _request('COPY', url, headers={'Destination': destination})
+    assert status == 409
+
+
+def test_webdav_mkcol(server):
+    status, _, _ = _request('MKCOL', f'{server.webdav_url}/dir/subdir')
+    assert status == 201
+    assert (server.root / 'dir' / 'subdir').is_dir()
+    status, _, _ = _request('MKCOL', f'{server.webdav_url}/dir/subdir')
+    assert status == 405
+
+
+def test_add_fault():
+    with dCacheTestServer() as server:
+        populate(server.root, {'file.txt': 'Hello world!'})
+        url = f'{server.webdav_url}/file.txt'
+        server.add_fault('webdav', method='GET', status=503,
+                         headers={'Retry-After': '1'})
+        status, headers, _ = _request('GET', url)
+        assert status == 503
+        assert headers['Retry-After'] == '1'
+        status, _, content = _request('GET', url)
+        assert status == 200
+        server.add_fault('webdav', method='GET', truncate=5)
+        with pytest.raises(aiohttp.ClientPayloadError):
+            _request('GET', url)
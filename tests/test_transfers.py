@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+
+from fsspec.callbacks import Callback
+
+from dcachefs.transfers import TransferScheduler
+
+
+class _Transfers:
+    # fake transfers, taking a given time and recording when they run
+    def __init__(self):
+        self.running = set()
+        self.started = []
+        self.finished = []
+        self.max_running = 0
+
+    async def transfer(self, path1, path2, callback=None, duration=0.,
+                       chunks=(), fail=False):
+        self.running.add(path1)
+        self.started.append(path1)
+        self.max_running = max(self.max_running, len(self.running))
+        try:
+            for chunk in chunks:
+                callback.relative_update(chunk)
+            await asyncio.sleep(duration)
+            if fail:
+                raise OSError(f'Failed to transfer {path1}')
+            self.finished.append(path1)
+            return path2
+        finally:
+            self.running.remove(path1)
+
+
+def test_transfers_are_run():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(2)
+        for i in range(5):
+            scheduler.submit(i, 1, transfers.transfer, f'src_{i}', f'dst_{i}')
+        scheduler.close()
+        return await scheduler.run()
+
+    results = asyncio.run(run())
+    assert results == {i: f'dst_{i}' for i in range(5)}
+    assert transfers.max_running == 2
+
+
+def test_transfers_start_when_others_complete():
+    # without batches, a long transfer does not hold back the others
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(2)
+        scheduler.submit('large', 100, transfers.transfer, 'large', 'l',
+                         duration=0.5)
+        for i in range(10):
+            scheduler.submit(i, 1, transfers.transfer, f'small_{i}', 's',
+                             duration=0.01)
+        scheduler.close()
+        return await scheduler.run()
+
+    results = asyncio.run(run())
+    assert len(results) == 11
+    assert transfers.max_running == 2
+    # all small files are transferred while the large one is running
+    assert transfers.started[0] == 'large'
+    assert transfers.finished[-1] == 'large'
+
+
+def test_large_and_small_transfers_are_mixed():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(4)
+        for i, size in enumerate([1, 5, 2, 8, 3, 7, 4, 6]):
+            scheduler.submit(i, size, transfers.transfer, f'{size}', 'dst',
+                             duration=0.01)
+        scheduler.close()
+        await scheduler.run()
+
+    asyncio.run(run())
+    assert transfers.started[:4] == ['8', '7', '1', '2']
+
+
+def test_bytes_in_flight_are_capped():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(10, max_bytes=10)
+        for i, size in enumerate([4, 4, 4, 20]):
+            scheduler.submit(i, size, transfers.transfer, f'{i}', 'dst',
+                             duration=0.01)
+        scheduler.close()
+        return await scheduler.run()
+
+    assert len(asyncio.run(run())) == 4
+    # the largest file runs alone, then at most two 4-byte files at once
+    assert transfers.started[0] == '3'
+    assert transfers.max_running == 2
+
+
+def test_transfers_can_be_submitted_while_running():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(2)
+        scheduler.submit(0, 1, transfers.transfer, 'first', 'dst')
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        scheduler.submit(1, 1, transfers.transfer, 'second', 'dst')
+        scheduler.close()
+        return await task
+
+    assert sorted(asyncio.run(run())) == [0, 1]
+    with pytest.raises(RuntimeError):
+        scheduler = TransferScheduler(1)
+        scheduler.close()
+        scheduler.submit(0, 1, transfers.transfer, 'late', 'dst')
+
+
+def test_first_error_is_raised():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(2)
+        scheduler.submit(0, 1, transfers.transfer, 'slow', 'dst',
+                         duration=10.)
+        scheduler.submit(1, 1, transfers.transfer, 'failing', 'dst',
+                         fail=True)
+        scheduler.close()
+        await scheduler.run()
+
+    with pytest.raises(OSError, match='failing'):
+        asyncio.run(run())
+    # the other transfers are cancelled
+    assert transfers.running == set()
+
+
+def test_errors_are_returned():
+    transfers = _Transfers()
+
+    async def run():
+        scheduler = TransferScheduler(2, return_exceptions=True)
+        scheduler.submit(0, 1, transfers.transfer, 'ok', 'dst')
+        scheduler.submit(1, 1, transfers.transfer, 'failing', 'dst',
+                         fail=True)
+        scheduler.close()
+        return await scheduler.run()
+
+    results = asyncio.run(run())
+    assert results[0] == 'dst'
+    assert isinstance(results[1], OSError)
+
+
+def test_progress_is_reported():
+    transfers = _Transfers()
+    calls = []
+    callback = Callback(hooks=dict(
+        progress=lambda size, value, **kwargs: calls.append(
+            (size, value, kwargs)
+        )
+    ))
+
+    async def run():
+        scheduler = TransferScheduler(1, callback=callback)
+        # the first transfer reports its progress, the second does not
+        scheduler.submit(0, 10, transfers.transfer, 'a', 'dst',
+                         chunks=[4, 6], duration=0.01)
+        scheduler.submit(1, 20, transfers.transfer, 'b', 'dst',
+                         duration=0.01)
+        scheduler.close()
+        await scheduler.run()
+        return scheduler.progress()
+
+    progress = asyncio.run(run())
+    assert callback.size == 2
+    assert callback.value == 2
+    assert progress['bytes_done'] == progress['bytes_total'] == 30
+    assert progress['throughput'] > 0
+    assert progress['eta'] == 0
+    # the largest transfer runs first
+    reported = [kwargs['bytes_done'] for _, _, kwargs in calls if kwargs]
+    assert reported == [20, 20, 24, 30, 30]
+    assert calls[-1][2]['eta'] == 0